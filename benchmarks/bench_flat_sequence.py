@@ -0,0 +1,62 @@
+"""
+Benchmarks of the latency and the memory footprint of long message sequence promises.
+
+Run with: python -m benchmarks.bench_flat_sequence
+"""
+
+import time
+import tracemalloc
+
+from miniagents import Message, MessageSequence, MiniAgents
+
+
+async def abenchmark(message_count: int, repetitions: int) -> None:
+    """
+    Stream `message_count` messages through a MessageSequence (one append per message, the way agents usually
+    reply) and consume the resulting sequence promise. Print the timing and the memory that the resolved sequence
+    holds on to.
+    """
+    messages = [Message(text=f"msg{idx}") for idx in range(message_count)]
+    for message in messages:
+        _ = message.as_promise  # let's not measure the creation of the message promises
+
+    best_elapsed = float("inf")
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        message_sequence = MessageSequence(start_asap=False)
+        with message_sequence.message_appender:
+            for message in messages:
+                message_sequence.message_appender.append(message)
+        async for _ in message_sequence.sequence_promise:
+            pass
+        await message_sequence.sequence_promise
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    message_sequence = MessageSequence(start_asap=False)
+    with message_sequence.message_appender:
+        for message in messages:
+            message_sequence.message_appender.append(message)
+    await message_sequence.sequence_promise
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+
+    print(
+        f"{message_count:>7} messages: {best_elapsed * 1e3:9.3f} ms per sequence (best of {repetitions}), "
+        f"{retained / 1024:9.1f} KiB retained by a resolved sequence"
+    )
+
+
+async def main() -> None:
+    """
+    Run the benchmarks for sequences of different lengths.
+    """
+    await abenchmark(1_000, repetitions=20)
+    await abenchmark(10_000, repetitions=10)
+    await abenchmark(100_000, repetitions=3)
+
+
+if __name__ == "__main__":
+    MiniAgents().run(main())
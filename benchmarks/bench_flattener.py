@@ -0,0 +1,80 @@
+"""
+Benchmarks of how fast (nested) replies are flattened into message sequences.
+
+Run with: python -m benchmarks.bench_flattener
+"""
+
+import time
+from typing import Callable
+
+from miniagents import Message, MessageSequence, MiniAgents, MessageType
+
+
+async def aflatten(messages: MessageType) -> int:
+    """
+    Flatten the messages the same way a reply of an agent is flattened and return the number of message promises.
+    """
+    message_sequence = MessageSequence(start_asap=False)
+    with message_sequence.message_appender:
+        message_sequence.message_appender.append(messages)
+    return len([message_promise async for message_promise in message_sequence.sequence_promise])
+
+
+def wide_reply(width: int = 1000) -> MessageType:
+    """
+    A flat list of many messages.
+    """
+    return [Message(text=f"msg{idx}") for idx in range(width)]
+
+
+def deep_reply(depth: int = 300) -> MessageType:
+    """
+    A list that is nested `depth` levels deep, with one message on every level.
+    """
+    reply = Message(text="leaf")
+    for idx in range(depth):
+        reply = [Message(text=f"msg{idx}"), reply]
+    return reply
+
+
+def prompt_like_reply() -> MessageType:
+    """
+    A reply that resembles the prompts of the `self_dev` agents (a few messages and a sequence promise of the
+    conversation so far).
+    """
+    conversation = MessageSequence.turn_into_sequence_promise([Message(text=f"turn{idx}") for idx in range(10)])
+    return [
+        Message(text="system prompt", role="system"),
+        Message(text="full repo"),
+        Message(text="instructions", role="system"),
+        conversation,
+    ]
+
+
+async def abenchmark(name: str, make_reply: Callable[[], MessageType], repetitions: int) -> None:
+    """
+    Flatten the reply produced by `make_reply` `repetitions` times and print the timing.
+    """
+    replies = [make_reply() for _ in range(repetitions)]
+    start = time.perf_counter()
+    message_count = 0
+    for reply in replies:
+        message_count += await aflatten(reply)
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>12}: {elapsed / repetitions * 1e3:8.3f} ms per reply, "
+        f"{message_count / elapsed:10.0f} messages per second"
+    )
+
+
+async def main() -> None:
+    """
+    Run all the flattener benchmarks.
+    """
+    await abenchmark("wide", wide_reply, repetitions=50)
+    await abenchmark("deep", deep_reply, repetitions=50)
+    await abenchmark("prompt-like", prompt_like_reply, repetitions=2000)
+
+
+if __name__ == "__main__":
+    MiniAgents().run(main())
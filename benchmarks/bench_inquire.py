@@ -0,0 +1,66 @@
+"""
+Benchmarks of the overhead of `MiniAgent.inquire()` (the calls of agents that do next to nothing).
+
+Run with: python -m benchmarks.bench_inquire
+"""
+
+import time
+from typing import Any
+
+from miniagents import InteractionContext, MiniAgent, MiniAgents, miniagent
+
+
+@miniagent
+async def noop_agent(ctx: InteractionContext, **kwargs) -> None:  # pylint: disable=unused-argument
+    """
+    An agent that doesn't even read its input.
+    """
+
+
+@miniagent
+async def echo_agent(ctx: InteractionContext, **kwargs) -> None:  # pylint: disable=unused-argument
+    """
+    An agent that replies with its input.
+    """
+    ctx.reply(ctx.message_promises)
+
+
+async def abenchmark(
+    name: str,
+    agent: MiniAgent,
+    messages: Any = None,
+    calls: int = 2000,
+    concurrency: int = 100,
+    repetitions: int = 5,
+    **kwargs,
+) -> None:
+    """
+    Call the agent `calls` times (`concurrency` calls at a time) and await all the replies. Print the number of
+    agent calls per second (the best of `repetitions` attempts).
+    """
+    best_elapsed = float("inf")
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        for _ in range(calls // concurrency):
+            reply_promises = [agent.inquire(messages, **kwargs) for _ in range(concurrency)]
+            for reply_promise in reply_promises:
+                await reply_promise
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+    print(f"{name:>24}: {calls / best_elapsed:10.0f} agent calls per second (best of {repetitions})")
+
+
+async def main() -> None:
+    """
+    Run all the inquiry benchmarks.
+    """
+    forked_agent = noop_agent.fork(some_str="value").fork(some_int=1).fork(some_list=[1, 2, 3])
+
+    await abenchmark("no-op", noop_agent)
+    await abenchmark("no-op, immutable kwargs", noop_agent, some_str="value", some_int=1)
+    await abenchmark("no-op, mutable kwargs", noop_agent, some_list=[1, 2, 3], some_dict={"a": "b"})
+    await abenchmark("no-op, forked thrice", forked_agent)
+    await abenchmark("echo, static input", echo_agent, messages=("hello", "world"))
+
+
+if __name__ == "__main__":
+    MiniAgents().run(main())
@@ -0,0 +1,74 @@
+"""
+Benchmarks of the throughput of remote agents (tokens per second across a localhost connection).
+
+Run with: python -m benchmarks.bench_remote
+"""
+
+import time
+from typing import Optional
+
+from miniagents import InteractionContext, Message, MiniAgents, miniagent
+from miniagents.ext.remote import RemoteAgentClient, aserve_agent, remote_agent
+
+
+@miniagent
+async def token_stream_agent(ctx: InteractionContext, tokens: int = 1000) -> None:
+    """
+    An agent that streams `tokens` tokens as fast as it can.
+    """
+
+    async def astream_tokens(_):
+        for idx in range(tokens):
+            yield f"token{idx} "
+
+    ctx.reply(Message.promise(message_token_streamer=astream_tokens))
+
+
+async def abenchmark(
+    name: str,
+    tokens: int = 1000,
+    calls: int = 20,
+    concurrency: int = 1,
+    repetitions: int = 3,
+    path: Optional[str] = None,
+) -> None:
+    """
+    Call the remote agent `calls` times (`concurrency` calls at a time) and consume all the reply tokens. Print the
+    number of tokens per second (the best of `repetitions` attempts).
+    """
+    if path is None:
+        server = await aserve_agent(token_stream_agent)
+        remote_client = RemoteAgentClient(port=server.sockets[0].getsockname()[1])
+    else:
+        server = await aserve_agent(token_stream_agent, path=path)
+        remote_client = RemoteAgentClient(path=path)
+    proxy_agent = remote_agent.fork(remote_client=remote_client)
+
+    best_elapsed = float("inf")
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        for _ in range(calls // concurrency):
+            reply_promises = [proxy_agent.inquire(tokens=tokens) for _ in range(concurrency)]
+            for reply_promise in reply_promises:
+                async for message_promise in reply_promise:
+                    async for _ in message_promise:
+                        pass
+        best_elapsed = min(best_elapsed, time.perf_counter() - start)
+    print(f"{name:>24}: {calls * tokens / best_elapsed:10.0f} tokens per second (best of {repetitions})")
+
+    await remote_client.aclose()
+    server.close()
+    await server.wait_closed()
+
+
+async def main() -> None:
+    """
+    Run all the remote agent benchmarks.
+    """
+    await abenchmark("tcp, sequential")
+    await abenchmark("tcp, 10 concurrent", concurrency=10)
+    await abenchmark("unix socket, sequential", path="/tmp/miniagents_bench_remote.sock")
+
+
+if __name__ == "__main__":
+    MiniAgents().run(main())
@@ -3,10 +3,11 @@ This module contains common `self_def` code.
 """
 
 from pathlib import Path
+from typing import Iterator
 
 from dotenv import load_dotenv
 
-from miniagents import MiniAgents, Message
+from miniagents import MiniAgents, Message, FileMessage
 from miniagents.ext import markdown_history_agent
 from miniagents.ext.llm.anthropic import anthropic_agent
 from miniagents.ext.llm.openai import openai_agent
@@ -46,16 +47,20 @@ mini_agents = MiniAgents()
 prompt_logger_agent = markdown_history_agent.fork(default_role="user", only_write=True, append=False)
 
 
-class RepoFileMessage(Message):
+class RepoFileMessage(FileMessage):
     """
-    A message that represents a file in the MiniAgents repository.
+    A message that represents a file in the MiniAgents repository. The content of the file is not kept in memory.
     """
 
     file_posix_path: str
 
-    def _as_string(self) -> str:
-        extra_newline = "" if self.text.endswith("\n") else "\n"
-        return f'<source_file path="{self.file_posix_path}">\n{self.text}{extra_newline}</source_file>'
+    def _string_pieces(self) -> Iterator[str]:
+        yield f'<source_file path="{self.file_posix_path}">\n'
+        last_chunk = ""
+        for chunk in super()._string_pieces():
+            yield chunk
+            last_chunk = chunk
+        yield "</source_file>" if last_chunk.endswith("\n") else "\n</source_file>"
 
 
 class FullRepoMessage(Message):
@@ -76,7 +81,7 @@ class FullRepoMessage(Message):
             if file.is_file() and file.stat().st_size > 0
         ]
         miniagent_files = [
-            RepoFileMessage(file_posix_path=file_posix_path, text=file.read_text(encoding="utf-8"))
+            RepoFileMessage(file, file_posix_path=file_posix_path)
             for file_posix_path, file in miniagent_files
             if (
                 not any(
@@ -1,8 +1,19 @@
 """
-Make all the functions and classes in miniagents available at the package level.
+Make all the functions and classes in miniagents, messages, actors, admission and caching available at the package
+level.
 """
 
-from miniagents import miniagents
+from miniagents import actors, admission, caching, messages, miniagents
+from miniagents.actors import *
+from miniagents.admission import *
+from miniagents.caching import *
+from miniagents.messages import *
 from miniagents.miniagents import *
 
-__all__ = [name for name in dir(miniagents) if not name.startswith("_")]
+__all__ = (
+    [name for name in dir(actors) if not name.startswith("_")]
+    + [name for name in dir(admission) if not name.startswith("_")]
+    + [name for name in dir(caching) if not name.startswith("_")]
+    + [name for name in dir(messages) if not name.startswith("_")]
+    + [name for name in dir(miniagents) if not name.startswith("_")]
+)
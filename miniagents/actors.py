@@ -0,0 +1,99 @@
+"""
+Actor mode of agents: long-lived agent workers that keep state between agent calls.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import logging
+import typing
+from typing import Any, Optional
+
+from miniagents.promising.sentinels import END_OF_QUEUE
+
+if typing.TYPE_CHECKING:
+    from miniagents.miniagents import MiniAgent, InteractionContext
+
+logger = logging.getLogger(__name__)
+
+
+class AgentActorPool:
+    """
+    A fixed pool of long-lived workers of an agent in actor mode (see `MiniAgent` for details). The workers are not
+    tracked by the PromisingContext as child tasks (otherwise `aflush_tasks()` would wait for them forever) - they
+    are stopped by `MiniAgents.afinalize()` instead.
+    """
+
+    def __init__(self, mini_agent: "MiniAgent") -> None:
+        self._mini_agent = mini_agent
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._aworker()) for _ in range(mini_agent.actor_pool_size)]
+
+    async def acall(self, ctx: "InteractionContext", function_kwargs: dict[str, Any]) -> None:
+        """
+        Queue a call of the agent function and wait until one of the workers processes it. The agent function is run
+        in a copy of the caller's context (so the context variables, the scheduling tag of the call, for ex., are not
+        inherited from whichever call happened to start the workers).
+        """
+        call_future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((call_future, ctx, function_kwargs, contextvars.copy_context()))
+        await call_future
+
+    async def aclose(self) -> None:
+        """
+        Let the workers process all the calls that are already queued and stop them.
+        """
+        for _ in self._workers:
+            self._queue.put_nowait(END_OF_QUEUE)
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def _aworker(self) -> None:
+        actor_state = None
+        init_error = None
+        if self._mini_agent.actor_init:
+            try:
+                actor_state = self._mini_agent.actor_init()
+                if inspect.isawaitable(actor_state):
+                    actor_state = await actor_state
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.debug("An error occurred while initializing an actor worker", exc_info=True)
+                init_error = exc
+
+        while True:
+            queue_item = await self._queue.get()
+            if queue_item is END_OF_QUEUE:
+                return
+            call_future, ctx, function_kwargs, call_context = queue_item
+            if call_future.done():
+                # the caller is not waiting anymore (cancelled)
+                continue
+
+            call_error = None
+            try:
+                if init_error:
+                    raise init_error
+                ctx.actor_state = actor_state
+                # a task copies the context that is current at the moment of its creation
+                await call_context.run(
+                    asyncio.create_task,
+                    self._mini_agent._func(ctx, **function_kwargs),  # pylint: disable=protected-access
+                )
+            except BaseException as exc:  # pylint: disable=broad-except
+                call_error = exc
+                if not isinstance(exc, Exception):
+                    # the worker itself is being cancelled or interrupted
+                    raise
+            finally:
+                # the caller must not be left waiting forever, whatever happens to the worker
+                _resolve_call_future(call_future, call_error)
+
+
+def _resolve_call_future(call_future: asyncio.Future, call_error: Optional[BaseException]) -> None:
+    if call_future.done():
+        return
+    if call_error is None:
+        call_future.set_result(None)
+    elif isinstance(call_error, asyncio.CancelledError):
+        call_future.cancel()
+    else:
+        call_future.set_exception(call_error)
@@ -0,0 +1,380 @@
+"""
+Admission control for agent calls: concurrency limits (with a FIFO queue or with priority and fair-share
+scheduling) and request/token rate limiting.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+from miniagents.messages import Message
+
+logger = logging.getLogger(__name__)
+
+TokenEstimator = Callable[[tuple[Message, ...], dict[str, Any]], int]
+
+
+class Priority(IntEnum):
+    """
+    Priority classes of agent calls. The lower the value, the sooner a call is admitted by a `FairScheduler` (any
+    integer can be used as a priority, these are just the conventional ones).
+    """
+
+    INTERACTIVE = 0
+    NORMAL = 1
+    BACKGROUND = 2
+
+
+class SchedulingTag(NamedTuple):
+    """
+    The session (tenant) and the priority an agent call is scheduled with.
+    """
+
+    session_key: Optional[str] = None
+    priority: int = Priority.NORMAL
+
+
+_current_scheduling_tag: ContextVar[SchedulingTag] = ContextVar("_current_scheduling_tag", default=SchedulingTag())
+
+
+def current_scheduling_tag() -> SchedulingTag:
+    """
+    Get the scheduling tag of the current agent call (or of the current `scheduling_scope()`).
+    """
+    return _current_scheduling_tag.get()
+
+
+@contextmanager
+def scheduling_scope(session_key: Optional[str] = None, priority: Optional[int] = None) -> Iterator[SchedulingTag]:
+    """
+    Schedule all the agent calls that are made within this scope (including the nested calls made by those agents)
+    on behalf of `session_key` and with `priority`. If either of them is None, it is inherited from the outer scope.
+    """
+    outer_tag = _current_scheduling_tag.get()
+    tag = SchedulingTag(
+        session_key=outer_tag.session_key if session_key is None else session_key,
+        priority=outer_tag.priority if priority is None else priority,
+    )
+    token = _current_scheduling_tag.set(tag)
+    try:
+        yield tag
+    finally:
+        _current_scheduling_tag.reset(token)
+
+
+def estimate_tokens(messages: Iterable[Message], function_kwargs: dict[str, Any]) -> int:
+    """
+    A rough estimation of the number of tokens an LLM call is going to use: roughly four characters of the input per
+    token plus `max_tokens` (if it is among the kwargs of the agent function).
+    """
+    return sum(len(str(message)) for message in messages) // 4 + (function_kwargs.get("max_tokens") or 0)
+
+
+class RateLimiter:
+    """
+    A request and (estimated) token rate limiter based on token buckets. Capacity is reserved by the callers in the
+    order of their arrival (a caller that exceeds the budget waits until the budget is replenished), so the limiter
+    is fair and doesn't need any locks. It doesn't hold any asyncio primitives either, so it can be shared freely
+    (see `RateLimiter.shared()`).
+    """
+
+    _shared_limiters: dict[str, "RateLimiter"] = {}
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        # the buckets start full (the balances can become negative, which means that the capacity is "borrowed"
+        # from the future and the caller needs to wait)
+        self._request_balance = requests_per_minute or 0.0
+        self._token_balance = tokens_per_minute or 0.0
+        self._last_refill = time.monotonic()
+
+    @classmethod
+    def shared(
+        cls,
+        budget_key: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ) -> "RateLimiter":
+        """
+        Get the rate limiter that is shared by everyone who uses the same `budget_key` (for ex. all the forks of an
+        LLM agent that use the same API key). The limits are taken into account only when the shared rate limiter
+        is created (upon the first call with a given `budget_key`).
+        """
+        rate_limiter = cls._shared_limiters.get(budget_key)
+        if rate_limiter is None:
+            rate_limiter = cls(requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute)
+            cls._shared_limiters[budget_key] = rate_limiter
+        return rate_limiter
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve the capacity for one request that is going to use `tokens` tokens. Return the number of seconds the
+        caller needs to wait before making the request.
+        """
+        self._refill()
+        delay = 0.0
+        if self.requests_per_minute:
+            self._request_balance -= 1
+            if self._request_balance < 0:
+                delay = max(delay, -self._request_balance * 60 / self.requests_per_minute)
+        if self.tokens_per_minute and tokens:
+            self._token_balance -= tokens
+            if self._token_balance < 0:
+                delay = max(delay, -self._token_balance * 60 / self.tokens_per_minute)
+        return delay
+
+    async def aacquire(self, tokens: int = 0) -> None:
+        """
+        Wait until the request (that is going to use `tokens` tokens) fits into the budget.
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self._last_refill) / 60
+        self._last_refill = now
+        if self.requests_per_minute:
+            self._request_balance = min(
+                self.requests_per_minute, self._request_balance + elapsed_minutes * self.requests_per_minute
+            )
+        if self.tokens_per_minute:
+            self._token_balance = min(
+                self.tokens_per_minute, self._token_balance + elapsed_minutes * self.tokens_per_minute
+            )
+
+
+class AdmissionControl:
+    """
+    Admission control for the calls of an agent. At most `max_concurrency` calls are let in at a time (the rest
+    wait in a FIFO queue) and, if `requests_per_minute` and/or `tokens_per_minute` are set, the calls are also rate
+    limited. The rate limits are shared by all the admission controls with the same `budget_key` (if `budget_key` is
+    None, the rate limits belong to this admission control only). The number of tokens of each call is estimated by
+    `token_estimator` from the input messages and the function kwargs of the call.
+
+    A call is admitted before the agent function is called and is released after the agent's reply is resolved.
+    The attributes `queue_depth`, `in_flight`, `admitted_count`, `total_wait_time` and `max_wait_time` can be used
+    for instrumentation.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        budget_key: Optional[str] = None,
+        token_estimator: TokenEstimator = estimate_tokens,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.token_estimator = token_estimator
+
+        if requests_per_minute is None and tokens_per_minute is None and budget_key is None:
+            self.rate_limiter = None
+        elif budget_key is None:
+            self.rate_limiter = RateLimiter(
+                requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute
+            )
+        else:
+            self.rate_limiter = RateLimiter.shared(
+                budget_key, requests_per_minute=requests_per_minute, tokens_per_minute=tokens_per_minute
+            )
+
+        self.in_flight = 0
+        self.admitted_count = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        # NOTE: the futures are created lazily (asyncio primitives should not be created outside of an event loop)
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        The number of calls that are waiting for a free slot.
+        """
+        return len(self._waiters)
+
+    @property
+    def average_wait_time(self) -> float:
+        """
+        The average time (in seconds) the admitted calls spent waiting to be admitted.
+        """
+        return self.total_wait_time / self.admitted_count if self.admitted_count else 0.0
+
+    @property
+    def needs_token_estimate(self) -> bool:
+        """
+        Whether the number of tokens needs to be estimated for a call to be admitted (which requires the input
+        messages of the call to be resolved).
+        """
+        return bool(self.rate_limiter and self.rate_limiter.tokens_per_minute)
+
+    async def aadmit(self, tokens: int = 0) -> float:
+        """
+        Wait until a call (that is going to use `tokens` tokens) can be admitted. Return the number of seconds the
+        call spent waiting. Every admitted call should eventually be released with `release()`.
+        """
+        start = time.monotonic()
+        if self.rate_limiter:
+            await self.rate_limiter.aacquire(tokens)
+        await self._aacquire_slot()
+
+        wait_time = time.monotonic() - start
+        self.admitted_count += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        if wait_time > 0:
+            logger.debug("An agent call waited %.3f seconds to be admitted", wait_time)
+        return wait_time
+
+    def release(self) -> None:
+        """
+        Release a call that was admitted by `aadmit()`.
+        """
+        waiter = self._pop_waiter()
+        while waiter is not None:
+            if not waiter.done():
+                # the slot is handed over to the next call in the queue, so `in_flight` stays the same
+                waiter.set_result(None)
+                return
+            waiter = self._pop_waiter()
+        self.in_flight -= 1
+
+    def _push_waiter(self, waiter: asyncio.Future) -> None:
+        self._waiters.append(waiter)
+
+    def _pop_waiter(self) -> Optional[asyncio.Future]:
+        return self._waiters.popleft() if self._waiters else None
+
+    def _remove_waiter(self, waiter: asyncio.Future) -> None:
+        self._waiters.remove(waiter)
+
+    async def _aacquire_slot(self) -> None:
+        if self.max_concurrency is None or (self.in_flight < self.max_concurrency and not self.queue_depth):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._push_waiter(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was already handed over to this call - let's pass it on
+                self.release()
+            else:
+                self._remove_waiter(waiter)
+            raise
+
+
+class TenantStats:
+    """
+    The admission statistics of one session (tenant) of a `FairScheduler`.
+    """
+
+    def __init__(self) -> None:
+        self.queue_depth = 0
+        self.admitted_count = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    @property
+    def average_wait_time(self) -> float:
+        """
+        The average time (in seconds) the admitted calls of the session spent waiting to be admitted.
+        """
+        return self.total_wait_time / self.admitted_count if self.admitted_count else 0.0
+
+
+class FairScheduler(AdmissionControl):
+    """
+    Admission control that, instead of a FIFO queue, admits the waiting calls by priority first (see `Priority`)
+    and, within the same priority, by weighted fair share among the sessions (tenants), so one session that fans out
+    a lot of calls doesn't starve the others. The session key and the priority of a call are taken from its
+    scheduling tag (see `scheduling_scope()` and the `priority` argument of `MiniAgent.inquire()`), which the nested
+    calls inherit. `weights` maps session keys to their shares (`default_weight` is used for the rest).
+
+    Per-session queue depth and wait times are available in `tenant_stats`.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        weights: Optional[dict[str, float]] = None,
+        default_weight: float = 1.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(max_concurrency=max_concurrency, **kwargs)
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self.tenant_stats: dict[Optional[str], TenantStats] = {}
+
+        # start-time fair queueing: every waiter gets a virtual start and finish time based on the weight of its
+        # session, the waiters are admitted in the order of their finish times
+        self._heap: list[tuple[int, float, int, float, Optional[str], asyncio.Future]] = []
+        self._virtual_time = 0.0
+        self._last_finish_times: dict[Optional[str], float] = {}
+        self._counter = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._heap)
+
+    def get_tenant_stats(self, session_key: Optional[str]) -> TenantStats:
+        """
+        Get the admission statistics of a session (they are created upon the first request).
+        """
+        stats = self.tenant_stats.get(session_key)
+        if stats is None:
+            stats = TenantStats()
+            self.tenant_stats[session_key] = stats
+        return stats
+
+    async def aadmit(self, tokens: int = 0) -> float:
+        wait_time = await super().aadmit(tokens)
+
+        stats = self.get_tenant_stats(current_scheduling_tag().session_key)
+        stats.admitted_count += 1
+        stats.total_wait_time += wait_time
+        stats.max_wait_time = max(stats.max_wait_time, wait_time)
+        return wait_time
+
+    def _push_waiter(self, waiter: asyncio.Future) -> None:
+        session_key, priority = current_scheduling_tag()
+        weight = self.weights.get(session_key, self.default_weight)
+        start = max(self._virtual_time, self._last_finish_times.get(session_key, 0.0))
+        finish = start + 1 / weight
+        self._last_finish_times[session_key] = finish
+
+        heapq.heappush(self._heap, (priority, finish, next(self._counter), start, session_key, waiter))
+        self.get_tenant_stats(session_key).queue_depth += 1
+
+    def _pop_waiter(self) -> Optional[asyncio.Future]:
+        if not self._heap:
+            return None
+        _, _, _, start, session_key, waiter = heapq.heappop(self._heap)
+        self._virtual_time = max(self._virtual_time, start)
+        self.tenant_stats[session_key].queue_depth -= 1
+        return waiter
+
+    def _remove_waiter(self, waiter: asyncio.Future) -> None:
+        for idx, entry in enumerate(self._heap):
+            if entry[-1] is waiter:
+                self._heap[idx] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self.tenant_stats[entry[-2]].queue_depth -= 1
+                return
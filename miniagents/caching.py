@@ -0,0 +1,72 @@
+"""
+Caching of agent replies.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from miniagents.messages import MessageSequencePromise
+from miniagents.promising.promising import PromisingContext
+
+
+class AgentReplyCache:
+    """
+    A cache of agent replies (LRU, with an optional TTL in seconds). The replies are keyed by the agent alias, the
+    interaction metadata, the function kwargs and the hash keys of the input messages (which means that all the input
+    messages need to be resolved before the agent can be called). The cache is single-flight: the sequence promise of
+    a reply is cached as soon as the agent is called, so concurrent identical inquiries share the same in-flight reply
+    (which is replayed to all of them). Failed replies are evicted.
+    """
+
+    def __init__(self, max_size: Optional[int] = 1024, ttl: Optional[float] = None) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, MessageSequencePromise]] = OrderedDict()
+        self._promising_context: Optional[PromisingContext] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        """
+        Remove all the replies from the cache.
+        """
+        self._entries.clear()
+
+    def empty_copy(self) -> "AgentReplyCache":
+        """
+        Create a new empty cache with the same limits.
+        """
+        return AgentReplyCache(max_size=self.max_size, ttl=self.ttl)
+
+    def _get(self, key: str) -> Optional[MessageSequencePromise]:
+        promising_context = PromisingContext.get_current()
+        if self._promising_context is not promising_context:
+            # promises should not be reused across different promising contexts
+            self._promising_context = promising_context
+            self._entries.clear()
+            return None
+
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        cached_at, reply_sequence_promise = entry
+        if self.ttl is not None and time.monotonic() - cached_at > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return reply_sequence_promise
+
+    def _put(self, key: str, reply_sequence_promise: MessageSequencePromise) -> None:
+        self._entries[key] = (time.monotonic(), reply_sequence_promise)
+        self._entries.move_to_end(key)
+        if self.max_size is not None:
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _evict(self, key: str, reply_sequence_promise: MessageSequencePromise) -> None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is reply_sequence_promise:
+            del self._entries[key]
@@ -1,15 +1,19 @@
 """
-Make all the functions and classes in agent_aggregators, history_agents, and misc_agents
+Make all the functions and classes in agent_aggregators, batching, history_agents, misc_agents and remote
 available at the package level.
 """
 
-from miniagents.ext import agent_aggregators, history_agents, misc_agents
+from miniagents.ext import agent_aggregators, batching, history_agents, misc_agents, remote
 from miniagents.ext.agent_aggregators import *
+from miniagents.ext.batching import *
 from miniagents.ext.history_agents import *
 from miniagents.ext.misc_agents import *
+from miniagents.ext.remote import *
 
 __all__ = (
     [name for name in dir(agent_aggregators) if not name.startswith("_")]
+    + [name for name in dir(batching) if not name.startswith("_")]
     + [name for name in dir(history_agents) if not name.startswith("_")]
     + [name for name in dir(misc_agents) if not name.startswith("_")]
+    + [name for name in dir(remote) if not name.startswith("_")]
 )
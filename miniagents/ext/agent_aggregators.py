@@ -2,15 +2,25 @@
 This module contains agents that are used to aggregate other agents into chains, loops, dialogs and whatnot.
 """
 
-from typing import Union, Iterable, Optional
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from enum import Enum
+from typing import AsyncIterable, AsyncIterator, Callable, Union, Iterable, Optional
 
-from miniagents.ext.history_agents import in_memory_history_agent
+from miniagents.ext.history_agents import in_memory_history_agent, InMemoryHistory
 from miniagents.ext.misc_agents import console_echo_agent, console_prompt_agent
-from miniagents.messages import MessageSequencePromise
-from miniagents.miniagents import MiniAgent, InteractionContext, miniagent
-from miniagents.promising.sentinels import Sentinel, AWAIT, CLEAR
+from miniagents.messages import Message, MessagePromise, MessageSequencePromise
+from miniagents.miniagents import AgentReplySequencePromise, MiniAgent, InteractionContext, miniagent
+from miniagents.promising.promising import PromisingContext
+from miniagents.promising.sentinels import Sentinel, AWAIT, CLEAR, END_OF_QUEUE
+from miniagents.utils import amerge_by_arrival, aprefetch_messages
 
-DEFAULT_IN_MEMORY_HISTORY_AGENT = in_memory_history_agent.fork(message_list=[])
+logger = logging.getLogger(__name__)
+
+DEFAULT_IN_MEMORY_HISTORY_AGENT = in_memory_history_agent.fork(message_list=InMemoryHistory())
 
 
 @miniagent
@@ -62,26 +72,432 @@ async def agent_loop(
     ctx: InteractionContext,
     agents: Iterable[Union[Optional[MiniAgent], Sentinel]],
     raise_keyboard_interrupt: bool = True,
+    lookahead: Optional[int] = None,
 ) -> None:
     """
     An agent that represents a loop that chains the given agents together in the order they are provided.
+
+    Instead of (or in addition to) AWAIT sentinels, which fully resolve the previous step before the next one is even
+    set up, `lookahead` can be used: then at most `lookahead` turns of the loop are scheduled ahead of the last
+    resolved turn (so the next turns can, for ex., prefetch history or warm up while the previous answer is still
+    being streamed). This also bounds the number of unresolved turns the loop keeps in memory.
     """
     agents = list(agents)
-    if not any(agent is AWAIT for agent in agents) or not any(isinstance(agent, MiniAgent) for agent in agents):
+    if lookahead is not None and lookahead < 1:
+        raise ValueError(f"lookahead should be at least 1, got {lookahead}")
+    has_await = any(agent is AWAIT for agent in agents)
+    real_agents = [agent for agent in agents if agent is not None]
+    if (
+        not (has_await or lookahead)
+        or not any(isinstance(agent, MiniAgent) for agent in agents)
+        or (not has_await and real_agents[-1] is CLEAR)
+    ):
         raise ValueError(
-            "There should be at least one AWAIT sentinel in the list of agents and at least one real agent "
-            "in order for the loop not to schedule the turns infinitely without actually running them."
+            "There should be at least one AWAIT sentinel in the list of agents (or a lookahead should be set, in "
+            "which case the last step of the loop should not be CLEAR) and at least one real agent in order for the "
+            "loop not to schedule the turns infinitely without actually running them."
         )
 
     message_promises = ctx.message_promises
+    pending_turns = deque()
     try:
         while True:
+            if lookahead:
+                while len(pending_turns) >= lookahead:
+                    pending_turn = pending_turns.popleft()
+                    if isinstance(pending_turn, MessageSequencePromise):
+                        await pending_turn
             message_promises = await _achain_agents(agents, message_promises)
+            if lookahead:
+                pending_turns.append(message_promises)
     except KeyboardInterrupt:
         if raise_keyboard_interrupt:
             raise
 
 
+class ParallelMergeStrategy(Enum):
+    """
+    How `agent_parallel` merges the replies of its agents:
+    - CONCAT: all the replies, concatenated in the order the agents were declared in;
+    - INTERLEAVE: all the reply messages, in the order of their arrival (no matter which agent they come from);
+    - FIRST: only the reply that is complete first;
+    - QUORUM: the first `quorum` replies that are complete, in the order of their completion.
+    """
+
+    CONCAT = "concat"
+    INTERLEAVE = "interleave"
+    FIRST = "first"
+    QUORUM = "quorum"
+
+
+@miniagent
+async def agent_parallel(
+    ctx: InteractionContext,
+    agents: Iterable[Optional[MiniAgent]],
+    strategy: Union[ParallelMergeStrategy, str] = ParallelMergeStrategy.CONCAT,
+    quorum: Optional[int] = None,
+) -> None:
+    """
+    An agent that sends the same input to all the given agents at once and merges their replies according to
+    `strategy` (see `ParallelMergeStrategy`). The input sequence is shared by all the agents as is (it is not
+    flattened again for each of them). With FIRST and QUORUM strategies the agent calls that are not needed anymore
+    are cancelled and their replies are discarded (if they fail, the next ones to complete are taken instead).
+    """
+    strategy = ParallelMergeStrategy(strategy)
+    replies = [agent.inquire(ctx.message_promises, start_asap=True) for agent in agents if agent is not None]
+
+    if strategy is ParallelMergeStrategy.CONCAT:
+        ctx.reply(replies)
+    elif strategy is ParallelMergeStrategy.INTERLEAVE:
+        ctx.reply(amerge_by_arrival(replies))
+    else:
+        if strategy is ParallelMergeStrategy.FIRST:
+            quorum = 1
+        if quorum is None or not 0 < quorum <= len(replies):
+            raise ValueError(f"quorum should be between 1 and the number of agents ({len(replies)}), got {quorum}")
+        ctx.reply(await _afirst_complete_replies(replies, quorum))
+
+
+async def _afirst_complete_replies(
+    replies: list[AgentReplySequencePromise], quorum: int
+) -> list[AgentReplySequencePromise]:
+    async def asettle(reply: MessageSequencePromise) -> Optional[Exception]:
+        try:
+            await reply
+        except Exception as exc:  # pylint: disable=broad-except
+            return exc
+        return None
+
+    promising_context = PromisingContext.get_current()
+    pending = {promising_context.start_asap(asettle(reply)): idx for idx, reply in enumerate(replies)}
+    complete_replies = []
+    errors = []
+    try:
+        while pending and len(complete_replies) < quorum:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for settle_task in sorted(done, key=pending.get):
+                reply = replies[pending.pop(settle_task)]
+                if settle_task.result() is None:
+                    complete_replies.append(reply)
+                else:
+                    errors.append(settle_task.result())
+    finally:
+        for settle_task, idx in pending.items():
+            settle_task.cancel()
+            replies[idx].cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if len(complete_replies) < quorum:
+        raise errors[0]
+    return complete_replies[:quorum]
+
+
+@miniagent
+async def agent_map_reduce(
+    ctx: InteractionContext,
+    mapper_agent: MiniAgent,
+    reducer_agent: MiniAgent,
+    chunk_size: Optional[int] = None,
+    max_chunk_chars: Optional[int] = None,
+    fan_in: int = 4,
+    max_concurrency: int = 10,
+) -> None:
+    """
+    An agent that splits its input messages into chunks (of at most `chunk_size` messages and/or at most
+    `max_chunk_chars` characters - a message that is longer than that on its own makes a chunk of its own), runs
+    `mapper_agent` on every chunk (at most `max_concurrency` mapper calls at a time) and combines the partial results
+    with `reducer_agent` in a balanced tree (every reducer call gets the results of up to `fan_in` adjacent nodes of
+    the level below, in their original order). A reducer call starts as soon as all of its inputs are ready, so the
+    levels of the tree don't wait for each other. The reply is the reply of the root of the tree.
+    """
+    if chunk_size is None and max_chunk_chars is None:
+        raise ValueError("either chunk_size or max_chunk_chars (or both) should be provided")
+    if fan_in < 2:
+        raise ValueError(f"fan_in should be at least 2, got {fan_in}")
+
+    message_promises = ctx.message_promises
+    if max_chunk_chars is not None:
+        # the lengths of the messages are needed for chunking - let's not resolve the messages one by one
+        message_promises = aprefetch_messages(message_promises, prefetch=max_concurrency)
+    chunks = _achunk_messages(message_promises, chunk_size=chunk_size, max_chunk_chars=max_chunk_chars)
+    reduce_tree = _ReduceTree(reducer_agent, fan_in)
+
+    async def amap() -> None:
+        try:
+            async for chunk_index, mapped_promise in mapper_agent.inquire_many(
+                chunks, max_concurrency=max_concurrency, ordered=False, with_index=True
+            ):
+                # the replies are yielded as soon as they are resolved (a slow chunk doesn't hold back the rest)
+                reduce_tree.events.put_nowait((0, mapped_promise, chunk_index))
+        except Exception as exc:  # pylint: disable=broad-except
+            reduce_tree.events.put_nowait(exc)
+        else:
+            reduce_tree.events.put_nowait(END_OF_QUEUE)
+
+    map_task = PromisingContext.get_current().start_asap(amap())
+    try:
+        root_promise = await reduce_tree.areduce()
+        if root_promise is not None:
+            ctx.reply(root_promise)
+    finally:
+        map_task.cancel()
+        reduce_tree.cancel()
+
+
+async def _achunk_messages(
+    message_promises: AsyncIterable[MessagePromise], chunk_size: Optional[int], max_chunk_chars: Optional[int]
+) -> AsyncIterator[list[Union[Message, MessagePromise]]]:
+    chunk = []
+    chunk_chars = 0
+    async for message_promise in message_promises:
+        message_chars = 0
+        if max_chunk_chars is not None:
+            message_promise = await message_promise
+            message_chars = len(str(message_promise))
+            if chunk and chunk_chars + message_chars > max_chunk_chars:
+                yield chunk
+                chunk, chunk_chars = [], 0
+
+        chunk.append(message_promise)
+        chunk_chars += message_chars
+        if chunk_size is not None and len(chunk) >= chunk_size:
+            yield chunk
+            chunk, chunk_chars = [], 0
+    if chunk:
+        yield chunk
+
+
+class _ReduceTree:
+    """
+    A balanced reduce tree that is built as the mapped results arrive. The nodes of level 0 are the mapped results
+    (in the order of the chunks), node `i` of level `L + 1` is the reduction of nodes `i * fan_in ... (i + 1) * fan_in
+    - 1` of level `L`. The number of nodes of every level only becomes known when all the chunks are mapped (until
+    then only the full groups of nodes are reduced).
+    """
+
+    def __init__(self, reducer_agent: MiniAgent, fan_in: int) -> None:
+        self.reducer_agent = reducer_agent
+        self.fan_in = fan_in
+        self.events = asyncio.Queue()
+
+        self._mapped_count: Optional[int] = None
+        self._ready_nodes: dict[int, dict[int, MessageSequencePromise]] = {}
+        self._reduced_groups: set[tuple[int, int]] = set()
+        # the reductions that are being awaited (together with the tasks that await them), by (level, index) of their
+        # nodes
+        self._reductions_in_flight: dict[tuple[int, int], tuple[MessageSequencePromise, asyncio.Task]] = {}
+        self._reduce_tasks: list[asyncio.Task] = []
+        self._root: Optional[MessageSequencePromise] = None
+
+    async def areduce(self) -> Optional[MessageSequencePromise]:
+        """
+        Process the events until the root of the tree is known and return it (None if there were no chunks at all).
+        The root is returned as soon as its reducer is called (without waiting for the reduction to be resolved).
+        """
+        while self._root is None:
+            event = await self.events.get()
+            if isinstance(event, Exception):
+                raise event
+            if event is END_OF_QUEUE:
+                self._mapped_count = len(self._ready_nodes.get(0, ()))
+                if not self._mapped_count:
+                    return None
+                for (level, _), (reduced_promise, reduce_task) in self._reductions_in_flight.items():
+                    if self._level_size(level) == 1:
+                        # the root is already being reduced - no need to wait for the reduction to be resolved (the
+                        # task that awaits it should not be cancelled, though, it might be the one that resolves it)
+                        self._reduce_tasks.remove(reduce_task)
+                        self._root = reduced_promise
+                        return self._root
+                # now that the sizes of the levels are known, the incomplete groups can be reduced too (and a level of
+                # a single ready node, if any, turns out to be the root)
+                for level in sorted(self._ready_nodes):
+                    if self._level_size(level) == 1:
+                        self._root = self._ready_nodes[level][0]
+                        break
+                    for group in range(math.ceil(self._level_size(level) / self.fan_in)):
+                        self._try_reducing(level, group)
+            else:
+                self._add_ready_node(*event)
+        return self._root
+
+    def cancel(self) -> None:
+        """
+        Cancel the tasks that wait for the reductions to be resolved.
+        """
+        for reduce_task in self._reduce_tasks:
+            reduce_task.cancel()
+
+    def _level_size(self, level: int) -> Optional[int]:
+        if self._mapped_count is None:
+            return None
+        size = self._mapped_count
+        for _ in range(level):
+            size = math.ceil(size / self.fan_in)
+        return size
+
+    def _add_ready_node(self, level: int, node_promise: MessageSequencePromise, index: int) -> None:
+        self._ready_nodes.setdefault(level, {})[index] = node_promise
+        if self._level_size(level) == 1:
+            # the only node of the level (its group was reduced before the number of chunks became known)
+            self._root = node_promise
+        else:
+            self._try_reducing(level, index // self.fan_in)
+
+    def _try_reducing(self, level: int, group: int) -> None:
+        level_size = self._level_size(level)
+        if (level, group) in self._reduced_groups or level_size == 1:
+            return
+        group_end = (group + 1) * self.fan_in if level_size is None else min((group + 1) * self.fan_in, level_size)
+        level_nodes = self._ready_nodes.get(level, {})
+        if any(index not in level_nodes for index in range(group * self.fan_in, group_end)):
+            return
+
+        self._reduced_groups.add((level, group))
+        children = [level_nodes[index] for index in range(group * self.fan_in, group_end)]
+        is_root = self._level_size(level + 1) == 1
+        if len(children) == 1:
+            # a lone node is promoted to the next level as is
+            reduced_promise = children[0]
+        else:
+            reduced_promise = self.reducer_agent.inquire(children, start_asap=True)
+
+        if is_root:
+            self._root = reduced_promise
+        elif len(children) == 1:
+            self._add_ready_node(level + 1, reduced_promise, index=group)
+        else:
+            reduce_task = PromisingContext.get_current().start_asap(
+                self._await_reduction(level + 1, group, reduced_promise)
+            )
+            self._reductions_in_flight[(level + 1, group)] = reduced_promise, reduce_task
+            self._reduce_tasks.append(reduce_task)
+
+    async def _await_reduction(self, level: int, index: int, reduced_promise: MessageSequencePromise) -> None:
+        try:
+            await reduced_promise
+        except Exception:  # pylint: disable=broad-except
+            pass  # the error will be raised to whoever consumes the reply of the root
+        del self._reductions_in_flight[(level, index)]
+        self.events.put_nowait((level, reduced_promise, index))
+
+
+@miniagent
+async def agent_graph(
+    ctx: InteractionContext,
+    nodes: dict[str, MiniAgent],
+    edges: Iterable[tuple[str, str]],
+    output_nodes: Optional[Iterable[str]] = None,
+    on_critical_path: Optional[Callable[[list[tuple[str, float]]], None]] = None,
+) -> None:
+    """
+    An agent that runs a DAG of agents. `nodes` maps node names to agents, `edges` are `(from_node, to_node)` pairs
+    (the reply of `from_node` is fed into `to_node`). The nodes without incoming edges get the input of this agent,
+    the rest get the replies of their predecessors (concatenated in the order of the edges). All the nodes are
+    started right away (in topological order), so every node starts as soon as its inputs are streaming. The reply
+    consists of the replies of `output_nodes` (the nodes without outgoing edges by default).
+
+    Once all the nodes are done, the critical path (the chain of nodes that determined the total duration, as
+    `(node_name, seconds_since_start)` pairs) is passed to `on_critical_path` (and logged at the DEBUG level).
+    """
+    edges = list(edges)
+    node_order = _topological_order(nodes, edges)
+    predecessors = {node_name: [] for node_name in nodes}
+    for from_node, to_node in edges:
+        predecessors[to_node].append(from_node)
+    if output_nodes is None:
+        nodes_with_successors = {from_node for from_node, _ in edges}
+        output_nodes = [node_name for node_name in nodes if node_name not in nodes_with_successors]
+    output_nodes = list(output_nodes)
+
+    start = time.monotonic()
+    replies = _inquire_graph_nodes(nodes, node_order, predecessors, ctx.message_promises)
+    ctx.reply([replies[node_name] for node_name in output_nodes])
+
+    finish_times: dict[str, float] = {}
+
+    async def await_node(node_name: str) -> None:
+        try:
+            await replies[node_name]
+        except Exception:  # pylint: disable=broad-except
+            pass  # the error will be raised to whoever consumes the reply
+        finish_times[node_name] = time.monotonic() - start
+
+    await asyncio.gather(*(await_node(node_name) for node_name in node_order))
+
+    critical_path = _critical_path(output_nodes, predecessors, finish_times)
+    logger.debug(
+        "The critical path of the agent graph: %s",
+        " -> ".join(f"{node_name} ({finish_time:.3f}s)" for node_name, finish_time in critical_path),
+    )
+    if on_critical_path:
+        on_critical_path(critical_path)
+
+
+def _inquire_graph_nodes(
+    nodes: dict[str, MiniAgent],
+    node_order: list[str],
+    predecessors: dict[str, list[str]],
+    graph_input: MessageSequencePromise,
+) -> dict[str, MessageSequencePromise]:
+    replies = {}
+    for node_name in node_order:
+        node_predecessors = predecessors[node_name]
+        if not node_predecessors:
+            node_input = graph_input
+        elif len(node_predecessors) == 1:
+            node_input = replies[node_predecessors[0]]  # shared as is, without being flattened again
+        else:
+            node_input = [replies[predecessor] for predecessor in node_predecessors]
+        replies[node_name] = nodes[node_name].inquire(node_input, start_asap=True)
+    return replies
+
+
+def _critical_path(
+    output_nodes: list[str], predecessors: dict[str, list[str]], finish_times: dict[str, float]
+) -> list[tuple[str, float]]:
+    """
+    Walk back from the output node that finished last, always following the predecessor that finished last.
+    """
+    critical_path = []
+    node_name = max(output_nodes, key=finish_times.get, default=None)
+    while node_name is not None:
+        critical_path.append((node_name, finish_times[node_name]))
+        node_name = max(predecessors[node_name], key=finish_times.get, default=None)
+    critical_path.reverse()
+    return critical_path
+
+
+def _topological_order(nodes: dict[str, MiniAgent], edges: list[tuple[str, str]]) -> list[str]:
+    """
+    Sort the nodes of a graph topologically (Kahn's algorithm), preserving the declaration order where possible.
+    Raise a ValueError if the graph refers to unknown nodes or has cycles.
+    """
+    successors = {node_name: [] for node_name in nodes}
+    in_degrees = dict.fromkeys(nodes, 0)
+    for from_node, to_node in edges:
+        for node_name in (from_node, to_node):
+            if node_name not in nodes:
+                raise ValueError(f"unknown node in the edge ({from_node!r}, {to_node!r}): {node_name!r}")
+        successors[from_node].append(to_node)
+        in_degrees[to_node] += 1
+
+    ready = deque(node_name for node_name, in_degree in in_degrees.items() if in_degree == 0)
+    node_order = []
+    while ready:
+        node_name = ready.popleft()
+        node_order.append(node_name)
+        for successor in successors[node_name]:
+            in_degrees[successor] -= 1
+            if in_degrees[successor] == 0:
+                ready.append(successor)
+
+    if len(node_order) < len(nodes):
+        cyclic_nodes = [node_name for node_name in nodes if in_degrees[node_name] > 0]
+        raise ValueError(f"the agent graph has cycles (involving the nodes: {', '.join(cyclic_nodes)})")
+    return node_order
+
+
 @miniagent
 async def agent_chain(ctx: InteractionContext, agents: Iterable[Union[Optional[MiniAgent], Sentinel]]) -> None:
     """
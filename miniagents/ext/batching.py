@@ -0,0 +1,142 @@
+"""
+This module provides micro-batching of agent calls: concurrent calls are collected into batches that are processed by
+a user-supplied batch function in one go (useful for backends that process a batch much more efficiently than the
+same number of single calls - local classifiers, embedding-style scorers, LLM endpoints that accept multiple prompts
+etc.)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional, Sequence
+
+from miniagents.messages import Message
+from miniagents.miniagent_typing import MessageType
+from miniagents.miniagents import InteractionContext, miniagent
+from miniagents.promising.promising import PromisingContext
+
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[list[tuple[Message, ...]]], Awaitable[Sequence[MessageType]]]
+
+
+class MicroBatcher:
+    """
+    Collects the inputs of concurrent agent calls into batches and hands every batch over to `batch_func`. A batch
+    is dispatched as soon as it has `max_batch_size` inputs or when `max_wait` seconds have passed since the first
+    input of the batch arrived (whichever happens first). `batch_func` receives a list of inputs (each input is a
+    tuple of the input messages of one call) and should return a sequence of replies of the same length (the replies
+    are split back to the individual callers in the same order).
+
+    The attributes `batch_count`, `item_count` and `total_added_latency` as well as the properties `fill_ratio` and
+    `average_added_latency` can be used for instrumentation (the added latency is the time an input spent waiting
+    for its batch to be dispatched).
+    """
+
+    def __init__(self, batch_func: BatchFunction, max_batch_size: int = 16, max_wait: float = 0.005) -> None:
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size should be positive, got {max_batch_size}")
+
+        self.batch_func = batch_func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self.batch_count = 0
+        self.item_count = 0
+        self.total_added_latency = 0.0
+        self.max_added_latency = 0.0
+
+        # NOTE: the futures and the timer are created lazily (asyncio primitives should not be created outside of an
+        # event loop)
+        self._pending: list[tuple[tuple[Message, ...], asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def fill_ratio(self) -> float:
+        """
+        The average size of the dispatched batches relative to `max_batch_size`.
+        """
+        return self.item_count / (self.batch_count * self.max_batch_size) if self.batch_count else 0.0
+
+    @property
+    def average_added_latency(self) -> float:
+        """
+        The average time (in seconds) the inputs spent waiting for their batches to be dispatched.
+        """
+        return self.total_added_latency / self.item_count if self.item_count else 0.0
+
+    async def asubmit(self, messages: Sequence[Message]) -> MessageType:
+        """
+        Add the input messages of one call to the current batch and wait for the reply to this input.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((tuple(messages), future, time.monotonic()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self.flush)
+
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # the caller is gone - its input should not take up a place in the batch (if the batch is not dispatched
+            # yet)
+            self._pending = [pending for pending in self._pending if pending[1] is not future]
+            raise
+
+    def flush(self) -> None:
+        """
+        Dispatch the current batch right away (without waiting for it to be filled up).
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # the futures of the callers that were cancelled are already done
+        batch = [pending for pending in self._pending if not pending[1].done()]
+        self._pending = []
+        if not batch:
+            return
+
+        now = time.monotonic()
+        self.batch_count += 1
+        self.item_count += len(batch)
+        for _, _, submitted_at in batch:
+            self.total_added_latency += now - submitted_at
+            self.max_added_latency = max(self.max_added_latency, now - submitted_at)
+
+        PromisingContext.get_current().start_asap(self._arun_batch(batch))
+
+    async def _arun_batch(self, batch: list[tuple[tuple[Message, ...], asyncio.Future, float]]) -> None:
+        # some callers might have been cancelled after the batch was dispatched, but before this task started
+        batch = [pending for pending in batch if not pending[1].done()]
+        if not batch:
+            return
+        futures = [future for _, future, _ in batch]
+        try:
+            replies = await self.batch_func([messages for messages, _, _ in batch])
+            if len(replies) != len(batch):
+                raise ValueError(
+                    f"the batch function returned {len(replies)} replies for a batch of {len(batch)} inputs"
+                )
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("A batch of %s inputs failed", len(batch), exc_info=True)
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, reply in zip(futures, replies):
+            if not future.done():  # the caller might have been cancelled
+                future.set_result(reply)
+
+
+@miniagent
+async def micro_batching_agent(ctx: InteractionContext, batcher: MicroBatcher) -> None:
+    """
+    An agent that replies with the result of `batcher.batch_func` for its input messages, processed in one batch
+    together with the inputs of other concurrent calls. Fork it with a `MicroBatcher`, for ex.:
+
+    `scorer_agent = micro_batching_agent.fork(alias="SCORER", batcher=MicroBatcher(ascore_batch, max_batch_size=32))`
+    """
+    ctx.reply(await batcher.asubmit(await ctx.message_promises))
@@ -3,22 +3,124 @@ This module provides agents working with chat history.
 """
 
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Optional, Union
+from typing import AsyncIterator, Optional, Union, Iterable
 
 from markdown_it import MarkdownIt
 
-from miniagents.messages import Message
+from miniagents.messages import Message, MessagePromise, MessageSequencePromise
 from miniagents.miniagents import InteractionContext, miniagent
+from miniagents.promising.promising import PromisingContext
+
+
+class InMemoryHistory:
+    """
+    An append-only chat history that is kept in memory. The same history object can be shared between the turns of
+    a conversation without being copied. The promises of the past messages are created only once and the sequence
+    promises of the history are views over its storage (they don't copy the past messages), so replying with the
+    history doesn't convert or copy all the past messages over and over again on every turn.
+    """
+
+    def __init__(self, messages: Iterable[Message] = ()) -> None:
+        self._messages: list[Message] = list(messages)
+        self._message_promises: list[MessagePromise] = []
+        self._sequence_promise_cache: dict[Optional[int], MessageSequencePromise] = {}
+        self._promising_context: Optional[PromisingContext] = None
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def append(self, message: Message) -> None:
+        """
+        Append a message to the end of the history.
+        """
+        self._messages.append(message)
+        self._sequence_promise_cache.clear()
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        """
+        Append multiple messages to the end of the history.
+        """
+        self._messages.extend(messages)
+        self._sequence_promise_cache.clear()
+
+    def last_n(self, n: Optional[int] = None) -> tuple[Message, ...]:
+        """
+        Get the last `n` messages of the history (or all of them if `n` is None).
+        """
+        if n is None:
+            return tuple(self._messages)
+        return tuple(self._messages[max(len(self._messages) - n, 0) :])
+
+    def as_sequence_promise(self, last_n: Optional[int] = None) -> MessageSequencePromise:
+        """
+        Get an already resolved sequence promise of the last `last_n` messages of the history (or of all of them if
+        `last_n` is None).
+        """
+        promising_context = PromisingContext.get_current()
+        if self._promising_context is not promising_context:
+            # promises should not be reused across different promising contexts
+            self._promising_context = promising_context
+            # (not cleared in place - the views that were handed out before still refer to the old list)
+            self._message_promises = []
+            self._sequence_promise_cache.clear()
+
+        sequence_promise = self._sequence_promise_cache.get(last_n)
+        if sequence_promise is None:
+            # the promises of the messages that were appended since the last call are created here
+            self._message_promises.extend(
+                message.as_promise for message in self._messages[len(self._message_promises) :]
+            )
+            start = 0 if last_n is None else max(len(self._messages) - last_n, 0)
+            sequence_promise = _InMemoryHistoryView(self._messages, self._message_promises, start, len(self._messages))
+            self._sequence_promise_cache[last_n] = sequence_promise
+        return sequence_promise
+
+
+class _InMemoryHistoryView(MessageSequencePromise):
+    """
+    A sequence promise of the messages `start ... stop - 1` of an `InMemoryHistory`. Instead of keeping its own copy
+    of the message promises for replaying, every consumer of this promise reads them straight from the storage of
+    the history (it is append-only, so the range never changes). The tuple of the messages is only built if the
+    promise is awaited.
+    """
+
+    def __init__(self, messages: list[Message], message_promises: list[MessagePromise], start: int, stop: int) -> None:
+        self._messages = messages
+        self._message_promises = message_promises
+        self._start = start
+        self._stop = stop
+        super().__init__(prefill_pieces=(), start_asap=False)
+
+    def __aiter__(self) -> AsyncIterator[MessagePromise]:
+        return self._aiter_message_promises()
+
+    async def _aiter_message_promises(self) -> AsyncIterator[MessagePromise]:
+        for index in range(self._start, self._stop):
+            yield self._message_promises[index]
+
+    async def _resolver(self) -> tuple[Message, ...]:
+        return tuple(islice(self._messages, self._start, self._stop))
 
 
 @miniagent
-async def in_memory_history_agent(ctx: InteractionContext, message_list: list[Message]) -> None:
+async def in_memory_history_agent(
+    ctx: InteractionContext,
+    message_list: Union[InMemoryHistory, list[Message]],
+    last_n: Optional[int] = None,
+) -> None:
     """
-    TODO Oleksandr: docstring
+    An agent that appends the incoming messages to the history and replies with the full history (or only with the
+    last `last_n` messages of it). The history can be a plain list, but `InMemoryHistory` is much cheaper in long
+    conversations (the past messages are not converted into promises again on every turn).
     """
-    message_list.extend(await ctx.message_promises)
-    ctx.reply(message_list)
+    if isinstance(message_list, InMemoryHistory):
+        message_list.extend(await ctx.message_promises)
+        ctx.reply(message_list.as_sequence_promise(last_n=last_n))
+    else:
+        message_list.extend(await ctx.message_promises)
+        ctx.reply(message_list if last_n is None else message_list[max(len(message_list) - last_n, 0) :])
 
 
 @miniagent
@@ -5,11 +5,11 @@ This module integrates Anthropic language models with MiniAgents.
 
 import logging
 import typing
-from functools import cache
+from functools import cache, partial
 from pprint import pformat
 from typing import AsyncIterator, Any, Optional
 
-from miniagents.ext.llm.llm_common import message_to_llm_dict, AssistantMessage
+from miniagents.ext.llm.llm_common import message_to_llm_dict, AssistantMessage, HedgingPolicy
 from miniagents.miniagents import miniagent, MiniAgents, InteractionContext
 
 if typing.TYPE_CHECKING:
@@ -34,10 +34,12 @@ async def anthropic_agent(
     message_delimiter_for_same_role: str = "\n\n",
     async_client: Optional["anthropic_original.AsyncAnthropic"] = None,
     reply_metadata: Optional[dict[str, Any]] = None,
+    hedging: Optional[HedgingPolicy] = None,
     **kwargs,
 ) -> None:
     """
-    An agent that represents Large Language Models by Anthropic.
+    An agent that represents Large Language Models by Anthropic. `hedging` (a `HedgingPolicy`, not hashable, hence
+    it should be passed via `fork()`) enables hedged requests.
     """
     if not async_client:
         async_client = _default_anthropic_client()
@@ -45,7 +47,7 @@ async def anthropic_agent(
     if stream is None:
         stream = MiniAgents.get_current().stream_llm_tokens_by_default
 
-    async def message_token_streamer(metadata_so_far: dict[str, Any]) -> AsyncIterator[str]:
+    async def message_token_streamer(metadata_so_far: dict[str, Any], **attempt_kwargs) -> AsyncIterator[str]:
         message_dicts = [message_to_llm_dict(msg) for msg in await ctx.message_promises]
         message_dicts = _fix_message_dicts(
             message_dicts,
@@ -78,14 +80,17 @@ async def anthropic_agent(
         if stream:
             # pylint: disable=not-async-context-manager
             async with async_client.messages.stream(
-                messages=message_dicts, system=system_combined, model=model, **kwargs
+                messages=message_dicts, system=system_combined, **{"model": model, **kwargs, **attempt_kwargs}
             ) as response:
                 async for token in response.text_stream:
                     yield token
                 anthropic_final_message = await response.get_final_message()
         else:
             anthropic_final_message = await async_client.messages.create(
-                messages=message_dicts, stream=False, system=system_combined, model=model, **kwargs
+                messages=message_dicts,
+                stream=False,
+                system=system_combined,
+                **{"model": model, **kwargs, **attempt_kwargs},
             )
             if len(anthropic_final_message.content) != 1:
                 raise RuntimeError(
@@ -99,7 +104,9 @@ async def anthropic_agent(
     ctx.reply(
         AnthropicMessage.promise(
             start_asap=True,  # TODO Oleksandr: should this be customizable ?
-            message_token_streamer=message_token_streamer,
+            message_token_streamer=(
+                message_token_streamer if hedging is None else partial(hedging.astream, message_token_streamer)
+            ),
             # preliminary metadata:
             model=model,
             agent_alias=ctx.this_agent.alias,
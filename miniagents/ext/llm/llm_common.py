@@ -2,9 +2,19 @@
 Common classes and functions for working with large language models.
 """
 
-from typing import Any, Optional
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Optional
 
 from miniagents.messages import Message
+from miniagents.promising.sentinels import END_OF_QUEUE
+
+logger = logging.getLogger(__name__)
+
+AttemptStreamer = Callable[..., AsyncIterator[str]]
 
 
 class UserMessage(Message):
@@ -46,3 +56,181 @@ def message_to_llm_dict(message: Message) -> dict[str, Any]:
         "role": role,
         "content": str(message),
     }
+
+
+class HedgingPolicy:
+    """
+    Hedging of LLM requests (pass it to an LLM agent as `hedging`, for ex. via `fork()`). If a request has not
+    produced its first token within the `percentile` of the recently observed times to first token (TTFT), a
+    duplicate request is fired (with `hedge_kwargs` applied on top of the agent kwargs, which makes it possible to
+    hedge with an alternate model, for ex.). The request that produces the first token first wins - the other one is
+    cancelled and its partial output (including its metadata) is discarded. Hedging only starts once at least
+    `min_samples` TTFT observations have been collected (the last `window` observations are kept).
+
+    The attributes `request_count`, `hedge_count` and `hedge_win_count` can be used for instrumentation.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+        max_hedges: int = 1,
+        hedge_kwargs: Optional[dict[str, Any]] = None,
+    ) -> None:
+        if not 0 < percentile <= 1:
+            raise ValueError(f"percentile should be in (0, 1], got {percentile}")
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_hedges = max_hedges
+        self.hedge_kwargs = dict(hedge_kwargs or {})
+
+        self.request_count = 0
+        self.hedge_count = 0
+        self.hedge_win_count = 0
+        self._ttft_samples: deque[float] = deque(maxlen=window)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        The number of seconds after which a request without a first token is hedged (None if there are not enough
+        TTFT observations yet).
+        """
+        if len(self._ttft_samples) < max(self.min_samples, 1):
+            return None
+        samples = sorted(self._ttft_samples)
+        return samples[max(math.ceil(self.percentile * len(samples)) - 1, 0)]
+
+    def record_ttft(self, ttft: float) -> None:
+        """
+        Record an observed time to first token (in seconds).
+        """
+        self._ttft_samples.append(ttft)
+
+    async def astream(self, attempt_streamer: AttemptStreamer, metadata_so_far: dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Stream the tokens of the winning request. `attempt_streamer(metadata, **hedge_kwargs)` should start a request
+        and stream its tokens (filling in `metadata` along the way). Every request gets its own copy of
+        `metadata_so_far` and only the metadata of the winning request ends up in `metadata_so_far`.
+        """
+        self.request_count += 1
+        delay = self.hedge_delay()
+        # the TTFT of a hedge that wins is also measured from the start of the original request (that is the TTFT
+        # that the consumer actually observes)
+        started_at = time.monotonic()
+        attempts = [_HedgedAttempt(attempt_streamer, metadata_so_far, {}, started_at)]
+        try:
+            winner = await self._await_winner(attempts, delay, attempt_streamer, metadata_so_far, started_at)
+            for attempt in attempts:
+                if attempt is not winner:
+                    # the partial output of the loser is discarded
+                    await attempt.acancel()
+            if winner is not attempts[0]:
+                self.hedge_win_count += 1
+            self.record_ttft(winner.ttft)
+
+            async for token in winner.atokens():
+                yield token
+            metadata_so_far.update(winner.metadata)
+        finally:
+            for attempt in attempts:
+                await attempt.acancel()
+
+    async def _await_winner(
+        self,
+        attempts: list["_HedgedAttempt"],
+        delay: Optional[float],
+        attempt_streamer: AttemptStreamer,
+        metadata_so_far: dict[str, Any],
+        started_at: float,
+    ) -> "_HedgedAttempt":
+        pending = {attempts[0].first_token_future}
+        while True:
+            can_hedge = delay is not None and len(attempts) <= self.max_hedges
+            done, pending = await asyncio.wait(
+                pending, timeout=delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            for attempt in attempts:
+                if attempt.first_token_future in done and not attempt.first_token_future.exception():
+                    return attempt
+
+            if not done:
+                # the first token is late - let's fire a duplicate request
+                logger.debug("No first token from an LLM after %.3f seconds, hedging the request", delay)
+                self.hedge_count += 1
+                attempts.append(_HedgedAttempt(attempt_streamer, metadata_so_far, self.hedge_kwargs, started_at))
+                pending.add(attempts[-1].first_token_future)
+            elif not pending:
+                # all the requests failed - let's raise the error of the original one
+                for attempt in attempts:
+                    if attempt.first_token_future.done():
+                        raise attempt.first_token_future.exception()
+
+
+class _HedgedAttempt:
+    """
+    One of the (possibly duplicate) requests of a hedged LLM call. The request is streamed from start to finish by a
+    single task (LLM clients don't tolerate their streams being entered in one task and consumed in another) and the
+    tokens are handed over through a queue.
+    """
+
+    def __init__(
+        self,
+        attempt_streamer: AttemptStreamer,
+        metadata_so_far: dict[str, Any],
+        hedge_kwargs: dict[str, Any],
+        started_at: float,
+    ) -> None:
+        # a shallow copy is enough - the preliminary metadata values are immutable
+        self.metadata = dict(metadata_so_far)
+        self.ttft: Optional[float] = None
+        # resolved upon the first token (or upon the end of an empty stream), fails if the request fails before that
+        self.first_token_future = asyncio.get_running_loop().create_future()
+        self._started_at = started_at
+        self._token_queue = asyncio.Queue()
+        self._error: Optional[Exception] = None  # an error that occurred after the first token
+        self._task = asyncio.create_task(self._astream(attempt_streamer, hedge_kwargs))
+
+    async def atokens(self) -> AsyncIterator[str]:
+        """
+        Stream the tokens of the request (the ones that were already received first).
+        """
+        token = await self._token_queue.get()
+        while token is not END_OF_QUEUE:
+            yield token
+            token = await self._token_queue.get()
+        if self._error:
+            raise self._error
+
+    async def acancel(self) -> None:
+        """
+        Cancel the request (if it is still running) and discard its output.
+        """
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        if not self.first_token_future.done():
+            self.first_token_future.cancel()
+        elif not self.first_token_future.cancelled():
+            self.first_token_future.exception()  # mark the error of a losing request as retrieved
+
+    async def _astream(self, attempt_streamer: AttemptStreamer, hedge_kwargs: dict[str, Any]) -> None:
+        token_iterator = attempt_streamer(self.metadata, **hedge_kwargs)
+        try:
+            async for token in token_iterator:
+                self._token_queue.put_nowait(token)
+                self._mark_first_token()
+            self._token_queue.put_nowait(END_OF_QUEUE)
+            self._mark_first_token()
+        except Exception as exc:  # pylint: disable=broad-except
+            if self.first_token_future.done():
+                self._error = exc
+                self._token_queue.put_nowait(END_OF_QUEUE)
+            else:
+                self.first_token_future.set_exception(exc)
+        finally:
+            await token_iterator.aclose()
+
+    def _mark_first_token(self) -> None:
+        if not self.first_token_future.done():
+            self.ttft = time.monotonic() - self._started_at
+            self.first_token_future.set_result(None)
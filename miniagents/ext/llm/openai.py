@@ -5,11 +5,11 @@ This module integrates OpenAI language models with MiniAgents.
 
 import logging
 import typing
-from functools import cache
+from functools import cache, partial
 from pprint import pformat
 from typing import AsyncIterator, Any, Optional
 
-from miniagents.ext.llm.llm_common import message_to_llm_dict, AssistantMessage
+from miniagents.ext.llm.llm_common import message_to_llm_dict, AssistantMessage, HedgingPolicy
 from miniagents.miniagents import (
     miniagent,
     MiniAgents,
@@ -37,10 +37,12 @@ async def openai_agent(
     n: int = 1,
     async_client: Optional["openai_original.AsyncOpenAI"] = None,
     reply_metadata: Optional[dict[str, Any]] = None,
+    hedging: Optional[HedgingPolicy] = None,
     **kwargs,
 ) -> None:
     """
-    An agent that represents Large Language Models by OpenAI.
+    An agent that represents Large Language Models by OpenAI. `hedging` (a `HedgingPolicy`, not hashable, hence it
+    should be passed via `fork()`) enables hedged requests.
     """
     if not async_client:
         async_client = _default_openai_client()
@@ -51,7 +53,7 @@ async def openai_agent(
     if n != 1:
         raise ValueError("Only n=1 is supported by MiniAgents for AsyncOpenAI().chat.completions.create()")
 
-    async def message_token_streamer(metadata_so_far: dict[str, Any]) -> AsyncIterator[str]:
+    async def message_token_streamer(metadata_so_far: dict[str, Any], **attempt_kwargs) -> AsyncIterator[str]:
         if system is None:
             message_dicts = []
         else:
@@ -67,7 +69,7 @@ async def openai_agent(
             logger.debug("SENDING TO OPENAI:\n\n%s\n", pformat(message_dicts))
 
         openai_response = await async_client.chat.completions.create(
-            messages=message_dicts, model=model, stream=stream, **kwargs
+            messages=message_dicts, stream=stream, **{"model": model, **kwargs, **attempt_kwargs}
         )
         if stream:
             async for chunk in openai_response:
@@ -103,7 +105,9 @@ async def openai_agent(
     ctx.reply(
         OpenAIMessage.promise(
             start_asap=True,  # TODO Oleksandr: should this be customizable ?
-            message_token_streamer=message_token_streamer,
+            message_token_streamer=(
+                message_token_streamer if hedging is None else partial(hedging.astream, message_token_streamer)
+            ),
             # preliminary metadata:
             model=model,
             agent_alias=ctx.this_agent.alias,
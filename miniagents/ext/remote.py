@@ -0,0 +1,468 @@
+"""
+This module exposes agents over asyncio streams (TCP or Unix sockets), so they can be called from other processes
+and hosts. `aserve_agent()` serves a `MiniAgent` and `remote_agent` (forked with a `RemoteAgentClient`) is a proxy
+agent whose replies are streamed back token by token as native message promises.
+
+The wire protocol consists of frames - a 4-byte big-endian length followed by a UTF-8 JSON object. Messages are
+sent as `Frozen.serialize()` (nested messages are sent separately and are referenced by their hash keys). Every
+message crosses a connection only once in either direction - after that it is referenced by its hash key only (which
+is what makes sending the same chat history turn after turn cheap). The client keeps at most `MAX_KNOWN_MESSAGES` of
+the most recently used messages known to both ends - it asks the server to forget the rest (and keeps them itself
+until the server confirms that it is not going to refer to them anymore).
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import struct
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterable, Optional
+
+from miniagents.ext.llm.anthropic import AnthropicMessage
+from miniagents.ext.llm.llm_common import AssistantMessage, SystemMessage, UserMessage
+from miniagents.ext.llm.openai import OpenAIMessage
+from miniagents.messages import BinaryMessage, Message, MessagePromise
+from miniagents.miniagents import AgentCallNode, AgentReplyNode, InteractionContext, MiniAgent, miniagent
+from miniagents.promising.ext.frozen import Frozen
+from miniagents.promising.promising import PromisingContext
+from miniagents.promising.sentinels import END_OF_QUEUE
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+MAX_KNOWN_MESSAGES = 10_000
+
+_FRAME_HEADER = struct.Struct(">I")
+_FROZEN_CLASSES: dict[str, type[Frozen]] = {}
+
+
+class RemoteAgentError(Exception):
+    """
+    An error that occurred on the other end of a remote agent connection.
+    """
+
+
+def register_frozen_class(frozen_class: type[Frozen]) -> type[Frozen]:
+    """
+    Register a `Frozen` subclass so the objects of this class can be rehydrated when they are received over the wire
+    (can be used as a class decorator). Both ends of a connection should register the same classes - the objects of
+    the classes that are not registered are rejected (the other end should not be able to make this one instantiate
+    an arbitrary class, `FileMessage`, for ex., would read a local file). `Frozen`, `Message`, `BinaryMessage`, the
+    agent interaction nodes and the message classes of `miniagents.ext.llm` are registered out of the box.
+    """
+    registered_class = _FROZEN_CLASSES.setdefault(frozen_class.__name__, frozen_class)
+    if registered_class is not frozen_class:
+        raise ValueError(
+            f"a different Frozen class named {frozen_class.__name__} is already registered: {registered_class!r}"
+        )
+    return frozen_class
+
+
+def resolve_frozen_class(class_name: str) -> type[Frozen]:
+    """
+    Find a registered `Frozen` subclass by its name (the value of the `class_` field).
+    """
+    frozen_class = _FROZEN_CLASSES.get(class_name)
+    if frozen_class is None:
+        raise ValueError(f"Frozen class {class_name} is not registered (see `register_frozen_class()`)")
+    return frozen_class
+
+
+for _frozen_class in (
+    Frozen,
+    Message,
+    BinaryMessage,
+    AgentCallNode,
+    AgentReplyNode,
+    UserMessage,
+    SystemMessage,
+    AssistantMessage,
+    OpenAIMessage,
+    AnthropicMessage,
+):
+    register_frozen_class(_frozen_class)
+
+
+class _RemoteChannel:
+    """
+    One end of a remote agent connection: framing, serialization and deduplication of messages (both ends keep the
+    messages that crossed the connection in either direction, keyed by their hash keys, until the client asks to
+    forget them).
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        # in the order of their last use (the client evicts the least recently used ones)
+        self.known_messages: OrderedDict[str, Message] = OrderedDict()
+        # the messages that the client asked the server to forget (the server may still refer to them until it
+        # confirms)
+        self.forgotten_messages: dict[str, Message] = {}
+        self.reader_task: Optional[asyncio.Task] = None
+        self.closed_error: Optional[BaseException] = None
+
+    def send_frame(self, frame: dict[str, Any]) -> None:
+        """
+        Write a length-prefixed JSON frame (the caller is responsible for draining the writer).
+        """
+        body = json.dumps(frame, ensure_ascii=False, default=_json_default).encode("utf-8")
+        self.writer.write(_FRAME_HEADER.pack(len(body)) + body)
+
+    async def aread_frame(self) -> Optional[dict[str, Any]]:
+        """
+        Read the next frame (or return None if the connection was closed by the other end).
+        """
+        try:
+            header = await self.reader.readexactly(_FRAME_HEADER.size)
+        except asyncio.IncompleteReadError as exc:
+            if exc.partial:
+                raise
+            return None  # the connection was closed
+        (size,) = _FRAME_HEADER.unpack(header)
+        if size > MAX_FRAME_SIZE:
+            raise ValueError(f"frame of {size} bytes exceeds MAX_FRAME_SIZE ({MAX_FRAME_SIZE} bytes)")
+        return json.loads(await self.reader.readexactly(size))
+
+    def send_message(self, message: Message) -> str:
+        """
+        Send the message (and its nested messages) unless the other end already knows it. Return its hash key.
+        """
+        for sub_message in (*message.sub_messages(), message):
+            hash_key = sub_message.hash_key
+            if hash_key in self.known_messages:
+                self.known_messages.move_to_end(hash_key)
+            else:
+                self.known_messages[hash_key] = sub_message
+                self.send_frame({"type": "message", "hash_key": hash_key, "data": sub_message.serialize()})
+        return message.hash_key
+
+    def receive_message(self, frame: dict[str, Any]) -> None:
+        """
+        Rehydrate the message from a "message" frame and remember it by its hash key.
+        """
+        self.known_messages[frame["hash_key"]] = self.rehydrate(frame["data"])
+
+    def get_message(self, hash_key: str) -> Message:
+        """
+        Get a message that the other end referred to by its hash key.
+        """
+        message = self.known_messages.get(hash_key)
+        if message is None:
+            return self.forgotten_messages[hash_key]
+        self.known_messages.move_to_end(hash_key)
+        return message
+
+    def forget_least_recent_messages(self) -> None:
+        """
+        Evict the least recently used messages beyond `MAX_KNOWN_MESSAGES` and ask the other end to forget them too
+        (called by the client - the server only forgets what it is asked to).
+        """
+        forgotten_hash_keys = []
+        while len(self.known_messages) > MAX_KNOWN_MESSAGES:
+            hash_key, message = self.known_messages.popitem(last=False)
+            self.forgotten_messages[hash_key] = message
+            forgotten_hash_keys.append(hash_key)
+        if forgotten_hash_keys:
+            self.send_frame({"type": "forget", "hash_keys": forgotten_hash_keys})
+
+    def rehydrate(self, value: Any) -> Any:
+        """
+        Turn a decoded JSON value back into `Frozen` objects, bytes and already known messages.
+        """
+        if isinstance(value, list):
+            return [self.rehydrate(sub_value) for sub_value in value]
+        if not isinstance(value, dict):
+            return value
+        if value.keys() == {"bytes_b64"}:
+            return base64.b64decode(value["bytes_b64"])
+
+        fields = {}
+        for key, sub_value in value.items():
+            if key.endswith("__hash_key"):
+                fields[key[: -len("__hash_key")]] = self.get_message(sub_value)
+            elif key.endswith("__hash_keys"):
+                fields[key[: -len("__hash_keys")]] = tuple(self.get_message(hash_key) for hash_key in sub_value)
+            else:
+                fields[key] = self.rehydrate(sub_value)
+        if "class_" in fields:
+            return resolve_frozen_class(fields["class_"])(**fields)
+        return fields
+
+    async def aclose(self) -> None:
+        """
+        Close the connection.
+        """
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def aserve_agent(
+    agent: MiniAgent,
+    host: Optional[str] = "127.0.0.1",
+    port: int = 0,
+    path: Optional[str] = None,
+) -> asyncio.AbstractServer:
+    """
+    Start serving the agent over TCP (or over a Unix socket if `path` is provided). Should be called from within a
+    `MiniAgents` context (the agent calls are run in it). The actual TCP port can be found in
+    `server.sockets[0].getsockname()` (if `port` is 0, a free port is chosen).
+    """
+
+    async def ahandle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        channel = _RemoteChannel(reader, writer)
+        promising_context = PromisingContext.get_current()
+        try:
+            while True:
+                frame = await channel.aread_frame()
+                if frame is None:
+                    break
+                if frame["type"] == "message":
+                    channel.receive_message(frame)
+                elif frame["type"] == "call":
+                    promising_context.start_asap(_aserve_call(channel, agent, frame))
+                elif frame["type"] == "forget":
+                    for hash_key in frame["hash_keys"]:
+                        channel.known_messages.pop(hash_key, None)
+                    # the frames that are sent after this one don't refer to the forgotten messages anymore
+                    channel.send_frame({"type": "forget_ack", "hash_keys": frame["hash_keys"]})
+                else:
+                    raise ValueError(f"unexpected frame type: {frame['type']}")
+        except Exception:  # pylint: disable=broad-except
+            logger.debug("A remote agent connection failed", exc_info=True)
+        finally:
+            await channel.aclose()
+
+    if path is not None:
+        return await asyncio.start_unix_server(ahandle_connection, path=path)
+    return await asyncio.start_server(ahandle_connection, host=host, port=port)
+
+
+async def _aserve_call(channel: _RemoteChannel, agent: MiniAgent, frame: dict[str, Any]) -> None:
+    call_id = frame["call_id"]
+    try:
+        messages = [channel.get_message(hash_key) for hash_key in frame["hash_keys"]]
+        async for message_promise in agent.inquire(messages, **channel.rehydrate(frame["function_kwargs"])):
+            channel.send_frame(
+                {
+                    "type": "message_start",
+                    "call_id": call_id,
+                    "metadata": message_promise.preliminary_metadata.frozen_fields_and_values(),
+                }
+            )
+            async for token in message_promise:
+                channel.send_frame({"type": "token", "call_id": call_id, "token": token})
+                await channel.writer.drain()
+            hash_key = channel.send_message(await message_promise)
+            channel.send_frame({"type": "message_end", "call_id": call_id, "hash_key": hash_key})
+        channel.send_frame({"type": "reply_end", "call_id": call_id})
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.debug("A remote agent call failed", exc_info=True)
+        channel.send_frame({"type": "error", "call_id": call_id, "error": f"{type(exc).__name__}: {exc}"})
+    try:
+        await channel.writer.drain()
+    except ConnectionError:
+        logger.debug("A remote agent connection was closed before the reply was sent", exc_info=True)
+
+
+class _RemoteReplyMessage:
+    """
+    The tokens and the final version of one reply message that is being received over the wire.
+    """
+
+    def __init__(self, metadata: dict[str, Any]) -> None:
+        self.metadata = metadata
+        self.token_queue = asyncio.Queue()
+        self.final_message: Optional[Message] = None
+
+
+class _RemoteMessagePromise(MessagePromise):
+    """
+    A promise of a reply message that is being received over the wire. It resolves into the exact message that was
+    sent by the server (rather than into a message assembled from the tokens).
+    """
+
+    def __init__(self, remote_message: _RemoteReplyMessage) -> None:
+        self._remote_message = remote_message
+        super().__init__(message_token_streamer=self._astream_tokens, **remote_message.metadata)
+
+    async def _astream_tokens(self, _) -> AsyncIterator[str]:
+        while True:
+            token = await self._remote_message.token_queue.get()
+            if token is END_OF_QUEUE:
+                return
+            if isinstance(token, BaseException):
+                raise token
+            yield token
+
+    async def _resolver(self) -> Message:
+        async for _ in self:
+            pass  # make sure that the message was received in full
+        return self._remote_message.final_message
+
+
+class RemoteAgentClient:
+    """
+    A connection to an agent that is served with `aserve_agent()` (over TCP or over a Unix socket if `path` is
+    provided). The connection is opened upon the first call and is shared by all the concurrent calls. Fork
+    `remote_agent` with a client to get a proxy agent.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None, path: Optional[str] = None) -> None:
+        self.host = host
+        self.port = port
+        self.path = path
+
+        # NOTE: the asyncio primitives are created lazily (they should not be created outside of an event loop)
+        self._channel_future: Optional[asyncio.Future] = None
+        self._calls: dict[int, asyncio.Queue] = {}
+        self._current_messages: dict[int, _RemoteReplyMessage] = {}
+        self._next_call_id = 0
+
+    async def ainquire(self, messages: Iterable[Message], **function_kwargs) -> AsyncIterator[MessagePromise]:
+        """
+        Call the remote agent and yield the promises of its reply messages as they arrive.
+        """
+        channel = await self._aget_channel()
+        call_id = self._next_call_id
+        self._next_call_id += 1
+        reply_queue = asyncio.Queue()
+        self._calls[call_id] = reply_queue
+        if channel.closed_error is not None:
+            # the connection was lost after the channel was obtained (the reader task won't report it anymore)
+            reply_queue.put_nowait(channel.closed_error)
+        try:
+            hash_keys = [channel.send_message(message) for message in messages]
+            channel.send_frame(
+                {"type": "call", "call_id": call_id, "hash_keys": hash_keys, "function_kwargs": function_kwargs}
+            )
+            await channel.writer.drain()
+
+            while True:
+                reply_item = await reply_queue.get()
+                if reply_item is END_OF_QUEUE:
+                    return
+                if isinstance(reply_item, BaseException):
+                    raise reply_item
+                yield _RemoteMessagePromise(reply_item)
+        finally:
+            self._calls.pop(call_id, None)
+            self._current_messages.pop(call_id, None)
+            if channel.closed_error is None:
+                channel.forget_least_recent_messages()
+
+    async def aclose(self) -> None:
+        """
+        Close the connection (it will be reopened upon the next call).
+        """
+        channel_future, self._channel_future = self._channel_future, None
+        if channel_future is None or not channel_future.done() or channel_future.exception():
+            return
+        channel = channel_future.result()
+        await channel.aclose()
+        await asyncio.gather(channel.reader_task, return_exceptions=True)
+
+    async def _aget_channel(self) -> _RemoteChannel:
+        if self._channel_future is not None and self._channel_future.get_loop() is not asyncio.get_running_loop():
+            # the previous connection belongs to a different event loop
+            self._channel_future = None
+
+        if self._channel_future is None:
+            self._channel_future = asyncio.get_running_loop().create_future()
+            try:
+                if self.path is not None:
+                    reader, writer = await asyncio.open_unix_connection(self.path)
+                else:
+                    reader, writer = await asyncio.open_connection(self.host, self.port)
+            except Exception as exc:
+                channel_future, self._channel_future = self._channel_future, None
+                channel_future.set_exception(exc)
+                channel_future.exception()  # mark the exception as retrieved (it is raised below anyway)
+                raise
+            channel = _RemoteChannel(reader, writer)
+            # the reader task is not tracked by the PromisingContext (it lives as long as the connection) - it belongs
+            # to the channel and reports its failure to all the calls that are waiting on the channel
+            channel.reader_task = asyncio.create_task(self._aread_frames(channel))
+            self._channel_future.set_result(channel)
+
+        return await self._channel_future
+
+    async def _aread_frames(self, channel: _RemoteChannel) -> None:
+        error = ConnectionError("the remote agent connection was closed")
+        try:
+            while True:
+                frame = await channel.aread_frame()
+                if frame is None:
+                    break
+                self._dispatch_frame(channel, frame)
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.debug("A remote agent connection failed", exc_info=True)
+            error = exc
+        finally:
+            channel.closed_error = error
+            if self._channel_future is not None and self._channel_future.done():
+                if not self._channel_future.exception() and self._channel_future.result() is channel:
+                    self._channel_future = None  # the next call will reconnect
+            for call_id, reply_queue in self._calls.items():
+                remote_message = self._current_messages.get(call_id)
+                if remote_message is not None:
+                    remote_message.token_queue.put_nowait(error)
+                reply_queue.put_nowait(error)
+
+    def _dispatch_frame(self, channel: _RemoteChannel, frame: dict[str, Any]) -> None:
+        if frame["type"] == "message":
+            channel.receive_message(frame)
+            return
+        if frame["type"] == "forget_ack":
+            for hash_key in frame["hash_keys"]:
+                channel.forgotten_messages.pop(hash_key, None)
+            return
+
+        reply_queue = self._calls.get(frame["call_id"])
+        if reply_queue is None:
+            return  # the caller is not waiting anymore
+        call_id = frame["call_id"]
+
+        if frame["type"] == "token":
+            # the tokens of binary messages are bytes (encoded the same way as the bytes fields of messages)
+            self._current_messages[call_id].token_queue.put_nowait(channel.rehydrate(frame["token"]))
+        elif frame["type"] == "message_start":
+            remote_message = _RemoteReplyMessage(channel.rehydrate(frame["metadata"]))
+            self._current_messages[call_id] = remote_message
+            reply_queue.put_nowait(remote_message)
+        elif frame["type"] == "message_end":
+            remote_message = self._current_messages.pop(call_id)
+            remote_message.final_message = channel.get_message(frame["hash_key"])
+            remote_message.token_queue.put_nowait(END_OF_QUEUE)
+        elif frame["type"] == "reply_end":
+            reply_queue.put_nowait(END_OF_QUEUE)
+        elif frame["type"] == "error":
+            error = RemoteAgentError(frame["error"])
+            remote_message = self._current_messages.pop(call_id, None)
+            if remote_message is not None:
+                remote_message.token_queue.put_nowait(error)
+            reply_queue.put_nowait(error)
+        else:
+            raise ValueError(f"unexpected frame type: {frame['type']}")
+
+
+@miniagent
+async def remote_agent(ctx: InteractionContext, remote_client: RemoteAgentClient, **kwargs) -> None:
+    """
+    A proxy agent that forwards its input messages and kwargs to a remote agent and replies with the messages of the
+    remote agent (streamed token by token). Fork it with a client, for ex.:
+
+    `assistant_agent = remote_agent.fork(alias="ASSISTANT", remote_client=RemoteAgentClient(port=8765))`
+    """
+    ctx.reply(remote_client.ainquire(await ctx.message_promises, **kwargs))
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {"bytes_b64": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Frozen):
+        return value.model_dump()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
@@ -0,0 +1,200 @@
+"""
+The machinery behind `MessageSequence` flattening: a type-dispatch table of item handlers, a static (synchronous)
+flattening fast path and the concurrent draining of async sources.
+"""
+
+import asyncio
+from functools import partial
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Iterator, NoReturn, Optional, Union
+
+from pydantic import BaseModel
+
+from miniagents.messages import BinaryMessage, Message, MessagePromise
+from miniagents.miniagent_typing import MessageType
+from miniagents.promising.promising import PromisingContext, StreamedPromise
+from miniagents.promising.sentinels import Sentinel
+
+
+def _flatten_message_promise(message_promise: MessagePromise) -> MessagePromise:
+    return message_promise
+
+
+def _flatten_message(message: Message) -> MessagePromise:
+    return message.as_promise
+
+
+def _flatten_pydantic_model(model: BaseModel) -> MessagePromise:
+    return Message(**model.model_dump()).as_promise
+
+
+def _flatten_dict(message_dict: dict[str, Any]) -> MessagePromise:
+    return Message(**message_dict).as_promise
+
+
+def _flatten_str(text: str) -> MessagePromise:
+    return Message(text=text).as_promise
+
+
+def _flatten_binary_content(content: Union[bytes, bytearray, memoryview]) -> MessagePromise:
+    return BinaryMessage(content=content).as_promise
+
+
+def _flatten_error(error: BaseException) -> NoReturn:
+    raise error
+
+
+SYNC_ITERABLE = Sentinel()
+ASYNC_ITERABLE = Sentinel()
+
+# the handlers of the types of items that were already encountered by `MessageSequence._flattener` are cached here
+# (the most common types are prepopulated)
+FLATTENER_DISPATCH_TABLE: dict[type, Union[Callable[[Any], MessagePromise], Sentinel]] = {
+    MessagePromise: _flatten_message_promise,
+    Message: _flatten_message,
+    str: _flatten_str,
+    dict: _flatten_dict,
+    list: SYNC_ITERABLE,
+    tuple: SYNC_ITERABLE,
+}
+
+
+def resolve_flattener_handler(item_type: type) -> Union[Callable[[Any], MessagePromise], Sentinel]:
+    """
+    Find out how items of the given type should be flattened and cache the result in the dispatch table.
+    """
+    if issubclass(item_type, MessagePromise):
+        handler = _flatten_message_promise
+    elif issubclass(item_type, Message):
+        handler = _flatten_message
+    elif issubclass(item_type, BaseModel):
+        handler = _flatten_pydantic_model
+    elif issubclass(item_type, dict):
+        handler = _flatten_dict
+    elif issubclass(item_type, str):
+        handler = _flatten_str
+    elif issubclass(item_type, (bytes, bytearray, memoryview)):
+        handler = _flatten_binary_content
+    elif issubclass(item_type, BaseException):
+        handler = _flatten_error
+    elif hasattr(item_type, "__iter__"):
+        handler = SYNC_ITERABLE
+    elif hasattr(item_type, "__aiter__"):
+        handler = ASYNC_ITERABLE
+    else:
+        raise TypeError(f"Unexpected message type: {item_type}")
+
+    FLATTENER_DISPATCH_TABLE[item_type] = handler
+    return handler
+
+
+_STATIC_FLATTENER_HANDLERS = frozenset(
+    [_flatten_message, _flatten_str, _flatten_dict, _flatten_pydantic_model, _flatten_binary_content]
+)
+
+
+def flatten_statically(zero_or_more_items: MessageType) -> Optional[list[MessagePromise]]:
+    """
+    Flatten the item into a list of already resolved message promises if the item is fully static (no lazy or failed
+    message promises, no iterables other than lists and tuples). Return None otherwise (nothing is consumed in this
+    case, so the item can still be flattened the regular way).
+    """
+    # pylint: disable=protected-access
+    message_promises = []
+    items_to_scan = [zero_or_more_items]
+    while items_to_scan:
+        item = items_to_scan.pop()
+        item_type = type(item)
+        if item_type is list or item_type is tuple:
+            items_to_scan.extend(reversed(item))
+            continue
+
+        item_handler = FLATTENER_DISPATCH_TABLE.get(item_type)
+        if item_handler is None:
+            try:
+                item_handler = resolve_flattener_handler(item_type)
+            except TypeError:
+                # the regular flattener will raise this error
+                return None
+
+        if item_handler is _flatten_message_promise:
+            if not isinstance(item._result, Message):
+                # either not resolved yet or failed
+                return None
+            message_promises.append(item)
+        elif item_handler in _STATIC_FLATTENER_HANDLERS:
+            try:
+                message_promises.append(item_handler(item))
+            except Exception:  # pylint: disable=broad-except
+                # let the regular flattener capture this error into the sequence
+                return None
+        else:
+            return None
+
+    return message_promises
+
+
+def start_draining_async_sources(zero_or_more_items: MessageType) -> dict[int, tuple[Any, Any]]:
+    """
+    Find all the async iterables in the (arbitrarily nested) item and start draining each of them into its own
+    buffer in the background. One-shot iterators (sync and async) are replaced with buffered versions of themselves -
+    the replacements are returned as a dict that maps the ids of the original objects to pairs of the original objects
+    and their replacements (the original objects are kept in the dict to make sure their ids are not reused). One-shot
+    sync iterators are drained in the background too (item by item, so a slow or even an infinite generator doesn't
+    block the event loop) and the async iterables in their items are discovered as the items are produced.
+    """
+    replacements = {}
+    _scan_for_async_sources(zero_or_more_items, replacements)
+    return replacements
+
+
+def _scan_for_async_sources(zero_or_more_items: MessageType, replacements: dict[int, tuple[Any, Any]]) -> None:
+    promising_context = PromisingContext.get_current()
+    items_to_scan = [zero_or_more_items]
+    while items_to_scan:
+        item = items_to_scan.pop()
+        item_handler = FLATTENER_DISPATCH_TABLE.get(type(item))
+        if item_handler is None:
+            try:
+                item_handler = resolve_flattener_handler(type(item))
+            except TypeError:
+                # the flattener itself will raise this error when it reaches this item
+                continue
+
+        if item_handler is SYNC_ITERABLE:
+            if iter(item) is item:
+                # a one-shot iterator (a generator, for ex.) - let's buffer it, so it can be iterated over again
+                buffered_item = StreamedPromise(
+                    streamer=partial(_aiter_sync_source, item, replacements), start_asap=False
+                )
+                replacements[id(item)] = (item, buffered_item)
+                promising_context.start_asap(_adrain(buffered_item), suppress_errors=True)
+            else:
+                items_to_scan.extend(item)
+
+        elif item_handler is ASYNC_ITERABLE:
+            if not isinstance(item, StreamedPromise):
+                # wrap the async iterable into a StreamedPromise, so its items are buffered and can be replayed later
+                buffered_item = StreamedPromise(streamer=partial(_aiter_async_source, item), start_asap=False)
+                replacements[id(item)] = (item, buffered_item)
+                item = buffered_item
+            promising_context.start_asap(_adrain(item), suppress_errors=True)
+
+
+async def _aiter_sync_source(
+    sync_source: Iterator[MessageType], replacements: dict[int, tuple[Any, Any]], _
+) -> AsyncIterator[MessageType]:
+    for item in sync_source:
+        # the async sources in the item are started before the flattener gets to see the item
+        _scan_for_async_sources(item, replacements)
+        yield item
+        # let the other tasks run in between the items (the sync source might be long or even infinite)
+        await asyncio.sleep(0)
+
+
+def _aiter_async_source(async_source: AsyncIterable[MessageType], _) -> AsyncIterator[MessageType]:
+    return async_source.__aiter__()
+
+
+async def _adrain(streamed_promise: StreamedPromise) -> None:
+    async for _ in streamed_promise:
+        pass
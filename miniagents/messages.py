@@ -2,13 +2,17 @@
 `Message` class and other classes related to messages.
 """
 
+import asyncio
+import hashlib
+from collections import deque
 from functools import cached_property
-from typing import AsyncIterator, Any, Union, Optional, Iterator
+from pathlib import Path
+from typing import AsyncIterator, Any, Union, Optional, Iterator, Iterable, ClassVar, Callable
 
 from miniagents.miniagent_typing import MessageTokenStreamer
 from miniagents.promising.ext.frozen import Frozen
-from miniagents.promising.promising import StreamedPromise
-from miniagents.promising.sentinels import Sentinel, DEFAULT
+from miniagents.promising.promising import StreamedPromise, PromisingContext
+from miniagents.promising.sentinels import Sentinel, DEFAULT, END_OF_QUEUE, NO_VALUE
 
 
 class Message(Frozen):
@@ -159,7 +163,7 @@ class MessagePromise(StreamedPromise[str, Message]):
 
             super().__init__(
                 start_asap=start_asap,
-                prefill_pieces=[str(prefill_message)],
+                prefill_pieces=self._prefill_pieces(prefill_message),
                 prefill_result=prefill_message,
             )
         else:
@@ -170,6 +174,13 @@ class MessagePromise(StreamedPromise[str, Message]):
             self._message_class = message_class
             super().__init__(start_asap=start_asap)
 
+    def _prefill_pieces(self, prefill_message: Message) -> Iterable[str]:
+        """
+        The pieces a promise of an already existing message consists of. By default, it is a single piece - the
+        whole string representation of the message.
+        """
+        return [str(prefill_message)]
+
     def _streamer(self) -> AsyncIterator[str]:
         return self._message_token_streamer(self._metadata_so_far)
 
@@ -180,11 +191,218 @@ class MessagePromise(StreamedPromise[str, Message]):
         )
 
 
+class FileMessage(Message):
+    """
+    A message whose text lives in a file rather than in memory. The file is hashed in chunks upon the creation of
+    the message and its text is streamed in chunks by the promise of this message. The text is only read into a single
+    Python string when the string representation of the message is requested (for ex. when a request to an LLM is
+    being assembled), and even then it is not cached.
+
+    NOTE: The file is expected not to change during the lifetime of the message (the hash key of the message is
+    calculated from the content of the file at the moment of the message creation). The constructor hashes the file
+    synchronously - use `FileMessage.acreate()` to do it without blocking the event loop.
+    """
+
+    file_path: str
+    file_sha256: str
+    encoding: str = "utf-8"
+
+    text_chunk_size: ClassVar[int] = 64 * 1024
+
+    def __init__(self, file_path: Union[str, Path], **metadata: Any) -> None:
+        file_path = str(file_path)
+        if "file_sha256" not in metadata:
+            metadata["file_sha256"] = self._file_sha256(file_path)
+        super().__init__(file_path=file_path, **metadata)
+
+    @classmethod
+    async def acreate(cls, file_path: Union[str, Path], **metadata: Any) -> "FileMessage":
+        """
+        Create a FileMessage, but hash its file in a worker thread, so the event loop is not blocked (and other agents
+        are not stalled) while a large file is being read.
+        """
+        file_path = str(file_path)
+        if "file_sha256" not in metadata:
+            metadata["file_sha256"] = await asyncio.to_thread(cls._file_sha256, file_path)
+        return cls(file_path, **metadata)
+
+    @property
+    def as_string(self) -> str:
+        # NOTE: unlike in other Frozen objects, the string representation of a FileMessage is not cached
+        return self._as_string()
+
+    @cached_property
+    def as_promise(self) -> "FileMessagePromise":
+        return FileMessagePromise(prefill_message=self)
+
+    def text_chunks(self) -> Iterator[str]:
+        """
+        Iterate over the text of the file chunk by chunk without reading the whole file into memory.
+        """
+        with open(self.file_path, encoding=self.encoding, newline="") as file:
+            while True:
+                chunk = file.read(self.text_chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def _string_pieces(self) -> Iterator[str]:
+        """
+        Produce the string representation of this message piece by piece. Child classes may override this method
+        (rather than `_as_string()`) if they want to customize the string representation without losing the ability
+        to stream it.
+        """
+        return self.text_chunks()
+
+    def _as_string(self) -> str:
+        return "".join(self._string_pieces())
+
+    @classmethod
+    def _file_sha256(cls, file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            while True:
+                chunk = file.read(cls.text_chunk_size)
+                if not chunk:
+                    break
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+
+class FileMessagePromise(MessagePromise):
+    """
+    A promise of a `FileMessage`. Instead of keeping the streamed pieces in memory for replaying, every consumer of
+    this promise reads the pieces from the file anew.
+    """
+
+    preliminary_metadata: FileMessage
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._aiter_string_pieces()
+
+    async def _aiter_string_pieces(self) -> AsyncIterator[str]:
+        # pylint: disable=protected-access
+        # the file is read in a worker thread, piece by piece, so the event loop is not blocked by the file I/O
+        pieces = iter(self.preliminary_metadata._string_pieces())
+        while True:
+            piece = await asyncio.to_thread(next, pieces, END_OF_QUEUE)
+            if piece is END_OF_QUEUE:
+                return
+            yield piece
+
+    def _prefill_pieces(self, prefill_message: Message) -> Iterable[str]:
+        return ()
+
+
+class BinaryMessage(Message):
+    """
+    A message that carries binary content (audio, images, compressed artifacts etc.) as raw bytes, without the need
+    to encode it into a string. The content is hashed directly, as bytes.
+    """
+
+    content: bytes = b""
+    mime_type: Optional[str] = None
+
+    @cached_property
+    def as_promise(self) -> "BinaryMessagePromise":
+        return BinaryMessagePromise(prefill_message=self)
+
+    @classmethod
+    def promise(
+        cls,
+        start_asap: Union[bool, Sentinel] = DEFAULT,
+        message_token_streamer: Optional[MessageTokenStreamer] = None,
+        **preliminary_metadata,
+    ) -> "BinaryMessagePromise":
+        """
+        Create a BinaryMessagePromise object based on the BinaryMessage class this method is called for and the
+        provided arguments. The `message_token_streamer`, if provided, should produce chunks of bytes.
+        """
+        if message_token_streamer:
+            return BinaryMessagePromise(
+                start_asap=start_asap,
+                message_token_streamer=message_token_streamer,
+                message_class=cls,
+                **preliminary_metadata,
+            )
+        return cls(**preliminary_metadata).as_promise
+
+    def _as_string(self) -> str:
+        if self.text is not None or self.text_template is not None:
+            return super()._as_string()
+        return f"<{self.mime_type or 'binary content'}: {len(self.content)} bytes>"
+
+
+class BinaryMessagePromise(MessagePromise):
+    """
+    A promise of a binary message that can be streamed chunk by chunk (the pieces are bytes rather than strings).
+    Every chunk is frozen into `bytes` only once, upon arrival, so replaying the stream doesn't copy anything.
+    """
+
+    def _prefill_pieces(self, prefill_message: BinaryMessage) -> Iterable[bytes]:
+        return [prefill_message.content]
+
+    async def _streamer(self) -> AsyncIterator[bytes]:  # pylint: disable=invalid-overridden-method
+        async for chunk in super()._streamer():
+            yield chunk if isinstance(chunk, bytes) else bytes(chunk)
+
+    async def _resolver(self) -> BinaryMessage:
+        return self._message_class(
+            content=b"".join([chunk async for chunk in self]),
+            **self._metadata_so_far,
+        )
+
+
 class MessageSequencePromise(StreamedPromise[MessagePromise, tuple[Message, ...]]):
     """
     A promise of a sequence of messages that can be streamed message by message.
     """
 
+    async def _resolver(self) -> tuple[Message, ...]:  # pylint: disable=method-hidden
+        return await self._aresolve_messages()
+
+    async def _aresolve_messages(self, max_concurrency: Optional[int] = None) -> tuple[Message, ...]:
+        """
+        Resolve all the message promises of this sequence concurrently (each one is scheduled for resolution as soon
+        as it is discovered, at most `max_concurrency` of them at a time, if specified) and return the resulting
+        messages in their original order.
+        """
+        # pylint: disable=protected-access
+        promising_context = PromisingContext.get_current()
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def aresolve_message(message_promise: MessagePromise) -> Union[Message, Exception]:
+            if semaphore:
+                await semaphore.acquire()
+            try:
+                return await message_promise
+            except Exception as exc:  # pylint: disable=broad-except
+                # the error will be raised below, in the order of the messages in the sequence
+                return exc
+            finally:
+                if semaphore:
+                    semaphore.release()
+
+        resolutions = []
+        async for message_promise in self:
+            if message_promise._result is NO_VALUE:
+                resolutions.append(promising_context.start_asap(aresolve_message(message_promise)))
+            else:
+                # the message promise is already resolved - no need to schedule anything
+                resolutions.append(message_promise)
+
+        messages = []
+        for resolution in resolutions:
+            message = await resolution
+            if isinstance(message, Exception):
+                raise message
+            messages.append(message)
+        result = tuple(messages)
+        # the `StopAsyncIteration` that ended the `async for` above is stored in the sequence for replays and its
+        # traceback references this frame - drop the intermediate lists, so they are not retained along with it
+        del resolutions, messages
+        return result
+
     def as_single_promise(self, **kwargs) -> MessagePromise:
         """
         Convert this sequence promise into a single message promise that will contain all the messages from this
@@ -193,3 +411,106 @@ class MessageSequencePromise(StreamedPromise[MessagePromise, tuple[Message, ...]
         from miniagents.utils import join_messages  # pylint: disable=import-outside-toplevel
 
         return join_messages(self, start_asap=False, **kwargs)
+
+    def tail(self, n: int) -> "MessageSequencePromise":
+        """
+        Get a lazy view of the last `n` message promises of this sequence. Only a ring buffer of `n` message promises
+        is kept while the sequence is being streamed and the contents of the skipped messages are not resolved.
+        """
+        if n < 0:
+            raise ValueError(f"n should be non-negative, got {n}")
+
+        async def tail_streamer(_) -> AsyncIterator[MessagePromise]:
+            ring_buffer = deque(maxlen=n)
+            async for message_promise in self:
+                ring_buffer.append(message_promise)
+            for message_promise in ring_buffer:
+                yield message_promise
+
+        return MessageSequencePromise(streamer=tail_streamer, start_asap=False)
+
+    def slice(self, start: int = 0, stop: Optional[int] = None) -> "MessageSequencePromise":
+        """
+        Get a lazy view of the message promises of this sequence from index `start` (inclusive) to index `stop`
+        (exclusive, None means "till the end"). The underlying sequence is not streamed any further than `stop`.
+        """
+        if start < 0 or (stop is not None and stop < 0):
+            raise ValueError(f"start and stop should be non-negative, got start={start} and stop={stop}")
+
+        async def slice_streamer(_) -> AsyncIterator[MessagePromise]:
+            if stop is not None and stop <= start:
+                return
+            index = 0
+            async for message_promise in self:
+                if index >= start:
+                    yield message_promise
+                index += 1
+                if stop is not None and index >= stop:
+                    break
+
+        return MessageSequencePromise(streamer=slice_streamer, start_asap=False)
+
+    def filter(self, predicate: Callable[[Frozen], bool]) -> "MessageSequencePromise":
+        """
+        Get a lazy view of the message promises of this sequence, the `preliminary_metadata` of which satisfies the
+        `predicate` (e.g. only the messages with a certain role). The contents of the messages are not resolved.
+        """
+
+        async def filter_streamer(_) -> AsyncIterator[MessagePromise]:
+            async for message_promise in self:
+                if predicate(message_promise.preliminary_metadata):
+                    yield message_promise
+
+        return MessageSequencePromise(streamer=filter_streamer, start_asap=False)
+
+    async def as_completed(self) -> AsyncIterator[MessagePromise]:
+        """
+        Iterate over the message promises of this sequence in the order in which they start streaming (or get
+        resolved) rather than in the order in which they appear in the sequence. Every message promise is yielded
+        exactly once. Useful in fan-out scenarios, where the reply of the fastest agent should not wait for the
+        replies of the slower ones. NOTE: Lazy message promises are started by this method.
+
+        If the sequence itself fails, the error is raised after all the message promises that were discovered before
+        the failure are yielded.
+        """
+        promising_context = PromisingContext.get_current()
+        ready_queue = asyncio.Queue()
+        discovered_count = 0
+
+        async def await_first_piece(message_promise: MessagePromise) -> None:
+            try:
+                async for _ in message_promise:
+                    break
+            except Exception:  # pylint: disable=broad-except
+                # the error will be raised to whoever consumes the message promise
+                pass
+            ready_queue.put_nowait(message_promise)
+
+        async def discover_message_promises() -> None:
+            nonlocal discovered_count
+            try:
+                async for message_promise in self:
+                    discovered_count += 1
+                    promising_context.start_asap(await_first_piece(message_promise), suppress_errors=True)
+            except Exception as exc:  # pylint: disable=broad-except
+                ready_queue.put_nowait(exc)
+            finally:
+                ready_queue.put_nowait(END_OF_QUEUE)
+
+        promising_context.start_asap(discover_message_promises(), suppress_errors=True)
+
+        sequence_error = None
+        all_discovered = False
+        yielded_count = 0
+        while not all_discovered or yielded_count < discovered_count:
+            message_promise = await ready_queue.get()
+            if message_promise is END_OF_QUEUE:
+                all_discovered = True
+            elif isinstance(message_promise, Exception):
+                sequence_error = message_promise
+            else:
+                yielded_count += 1
+                yield message_promise
+
+        if sequence_error:
+            raise sequence_error
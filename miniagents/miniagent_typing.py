@@ -40,5 +40,5 @@ class PersistMessageEventHandler(Protocol):
 
 
 # TODO Oleksandr: add documentation somewhere that explains what MessageType and SingleMessageType represent
-SingleMessageType = Union[str, dict[str, Any], BaseModel, "Message", "MessagePromise", BaseException]
+SingleMessageType = Union[str, bytes, dict[str, Any], BaseModel, "Message", "MessagePromise", BaseException]
 MessageType = Union[SingleMessageType, Iterable["MessageType"], AsyncIterable["MessageType"]]
@@ -3,49 +3,85 @@
 """
 
 import asyncio
+import contextlib
 import copy
 import logging
-from functools import partial
-from typing import AsyncIterator, Any, Union, Optional, Callable, Iterable, Awaitable
-
-from pydantic import BaseModel
-
+from collections import deque
+from enum import Enum
+from functools import lru_cache, partial
+from typing import (
+    AsyncIterator,
+    Any,
+    Union,
+    Optional,
+    Callable,
+    Iterable,
+    Awaitable,
+    Iterator,
+    AsyncIterable,
+)
+
+from miniagents.actors import AgentActorPool
+from miniagents.admission import AdmissionControl, current_scheduling_tag, scheduling_scope
+from miniagents.caching import AgentReplyCache
+from miniagents.flattening import (
+    ASYNC_ITERABLE,
+    FLATTENER_DISPATCH_TABLE,
+    SYNC_ITERABLE,
+    flatten_statically,
+    resolve_flattener_handler,
+    start_draining_async_sources,
+)
 from miniagents.messages import MessagePromise, MessageSequencePromise, Message
 from miniagents.miniagent_typing import MessageType, AgentFunction, PersistMessageEventHandler
 from miniagents.promising.ext.frozen import Frozen
 from miniagents.promising.promise_typing import PromiseStreamer, PromiseResolvedEventHandler
 from miniagents.promising.promising import StreamAppender, Promise, PromisingContext
-from miniagents.promising.sentinels import Sentinel, DEFAULT
+from miniagents.promising.sentinels import Sentinel, DEFAULT, NO_VALUE
 from miniagents.promising.sequence import FlatSequence
 
 logger = logging.getLogger(__name__)
 
 
+class InteractionNodeMode(Enum):
+    """
+    When to create the AgentCallNode and AgentReplyNode of agent interactions (which, among other things, triggers
+    the "persist message" events for them): ALWAYS (right after each agent call), LAZY (only when someone awaits the
+    `reply_node` of the reply sequence promise) or NEVER.
+    """
+
+    ALWAYS = "always"
+    LAZY = "lazy"
+    NEVER = "never"
+
+
 class MiniAgents(PromisingContext):
     """
     TODO Oleksandr: docstring
     """
 
     stream_llm_tokens_by_default: bool
+    drain_async_sources_concurrently_by_default: bool
+    interaction_nodes_by_default: InteractionNodeMode
     on_persist_message_handlers: list[PersistMessageEventHandler]
 
     def __init__(
         self,
         stream_llm_tokens_by_default: bool = True,
+        drain_async_sources_concurrently_by_default: bool = False,
+        interaction_nodes_by_default: Union[InteractionNodeMode, str] = InteractionNodeMode.ALWAYS,
         on_promise_resolved: Union[PromiseResolvedEventHandler, Iterable[PromiseResolvedEventHandler]] = (),
         on_persist_message: Union[PersistMessageEventHandler, Iterable[PersistMessageEventHandler]] = (),
         **kwargs,
     ) -> None:
-        on_promise_resolved = (
-            [self._trigger_persist_message_event, on_promise_resolved]
-            if callable(on_promise_resolved)
-            else [self._trigger_persist_message_event, *on_promise_resolved]
-        )
         super().__init__(on_promise_resolved=on_promise_resolved, **kwargs)
         self.stream_llm_tokens_by_default = stream_llm_tokens_by_default
+        self.drain_async_sources_concurrently_by_default = drain_async_sources_concurrently_by_default
+        self.interaction_nodes_by_default = InteractionNodeMode(interaction_nodes_by_default)
         self.on_persist_message_handlers: list[PersistMessageEventHandler] = (
             [on_persist_message] if callable(on_persist_message) else list(on_persist_message)
         )
+        self._actor_pools: dict["MiniAgent", AgentActorPool] = {}
 
     def run(self, awaitable: Awaitable[Any]) -> Any:
         """
@@ -65,6 +101,27 @@ class MiniAgents(PromisingContext):
         # noinspection PyTypeChecker
         return super().get_current()
 
+    async def afinalize(self) -> None:
+        """
+        Finalize the context: wait for all the child tasks to finish, then let the workers of the agents in actor
+        mode finish whatever they are doing and stop them.
+        """
+        await self.aflush_tasks()
+        while self._actor_pools:
+            actor_pools = list(self._actor_pools.values())
+            self._actor_pools.clear()
+            await asyncio.gather(*(actor_pool.aclose() for actor_pool in actor_pools))
+            # the last calls of the workers might have scheduled some new tasks
+            await self.aflush_tasks()
+        await super().afinalize()
+
+    def _get_actor_pool(self, mini_agent: "MiniAgent") -> AgentActorPool:
+        actor_pool = self._actor_pools.get(mini_agent)
+        if actor_pool is None:
+            actor_pool = AgentActorPool(mini_agent)
+            self._actor_pools[mini_agent] = actor_pool
+        return actor_pool
+
     def on_persist_message(self, handler: PersistMessageEventHandler) -> PersistMessageEventHandler:
         """
         Add a handler that will be called every time a Message needs to be persisted.
@@ -72,10 +129,16 @@ class MiniAgents(PromisingContext):
         self.on_persist_message_handlers.append(handler)
         return handler
 
+    def _trigger_promise_resolved_handlers(self, promise: Promise, result: Any) -> None:
+        # the "persist message" event is triggered right away rather than from a separate "promise resolved" handler
+        # task (most of the resolved promises are not messages, so most of such tasks would do nothing)
+        self._trigger_persist_message_event(promise, result)
+        super()._trigger_promise_resolved_handlers(promise, result)
+
     # noinspection PyProtectedMember
-    async def _trigger_persist_message_event(self, _, obj: Any) -> None:
+    def _trigger_persist_message_event(self, promise: Promise, obj: Any) -> None:
         # pylint: disable=protected-access
-        if not isinstance(obj, Message):
+        if not self.on_persist_message_handlers or not isinstance(obj, Message):
             return
 
         log_level_for_errors = MiniAgents.get_current().log_level_for_errors
@@ -86,7 +149,7 @@ class MiniAgents(PromisingContext):
 
             for handler in self.on_persist_message_handlers:
                 self.start_asap(
-                    handler(_, sub_message), suppress_errors=True, log_level_for_errors=log_level_for_errors
+                    handler(promise, sub_message), suppress_errors=True, log_level_for_errors=log_level_for_errors
                 )
             sub_message._persist_message_event_triggered = True
 
@@ -94,7 +157,7 @@ class MiniAgents(PromisingContext):
             return
 
         for handler in self.on_persist_message_handlers:
-            self.start_asap(handler(_, obj), suppress_errors=True, log_level_for_errors=log_level_for_errors)
+            self.start_asap(handler(promise, obj), suppress_errors=True, log_level_for_errors=log_level_for_errors)
         obj._persist_message_event_triggered = True
 
 
@@ -105,6 +168,11 @@ def miniagent(
     uppercase_func_name: bool = True,
     normalize_spaces_in_docstring: bool = True,
     interaction_metadata: Optional[dict[str, Any]] = None,
+    reply_cache: Optional[AgentReplyCache] = None,
+    admission_control: Optional[AdmissionControl] = None,
+    actor_pool_size: Optional[int] = None,
+    actor_init: Optional[Callable[[], Any]] = None,
+    interaction_nodes: Union[InteractionNodeMode, str, Sentinel] = DEFAULT,
     **partial_kwargs,
 ) -> Union["MiniAgent", Callable[[AgentFunction], "MiniAgent"]]:
     """
@@ -120,6 +188,11 @@ def miniagent(
                 uppercase_func_name=uppercase_func_name,
                 normalize_spaces_in_docstring=normalize_spaces_in_docstring,
                 interaction_metadata=interaction_metadata,
+                reply_cache=reply_cache,
+                admission_control=admission_control,
+                actor_pool_size=actor_pool_size,
+                actor_init=actor_init,
+                interaction_nodes=interaction_nodes,
                 **partial_kwargs,
             )
 
@@ -133,6 +206,11 @@ def miniagent(
         uppercase_func_name=uppercase_func_name,
         normalize_spaces_in_docstring=normalize_spaces_in_docstring,
         interaction_metadata=interaction_metadata,
+        reply_cache=reply_cache,
+        admission_control=admission_control,
+        actor_pool_size=actor_pool_size,
+        actor_init=actor_init,
+        interaction_nodes=interaction_nodes,
         **partial_kwargs,
     )
 
@@ -140,11 +218,32 @@ def miniagent(
 class MiniAgent:
     """
     A wrapper for an agent function that allows calling the agent.
+
+    If `reply_cache` is provided, the replies of the agent are memoized (see `AgentReplyCache` for details). Only
+    use it for agents that are pure functions of their input messages and kwargs.
+
+    If `admission_control` is provided, the calls of the agent are subject to it (concurrency limits and rate
+    limiting, see `AdmissionControl` for details). The forks of the agent share the same admission control, unless
+    a different one is provided to `fork()`.
+
+    If `actor_pool_size` is provided, the agent works in actor mode: its calls are queued and processed by a fixed
+    pool of long-lived workers (one pool per MiniAgents context), which can keep state between the calls. The state
+    of a worker is produced by `actor_init` (a function or a coroutine function without arguments, called once per
+    worker) and is available to the agent function as `ctx.actor_state`. The semantics of `inquire()` are the same.
+    The workers are stopped when the MiniAgents context is finalized (after they finish processing their calls).
+
+    `interaction_nodes` overrides `MiniAgents.interaction_nodes_by_default` for this agent (see `InteractionNodeMode`)
+    - chatty internal agents, for ex., might not need their interactions to be persisted.
     """
 
     alias: str
     description: Optional[str]
     interaction_metadata: Frozen
+    reply_cache: Optional[AgentReplyCache]
+    admission_control: Optional[AdmissionControl]
+    actor_pool_size: Optional[int]
+    actor_init: Optional[Callable[[], Any]]
+    interaction_nodes: Union[InteractionNodeMode, Sentinel]
 
     def __init__(
         self,
@@ -155,20 +254,36 @@ class MiniAgent:
         uppercase_func_name: bool = True,
         normalize_spaces_in_docstring: bool = True,
         interaction_metadata: Optional[dict[str, Any]] = None,
+        reply_cache: Optional[AgentReplyCache] = None,
+        admission_control: Optional[AdmissionControl] = None,
+        actor_pool_size: Optional[int] = None,
+        actor_init: Optional[Callable[[], Any]] = None,
+        interaction_nodes: Union[InteractionNodeMode, str, Sentinel] = DEFAULT,
         **partial_kwargs,
     ) -> None:
+        if isinstance(func, partial) and not func.args:
+            # let's not nest partials - the partial kwargs are merged into a flat dict instead (partials with
+            # positional arguments are kept as they are, though)
+            partial_kwargs = {**func.keywords, **partial_kwargs}
+            func = func.func
         self._func = func
-        if partial_kwargs:
-            # NOTE: we cannot deep-copy the partial_kwargs here, because they may contain objects that are
-            # not serializable (for ex. AsyncAnthropic and AsyncOpenAI objects in case of anthropic and openai
-            # miniagents)
-            self._func = partial(func, **partial_kwargs)
+        # NOTE: we cannot deep-copy the partial_kwargs here, because they may contain objects that are not
+        # serializable (for ex. AsyncAnthropic and AsyncOpenAI objects in case of anthropic and openai miniagents)
+        self._partial_kwargs = partial_kwargs
 
         # validate interaction metadata
         # TODO Oleksandr: is `interaction_metadata` a good name ? see how it is used in Recensia to decide
         self.interaction_metadata = Frozen(**(interaction_metadata or {}))
         self._interact_metadata_dict = self.interaction_metadata.frozen_fields_and_values()
 
+        self.reply_cache = reply_cache
+        self.admission_control = admission_control
+        self.actor_pool_size = actor_pool_size
+        self.actor_init = actor_init
+        self.interaction_nodes = (
+            interaction_nodes if interaction_nodes is DEFAULT else InteractionNodeMode(interaction_nodes)
+        )
+
         self.alias = alias
         if self.alias is None:
             self.alias = func.__name__
@@ -191,19 +306,76 @@ class MiniAgent:
         self,
         messages: Optional[MessageType] = None,
         start_asap: Union[bool, Sentinel] = DEFAULT,
+        priority: Optional[int] = None,
         **function_kwargs,
     ) -> MessageSequencePromise:
         """
         TODO Oleksandr: docstring
+
+        `priority` (see `Priority`) is taken into account by `FairScheduler` admission controls - of this call as
+        well as of all the nested calls made by this agent (by default the priority of the caller is inherited).
+        """
+        # all the input messages are known upfront, so there is no need for an input StreamAppender
+        input_sequence_promise = MessageSequence.turn_into_sequence_promise(() if messages is None else messages)
+        return self._reply_sequence_promise(input_sequence_promise, start_asap, function_kwargs, priority=priority)
+
+    async def inquire_many(
+        self,
+        inputs: Union[Iterable[MessageType], AsyncIterable[MessageType]],
+        max_concurrency: int = 10,
+        ordered: bool = True,
+        with_index: bool = False,
+        priority: Optional[int] = None,
+        **function_kwargs,
+    ) -> AsyncIterator[Union[MessageSequencePromise, tuple[int, MessageSequencePromise]]]:
+        """
+        Inquire the agent once per item of `inputs` (every item is a separate set of input messages) with the same
+        function kwargs (they are validated only once) and yield the reply sequence promises either in the order of
+        the inputs (`ordered=True`, every promise is yielded as soon as its inquiry is started, so its reply can be
+        streamed while it is being produced) or in the order of completion (every promise is yielded when it is
+        resolved). At most `max_concurrency` inquiries are in flight (or resolved but not yet yielded) at a time and
+        the next input is not taken from the `inputs` iterator until there is room for it (backpressure). The errors of
+        individual inquiries are not raised here - they are raised when the respective reply sequence promises are
+        awaited/iterated over. With `with_index=True` `(input_index, reply_sequence_promise)` pairs are yielded instead
+        (which is how the replies can be told apart in the order of completion).
         """
-        agent_call = self.initiate_inquiry(start_asap=start_asap, **function_kwargs)
-        if messages is not None:
-            agent_call.send_message(messages)
-        return agent_call.reply_sequence()
+        if max_concurrency < 1:
+            raise ValueError(f"max_concurrency should be positive, got {max_concurrency}")
+
+        # this validates the agent function kwargs (once for all the inquiries)
+        frozen_func_kwargs = _freeze_func_kwargs(function_kwargs) if function_kwargs else {}
+
+        def inquire_one(messages: MessageType) -> MessageSequencePromise:
+            return self._reply_sequence_promise(
+                MessageSequence.turn_into_sequence_promise(() if messages is None else messages),
+                start_asap=True,
+                function_kwargs=function_kwargs,
+                frozen_func_kwargs=frozen_func_kwargs,
+                priority=priority,
+            )
+
+        if ordered:
+            in_flight = deque()
+            input_index = 0
+            async for messages in _aiter_inputs(inputs):
+                reply_sequence_promise = inquire_one(messages)
+                in_flight.append(reply_sequence_promise)
+                # the inquiries are started in the order of the inputs, so every new reply sequence promise is the
+                # next one in order - it is yielded right away and the consumer can stream the reply as it is produced
+                yield (input_index, reply_sequence_promise) if with_index else reply_sequence_promise
+                input_index += 1
+                if len(in_flight) >= max_concurrency:
+                    # no room for the next input until the oldest inquiry is done
+                    await _aresolve_quietly(in_flight.popleft())
+            return
+
+        async for input_index, reply_sequence_promise in _ainquire_unordered(inquire_one, inputs, max_concurrency):
+            yield (input_index, reply_sequence_promise) if with_index else reply_sequence_promise
 
     def initiate_inquiry(
         self,
         start_asap: Union[bool, Sentinel] = DEFAULT,
+        priority: Optional[int] = None,
         **function_kwargs,
     ) -> "AgentCall":
         """
@@ -213,29 +385,59 @@ class MiniAgent:
         input_sequence = MessageSequence(
             start_asap=False,
         )
+        agent_call = AgentCall(
+            message_streamer=input_sequence.message_appender,
+            reply_sequence_promise=self._reply_sequence_promise(
+                input_sequence.sequence_promise, start_asap, function_kwargs, priority=priority
+            ),
+        )
+        return agent_call
+
+    def _call_func(self, ctx: "InteractionContext", function_kwargs: dict[str, Any]) -> Awaitable[None]:
+        # NOTE: not a coroutine function itself - one coroutine less per agent call
+        if self.actor_pool_size:
+            # pylint: disable=protected-access
+            return MiniAgents.get_current()._get_actor_pool(self).acall(ctx, function_kwargs)
+        return self._func(ctx, **function_kwargs)
+
+    def _reply_sequence_promise(
+        self,
+        input_sequence_promise: MessageSequencePromise,
+        start_asap: Union[bool, Sentinel],
+        function_kwargs: dict[str, Any],
+        frozen_func_kwargs: Optional[dict[str, Any]] = None,
+        priority: Optional[int] = None,
+    ) -> MessageSequencePromise:
         reply_sequence = AgentReplyMessageSequence(
             mini_agent=self,
             function_kwargs=function_kwargs,
-            input_sequence_promise=input_sequence.sequence_promise,
+            frozen_func_kwargs=frozen_func_kwargs,
+            priority=priority,
+            input_sequence_promise=input_sequence_promise,
             start_asap=start_asap,
         )
-
-        agent_call = AgentCall(
-            message_streamer=input_sequence.message_appender,
-            reply_sequence_promise=reply_sequence.sequence_promise,
-        )
-        return agent_call
+        return reply_sequence.sequence_promise
 
     def fork(
         self,
         alias: Optional[str] = None,  # TODO Oleksandr: enforce unique aliases ? introduce some "fork identifier" ?
         description: Optional[str] = None,
         interaction_metadata: Optional[dict[str, Any]] = None,
+        reply_cache: Optional[AgentReplyCache] = None,
+        admission_control: Optional[AdmissionControl] = None,
+        interaction_nodes: Union[InteractionNodeMode, str, Sentinel] = DEFAULT,
         **partial_kwargs,
     ) -> Union["MiniAgent", Callable[[AgentFunction], "MiniAgent"]]:
         """
         TODO Oleksandr: docstring
+
+        NOTE: The partial kwargs are not part of the reply cache keys (they may contain objects that cannot be
+        frozen), hence, unless `reply_cache` is provided explicitly, a fork of an agent with a reply cache gets a
+        new empty cache with the same limits.
         """
+        if reply_cache is None and self.reply_cache is not None:
+            reply_cache = self.reply_cache.empty_copy()
+
         return MiniAgent(
             self._func,
             alias=alias or self.alias,
@@ -243,7 +445,12 @@ class MiniAgent:
             uppercase_func_name=False,
             normalize_spaces_in_docstring=False,
             interaction_metadata={**self._interact_metadata_dict, **(interaction_metadata or {})},
-            **partial_kwargs,
+            reply_cache=reply_cache,
+            admission_control=admission_control or self.admission_control,
+            actor_pool_size=self.actor_pool_size,
+            actor_init=self.actor_init,
+            interaction_nodes=self.interaction_nodes if interaction_nodes is DEFAULT else interaction_nodes,
+            **{**self._partial_kwargs, **partial_kwargs},
         )
 
 
@@ -254,6 +461,7 @@ class InteractionContext:
 
     this_agent: MiniAgent
     message_promises: MessageSequencePromise
+    actor_state: Any
 
     def __init__(
         self,
@@ -265,6 +473,8 @@ class InteractionContext:
         self.message_promises = message_promises
         self._reply_streamer = reply_streamer
         self._tasks_to_wait_for: list[Awaitable[Any]] = []
+        # the state of the worker that processes this call (only for the agents in actor mode)
+        self.actor_state = None
 
     def reply(self, messages: MessageType) -> None:
         """
@@ -365,6 +575,15 @@ class AgentReplyNode(AgentInteractionNode):
 class MessageSequence(FlatSequence[MessageType, MessagePromise]):
     """
     TODO Oleksandr: docstring
+
+    If `drain_async_sources_concurrently` is True, then all the async iterables (for ex. sequence promises of other
+    agents' replies) found in a single appended item are drained concurrently, each into its own buffer, as soon
+    as the item is reached by the flattener. The messages are still yielded in their original order, but the
+    work on the later sources doesn't have to wait until the earlier sources are exhausted. If it is left as DEFAULT,
+    the value is taken from `MiniAgents.drain_async_sources_concurrently_by_default`.
+
+    When the whole sequence is awaited, the messages in it are resolved concurrently (`max_resolution_concurrency`,
+    if specified, caps the number of messages that are being resolved at the same time).
     """
 
     message_appender: Optional[StreamAppender[MessageType]]
@@ -375,7 +594,20 @@ class MessageSequence(FlatSequence[MessageType, MessagePromise]):
         appender_capture_errors: Union[bool, Sentinel] = DEFAULT,
         start_asap: Union[bool, Sentinel] = DEFAULT,
         incoming_streamer: Optional[PromiseStreamer[MessageType]] = None,
+        drain_async_sources_concurrently: Union[bool, Sentinel] = DEFAULT,
+        max_resolution_concurrency: Optional[int] = None,
+        sequence_promise_class: type[MessageSequencePromise] = MessageSequencePromise,
     ) -> None:
+        self._max_resolution_concurrency = max_resolution_concurrency
+
+        if drain_async_sources_concurrently is DEFAULT:
+            promising_context = PromisingContext.get_current()
+            drain_async_sources_concurrently = (
+                isinstance(promising_context, MiniAgents)
+                and promising_context.drain_async_sources_concurrently_by_default
+            )
+        self._drain_async_sources_concurrently = drain_async_sources_concurrently
+
         if incoming_streamer:
             # an external streamer is provided, so we don't create the default StreamAppender
             self.message_appender = None
@@ -386,7 +618,7 @@ class MessageSequence(FlatSequence[MessageType, MessagePromise]):
         super().__init__(
             incoming_streamer=incoming_streamer,
             start_asap=start_asap,
-            sequence_promise_class=MessageSequencePromise,
+            sequence_promise_class=sequence_promise_class,
         )
 
     @classmethod
@@ -395,7 +627,24 @@ class MessageSequence(FlatSequence[MessageType, MessagePromise]):
         Convert an arbitrarily nested collection of messages of various types (strings, dicts, Message objects,
         MessagePromise objects etc. - see `MessageType` definition for details) into a flat and uniform
         MessageSequencePromise object.
+
+        If the messages are fully static (ready-made messages, strings, dicts, already resolved message promises and
+        lists/tuples of those), an already resolved sequence promise is produced directly, without building a full
+        MessageSequence (no appender, no flattener and no background tasks are involved).
         """
+        if isinstance(messages, MessageSequencePromise):
+            # already flat and uniform (and replayable) - can be shared as is (for ex. by multiple agents that are
+            # inquired with the same input sequence)
+            return messages
+
+        message_promises = flatten_statically(messages)
+        if message_promises is not None:
+            # pylint: disable=protected-access
+            return MessageSequencePromise(
+                prefill_pieces=message_promises,
+                prefill_result=tuple(message_promise._result for message_promise in message_promises),
+            )
+
         message_sequence = cls(
             appender_capture_errors=True,
             start_asap=False,
@@ -404,39 +653,81 @@ class MessageSequence(FlatSequence[MessageType, MessagePromise]):
             message_sequence.message_appender.append(messages)
         return message_sequence.sequence_promise
 
-    async def _flattener(  # pylint: disable=invalid-overridden-method
+    async def _flattener(  # pylint: disable=invalid-overridden-method,too-many-branches
         self, zero_or_more_items: MessageType
     ) -> AsyncIterator[MessagePromise]:
-        if isinstance(zero_or_more_items, MessagePromise):
-            yield zero_or_more_items
-        elif isinstance(zero_or_more_items, Message):
-            yield zero_or_more_items.as_promise
-        elif isinstance(zero_or_more_items, BaseModel):
-            yield Message(**zero_or_more_items.model_dump()).as_promise
-        elif isinstance(zero_or_more_items, dict):
-            yield Message(**zero_or_more_items).as_promise
-        elif isinstance(zero_or_more_items, str):
-            yield Message(text=zero_or_more_items).as_promise
-        elif isinstance(zero_or_more_items, BaseException):
-            raise zero_or_more_items
-        elif hasattr(zero_or_more_items, "__iter__"):
-            for item in zero_or_more_items:
-                async for message_promise in self._flattener(item):
-                    yield message_promise
-        elif hasattr(zero_or_more_items, "__aiter__"):
-            async for item in zero_or_more_items:
-                async for message_promise in self._flattener(item):
-                    yield message_promise
+        # Nested containers are traversed with an explicit stack of iterators rather than recursively (which would
+        # require a separate async generator per level of nesting). Only the iterators of async iterables need to be
+        # awaited.
+        if self._drain_async_sources_concurrently:
+            drained_sources = start_draining_async_sources(zero_or_more_items)
         else:
-            raise TypeError(f"Unexpected message type: {type(zero_or_more_items)}")
+            drained_sources = None
+
+        iterator_stack: list[tuple[Union[Iterator[MessageType], AsyncIterator[MessageType]], bool]] = []
+        item = zero_or_more_items
+        while True:
+            if drained_sources:
+                # a one-shot iterator might have been replaced with its buffered version
+                item = drained_sources.get(id(item), (None, item))[1]
+
+            item_handler = FLATTENER_DISPATCH_TABLE.get(type(item))
+            if item_handler is None:
+                item_handler = resolve_flattener_handler(type(item))
+
+            if item_handler is SYNC_ITERABLE:
+                iterator_stack.append((iter(item), False))
+            elif item_handler is ASYNC_ITERABLE:
+                iterator_stack.append((item.__aiter__(), True))
+            else:
+                yield item_handler(item)
+
+            while iterator_stack:
+                iterator, is_async = iterator_stack[-1]
+                if is_async:
+                    try:
+                        item = await iterator.__anext__()
+                        break
+                    except StopAsyncIteration:
+                        iterator_stack.pop()
+                else:
+                    item = next(iterator, NO_VALUE)
+                    if item is not NO_VALUE:
+                        break
+                    iterator_stack.pop()
+            else:
+                return
 
     async def _resolver(self, seq_promise: MessageSequencePromise) -> tuple[Message, ...]:
         """
         Resolve all the messages in the sequence (which also includes collecting all the streamed tokens)
-        and return them as a tuple of Message objects.
+        and return them as a tuple of Message objects. The messages are resolved concurrently (at most
+        `max_resolution_concurrency` of them at a time, if specified), but the order of the tuple is preserved.
+        """
+        # pylint: disable=protected-access
+        return await seq_promise._aresolve_messages(max_concurrency=self._max_resolution_concurrency)
+
+
+class AgentReplySequencePromise(MessageSequencePromise):
+    """
+    A promise of the reply sequence of an agent call. `reply_node` is a promise of the AgentReplyNode of the
+    interaction (which also refers to the AgentCallNode). It is None if the interaction node mode of the agent is
+    NEVER. In LAZY mode the nodes are only created when `reply_node` is awaited.
+    """
+
+    reply_node: Optional[Promise[AgentReplyNode]]
+    _agent_run_task: Optional[asyncio.Task] = None
+    _cancel_requested: bool = False
+
+    def cancel(self) -> None:
+        """
+        Cancel the agent call if it is still running (the reply sequence then ends with `asyncio.CancelledError`).
+        NOTE: The sub-agents and the message promises that were already started by the agent run in their own tasks
+        and are not cancelled.
         """
-        # pylint: disable=consider-using-generator
-        return tuple([await msg_promise async for msg_promise in seq_promise])
+        self._cancel_requested = True
+        if self._agent_run_task is not None:
+            self._agent_run_task.cancel()
 
 
 # noinspection PyProtectedMember
@@ -451,58 +742,242 @@ class AgentReplyMessageSequence(MessageSequence):
         mini_agent: MiniAgent,
         input_sequence_promise: MessageSequencePromise,
         function_kwargs: dict[str, Any],
+        frozen_func_kwargs: Optional[dict[str, Any]] = None,
+        priority: Optional[int] = None,
         **kwargs,
     ) -> None:
-        # this validates the agent function kwargs
-        self._frozen_func_kwargs = Frozen(**function_kwargs).frozen_fields_and_values()
-        self._function_kwargs = copy.deepcopy(function_kwargs)
+        # the call is scheduled on behalf of the caller's session (the agent may be run in a different task later)
+        self._scheduling_tag = current_scheduling_tag()
+        if priority is not None:
+            self._scheduling_tag = self._scheduling_tag._replace(priority=priority)
+
+        if function_kwargs:
+            if frozen_func_kwargs is None:
+                # this validates the agent function kwargs
+                frozen_func_kwargs = _freeze_func_kwargs(function_kwargs)
+            self._frozen_func_kwargs = frozen_func_kwargs
+            self._function_kwargs = {
+                **mini_agent._partial_kwargs,
+                **{key: _copy_if_mutable(value) for key, value in function_kwargs.items()},
+            }
+        else:
+            self._frozen_func_kwargs = {}
+            self._function_kwargs = mini_agent._partial_kwargs
+
+        self._interaction_node_mode = mini_agent.interaction_nodes
+        if self._interaction_node_mode is DEFAULT:
+            promising_context = PromisingContext.get_current()
+            self._interaction_node_mode = (
+                promising_context.interaction_nodes_by_default
+                if isinstance(promising_context, MiniAgents)
+                else InteractionNodeMode.ALWAYS
+            )
 
         self._mini_agent = mini_agent
         self._input_sequence_promise = input_sequence_promise
         super().__init__(
-            appender_capture_errors=True,  # we want `self.message_appender` not to let errors out of `run_the_agent`
+            appender_capture_errors=True,  # we want `self.message_appender` not to let errors out of `arun_the_agent`
+            sequence_promise_class=AgentReplySequencePromise,
             **kwargs,
         )
 
-    async def _streamer(self, _) -> AsyncIterator[MessagePromise]:
-        async def run_the_agent(_) -> AgentCallNode:
-            ctx = InteractionContext(
-                this_agent=self._mini_agent,
-                message_promises=self._input_sequence_promise,
-                reply_streamer=self.message_appender,
-            )
-            with self.message_appender:
-                # errors are not raised above this `with` block, thanks to `appender_capture_errors=True`
-                try:
-                    await self._mini_agent._func(ctx, **self._function_kwargs)
-                finally:
-                    await asyncio.gather(*ctx._tasks_to_wait_for, return_exceptions=True)
-
-            return AgentCallNode(
-                messages=await self._input_sequence_promise,
-                agent_alias=self._mini_agent.alias,
-                **self._mini_agent._interact_metadata_dict,
-                # NOTE: the next line will override any keys from `self.interaction_metadata` if names collide
-                **self._frozen_func_kwargs,
+        if self._interaction_node_mode is InteractionNodeMode.NEVER:
+            self.sequence_promise.reply_node = None
+        else:
+            self.sequence_promise.reply_node = Promise[AgentReplyNode](
+                start_asap=False,
+                resolver=self._acreate_reply_node,
             )
 
-        agent_call_promise = Promise[AgentCallNode](
-            start_asap=True,
-            resolver=run_the_agent,
+    async def _streamer(self, _) -> AsyncIterator[MessagePromise]:
+        promising_context = PromisingContext.get_current()
+        self.sequence_promise._agent_run_task = promising_context.start_asap(
+            self._arun_the_agent(),
+            suppress_errors=True,
+            log_level_for_errors=promising_context.log_level_for_errors,
         )
 
         async for reply_promise in super()._streamer(_):
             yield reply_promise  # at this point all MessageType items are "flattened" into MessagePromise items
 
-        async def create_agent_reply_node(_) -> AgentReplyNode:
-            return AgentReplyNode(
-                replies=await self.sequence_promise,
-                agent_alias=self._mini_agent.alias,
-                agent_call=await agent_call_promise,
-                **self._mini_agent._interact_metadata_dict,
+    async def _arun_the_agent(self) -> None:
+        """
+        Run the agent function and then (if the interaction node mode is ALWAYS) create the AgentCallNode and the
+        AgentReplyNode of this interaction (all in the same task).
+        """
+        ctx = InteractionContext(
+            this_agent=self._mini_agent,
+            message_promises=self._input_sequence_promise,
+            reply_streamer=self.message_appender,
+        )
+        reply_cache = self._mini_agent.reply_cache
+        reply_cache_key = None
+        admission_control = self._mini_agent.admission_control
+        admitted = False
+        try:
+            with self.message_appender, (
+                # the run task has its own copy of the context, but it might have been copied from a task of a
+                # different session (a consumer of the reply, for ex.)
+                _NO_SCOPE
+                if current_scheduling_tag() == self._scheduling_tag
+                else scheduling_scope(*self._scheduling_tag)
+            ):
+                # errors are not raised above this `with` block, thanks to `appender_capture_errors=True`
+                if self.sequence_promise._cancel_requested:
+                    raise asyncio.CancelledError
+                cached_reply_sequence_promise = None
+                if reply_cache is not None:
+                    reply_cache_key = await self._areply_cache_key()
+                    cached_reply_sequence_promise = reply_cache._get(reply_cache_key)
+
+                if cached_reply_sequence_promise is not None:
+                    # the agent is not called - the cached (or still in-flight) reply is replayed instead
+                    self.message_appender.append(cached_reply_sequence_promise)
+                    reply_cache_key = None
+                else:
+                    if reply_cache_key is not None:
+                        reply_cache._put(reply_cache_key, self.sequence_promise)
+                    admitted = await self._aadmit()
+                    try:
+                        await self._mini_agent._call_func(ctx, self._function_kwargs)
+                    finally:
+                        await asyncio.gather(*ctx._tasks_to_wait_for, return_exceptions=True)
+
+            if admitted or reply_cache_key is not None:
+                try:
+                    # the reply sequence promise is awaited in this task rather than in the streamer, hence no
+                    # deadlock
+                    await self.sequence_promise
+                except Exception:  # pylint: disable=broad-except
+                    # the error is raised to the consumers of the reply - it is not a failure of this task
+                    if reply_cache_key is not None:
+                        reply_cache._evict(reply_cache_key, self.sequence_promise)
+        finally:
+            if admitted:
+                # the call is released only after the reply is resolved (LLM tokens, for ex., are usually streamed
+                # after the agent function returns)
+                admission_control.release()
+
+        if self._interaction_node_mode is InteractionNodeMode.ALWAYS:
+            await self.sequence_promise.reply_node
+
+    async def _aadmit(self) -> bool:
+        admission_control = self._mini_agent.admission_control
+        if admission_control is None:
+            return False
+        tokens = 0
+        if admission_control.needs_token_estimate:
+            tokens = admission_control.token_estimator(await self._input_sequence_promise, self._function_kwargs)
+        await admission_control.aadmit(tokens)
+        return True
+
+    async def _acreate_reply_node(self, _) -> AgentReplyNode:
+        """
+        Create the AgentCallNode and the AgentReplyNode of this interaction. The AgentCallNode is wrapped into an
+        already resolved promise, so the "promise resolved" (and, consequently, "persist message") event is still
+        triggered for it.
+        """
+        agent_call_node = AgentCallNode(
+            messages=await self._input_sequence_promise,
+            agent_alias=self._mini_agent.alias,
+            **self._mini_agent._interact_metadata_dict,
+            # NOTE: the next line will override any keys from `self.interaction_metadata` if names collide
+            **self._frozen_func_kwargs,
+        )
+        Promise[AgentCallNode](prefill_result=agent_call_node)
+
+        return AgentReplyNode(
+            replies=await self.sequence_promise,
+            agent_alias=self._mini_agent.alias,
+            agent_call=agent_call_node,
+            **self._mini_agent._interact_metadata_dict,
+        )
+
+    async def _areply_cache_key(self) -> str:
+        return Frozen(
+            agent_alias=self._mini_agent.alias,
+            interaction_metadata=self._mini_agent.interaction_metadata,
+            function_kwargs=Frozen(**self._frozen_func_kwargs),
+            input_messages=tuple(message.hash_key for message in await self._input_sequence_promise),
+        ).hash_key
+
+
+async def _aiter_inputs(
+    inputs: Union[Iterable[MessageType], AsyncIterable[MessageType]],
+) -> AsyncIterator[MessageType]:
+    if hasattr(inputs, "__aiter__"):
+        async for messages in inputs:
+            yield messages
+    else:
+        for messages in inputs:
+            yield messages
+
+
+async def _ainquire_unordered(
+    inquire_one: Callable[[MessageType], MessageSequencePromise],
+    inputs: Union[Iterable[MessageType], AsyncIterable[MessageType]],
+    max_concurrency: int,
+) -> AsyncIterator[tuple[int, MessageSequencePromise]]:
+    promising_context = PromisingContext.get_current()
+    resolution_tasks = {}
+    inputs_exhausted = False
+    inputs_aiter = _aiter_inputs(inputs).__aiter__()
+    input_index = 0
+    while resolution_tasks or not inputs_exhausted:
+        while not inputs_exhausted and len(resolution_tasks) < max_concurrency:
+            try:
+                messages = await inputs_aiter.__anext__()
+            except StopAsyncIteration:
+                inputs_exhausted = True
+                break
+            reply_sequence_promise = inquire_one(messages)
+            resolution_tasks[promising_context.start_asap(_aresolve_quietly(reply_sequence_promise))] = (
+                input_index,
+                reply_sequence_promise,
             )
+            input_index += 1
+        if resolution_tasks:
+            done, _ = await asyncio.wait(resolution_tasks, return_when=asyncio.FIRST_COMPLETED)
+            for resolution_task in done:
+                yield resolution_tasks.pop(resolution_task)
+
+
+async def _aresolve_quietly(reply_sequence_promise: MessageSequencePromise) -> None:
+    try:
+        await reply_sequence_promise
+    except Exception:  # pylint: disable=broad-except
+        # the error will be raised to whoever consumes the reply sequence promise
+        pass
+
 
-        Promise[AgentReplyNode](
-            start_asap=True,  # use a separate async task to avoid deadlock upon AgentReplyNode resolution
-            resolver=create_agent_reply_node,
+_NO_SCOPE = contextlib.nullcontext()
+
+_IMMUTABLE_KWARG_TYPES = frozenset([str, int, float, bool, bytes, type(None)])
+
+
+def _freeze_func_kwargs(function_kwargs: dict[str, Any]) -> dict[str, Any]:
+    """
+    Validate the agent function kwargs and return their frozen version (the returned dict must not be modified).
+    Kwargs that consist only of immutable values (the usual case of agents that are called with the same flags over
+    and over again) are validated only once per distinct combination of values.
+    """
+    if all(type(value) in _IMMUTABLE_KWARG_TYPES for value in function_kwargs.values()):
+        # the types are part of the key, because `1 == True`, for ex., but they are frozen differently
+        return _freeze_immutable_func_kwargs(
+            tuple((key, type(value), value) for key, value in function_kwargs.items())
         )
+    return Frozen(**function_kwargs).frozen_fields_and_values()
+
+
+@lru_cache(maxsize=1024)
+def _freeze_immutable_func_kwargs(kwarg_items: tuple[tuple[str, type, Any], ...]) -> dict[str, Any]:
+    return Frozen(**{key: value for key, _, value in kwarg_items}).frozen_fields_and_values()
+
+
+def _copy_if_mutable(value: Any) -> Any:
+    """
+    Deep-copy the value of an agent function kwarg, unless the value is immutable (then it is safe to pass it as is).
+    """
+    if type(value) in _IMMUTABLE_KWARG_TYPES or isinstance(value, Frozen):
+        return value
+    return copy.deepcopy(value)
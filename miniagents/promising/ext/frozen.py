@@ -10,17 +10,18 @@ from typing import Any, Iterator, Optional, Union
 
 from pydantic import BaseModel, ConfigDict, model_validator
 
-FrozenType = Optional[Union[str, int, float, bool, tuple["FrozenType", ...], "Frozen"]]
+FrozenType = Optional[Union[str, int, float, bool, bytes, tuple["FrozenType", ...], "Frozen"]]
 
 
 class Frozen(BaseModel):
     """
     A frozen pydantic model that allows arbitrary fields, has a git-style hash key that is calculated from the
     JSON representation of its data. The data is recursively validated to be immutable. Dicts are converted to
-    `Frozen` instances, lists and tuples are converted to tuples of immutable values, sets are prohibited.
+    `Frozen` instances, lists and tuples are converted to tuples of immutable values, bytearrays and memoryviews are
+    converted to bytes, sets are prohibited.
     """
 
-    model_config = ConfigDict(frozen=True, extra="allow")
+    model_config = ConfigDict(frozen=True, extra="allow", ser_json_bytes="base64")
 
     class_: str
 
@@ -49,8 +50,11 @@ class Frozen(BaseModel):
         """
         The representation of this Frozen object that you would usually get by calling `serialize()`, but as a string
         with a JSON. This is a cached property, so it is calculated only the first time it is accessed.
+
+        NOTE: Binary (bytes) values are not encoded into this JSON - they are represented by the SHA-256 of their raw
+        content instead.
         """
-        return json.dumps(self.serialize(), ensure_ascii=False, sort_keys=True)
+        return json.dumps(self.serialize(), ensure_ascii=False, sort_keys=True, default=_bytes_to_json)
 
     def serialize(self) -> dict[str, Any]:
         """
@@ -145,6 +149,8 @@ class Frozen(BaseModel):
             return tuple(cls._validate_and_freeze_value(key, sub_value) for sub_value in value)
         if isinstance(value, dict):
             return Frozen(**value)
+        if isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
         if not isinstance(value, cls._allowed_value_types()):
             raise ValueError(
                 f"only {{{', '.join([t.__name__ for t in cls._allowed_value_types()])}}} "
@@ -154,4 +160,13 @@ class Frozen(BaseModel):
 
     @classmethod
     def _allowed_value_types(cls) -> tuple[type[Any], ...]:
-        return type(None), str, int, float, bool, tuple, list, dict, Frozen
+        return type(None), str, int, float, bool, bytes, tuple, list, dict, Frozen
+
+
+def _bytes_to_json(value: Any) -> Any:
+    """
+    Represent binary values in JSON by the hash of their raw content (instead of encoding them into strings).
+    """
+    if isinstance(value, bytes):
+        return {"bytes_sha256": hashlib.sha256(value).hexdigest(), "bytes_len": len(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -88,6 +88,17 @@ class PromisingContext:
         self.on_promise_resolved_handlers.append(handler)
         return handler
 
+    def _trigger_promise_resolved_handlers(self, promise: "Promise", result: Any) -> None:
+        """
+        Schedule the `on_promise_resolved` handlers of this context for a promise that was just resolved.
+        """
+        for handler in self.on_promise_resolved_handlers:
+            self.start_asap(
+                handler(promise, result),
+                suppress_errors=True,
+                log_level_for_errors=self.log_level_for_errors,
+            )
+
     def start_asap(
         self,
         awaitable: Awaitable,
@@ -229,12 +240,8 @@ class Promise(Generic[T]):
     def _trigger_promise_resolved_event(self):
         promising_context = PromisingContext.get_current()
         while promising_context:
-            for handler in promising_context.on_promise_resolved_handlers:
-                promising_context.start_asap(
-                    handler(self, self._result),
-                    suppress_errors=True,
-                    log_level_for_errors=promising_context.log_level_for_errors,
-                )
+            # pylint: disable=protected-access
+            promising_context._trigger_promise_resolved_handlers(self, self._result)
             promising_context = promising_context.parent
 
 
@@ -28,16 +28,12 @@ class FlatSequence(Generic[IN, OUT]):
         if flattener:
             self._flattener = partial(flattener, self)
 
-        self._input_promise = StreamedPromise(
-            streamer=self._streamer,
-            resolver=lambda _: None,
-            start_asap=False,
-        )
         # TODO Oleksandr: should I really pass `self` here ? it is not of type `StreamedPromiseBound`
         self._incoming_streamer_aiter = incoming_streamer(self)
 
+        # the flattened items go straight into the (only) replay buffer of the sequence promise
         self.sequence_promise = sequence_promise_class(
-            streamer=self._input_promise,
+            streamer=self._streamer,
             resolver=self._resolver,
             start_asap=start_asap,
         )
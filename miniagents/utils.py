@@ -2,17 +2,22 @@
 Utility functions of the MiniAgents framework.
 """
 
+import asyncio
 import logging
-from typing import AsyncIterator, Any, Optional, Union
+from typing import AsyncIterable, AsyncIterator, Any, Awaitable, Callable, Iterable, Optional, TypeVar, Union
 
 # noinspection PyProtectedMember
 from pydantic._internal._model_construction import ModelMetaclass
 
+from miniagents.messages import BinaryMessagePromise, MessageSequencePromise
 from miniagents.miniagents import MessageType, MessageSequence, MessagePromise, Message
-from miniagents.promising.sentinels import Sentinel, DEFAULT
+from miniagents.promising.promising import PromisingContext
+from miniagents.promising.sentinels import Sentinel, DEFAULT, END_OF_QUEUE
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class SingletonMeta(type):
     """
@@ -51,6 +56,7 @@ def join_messages(
     strip_leading_newlines: bool = False,
     reference_original_messages: bool = True,
     start_asap: Union[bool, Sentinel] = DEFAULT,  # TODO Oleksandr: why not just make it False ?
+    prefetch: int = 0,
     **message_metadata,
 ) -> MessagePromise:
     """
@@ -65,6 +71,9 @@ def join_messages(
     the `original_messages` field.
     :param start_asap: If True, the resulting message will be scheduled for background resolution regardless
     of when it is going to be consumed.
+    :param prefetch: The number of messages (following the one that is currently being streamed) that should be
+    resolved in the background in advance. Useful when the messages are lazy or come from slow agents - their
+    latencies will overlap instead of adding up. The order of the messages and the tokens stays the same.
     :param message_metadata: Additional metadata to be added to the resulting message.
     """
 
@@ -73,14 +82,24 @@ def join_messages(
         if reference_original_messages:
             metadata_so_far["original_messages"] = []
 
+        message_promises = MessageSequence.turn_into_sequence_promise(messages)
+        if prefetch > 0:
+            message_promises = aprefetch_messages(message_promises, prefetch)
+
         first_message = True
-        async for message_promise in MessageSequence.turn_into_sequence_promise(messages):
+        async for message_promise in message_promises:
             # TODO Oleksandr: accumulate metadata from all the messages !!!
             if delimiter and not first_message:
                 yield delimiter
 
+            if isinstance(message_promise, BinaryMessagePromise):
+                # the pieces of a binary message are bytes - the string representation of the message is used instead
+                token_source = _aiter_string_representation(message_promise)
+            else:
+                token_source = message_promise
+
             lstrip_newlines = strip_leading_newlines
-            async for token in message_promise:
+            async for token in token_source:
                 if lstrip_newlines:
                     # let's remove leading newlines from the first message
                     token = token.lstrip("\n\r")
@@ -97,3 +116,68 @@ def join_messages(
         message_token_streamer=token_streamer,
         start_asap=start_asap,
     )
+
+
+async def _aiter_string_representation(message_promise: MessagePromise) -> AsyncIterator[str]:
+    yield str(await message_promise)
+
+
+async def aprefetch_messages(message_promises: MessageSequencePromise, prefetch: int) -> AsyncIterator[MessagePromise]:
+    """
+    Yield the message promises from the sequence in their original order, while making sure that up to `prefetch`
+    promises that follow the one that was yielded last are already being resolved in the background.
+    """
+    promising_context = PromisingContext.get_current()
+    free_slots = asyncio.Semaphore(prefetch)
+
+    async def astart_resolving(message_promise: MessagePromise) -> None:
+        await free_slots.acquire()
+        # start resolving the message promise in the background (the result is cached in the promise)
+        promising_context.start_asap(message_promise, suppress_errors=True, log_level_for_errors=logging.DEBUG)
+
+    async for message_promise in amerge_by_arrival([message_promises], before_queueing=astart_resolving):
+        free_slots.release()
+        yield message_promise
+
+
+async def amerge_by_arrival(
+    async_iterables: Iterable[AsyncIterable[T]],
+    before_queueing: Optional[Callable[[T], Awaitable[None]]] = None,
+) -> AsyncIterator[T]:
+    """
+    Yield the items of all the async iterables in the order of their arrival. Every async iterable is pumped into a
+    shared queue by a separate task (if `before_queueing` is provided, it is awaited by that task for every item
+    before the item is queued, which makes it possible to apply backpressure). The first error of any of the async
+    iterables is raised here. The pumping tasks are cancelled (and waited for) when the consumer stops early.
+    """
+    promising_context = PromisingContext.get_current()
+    queue = asyncio.Queue()
+
+    async def apump(async_iterable: AsyncIterable[T]) -> None:
+        try:
+            async for item in async_iterable:
+                if before_queueing:
+                    await before_queueing(item)
+                queue.put_nowait(item)
+        except Exception as exc:  # pylint: disable=broad-except
+            queue.put_nowait(exc)
+        finally:
+            queue.put_nowait(END_OF_QUEUE)
+
+    pump_tasks = [
+        promising_context.start_asap(apump(async_iterable), suppress_errors=True) for async_iterable in async_iterables
+    ]
+    try:
+        remaining = len(pump_tasks)
+        while remaining:
+            item = await queue.get()
+            if item is END_OF_QUEUE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for pump_task in pump_tasks:
+            pump_task.cancel()
+        await asyncio.gather(*pump_tasks, return_exceptions=True)
@@ -0,0 +1,34 @@
+"""
+Helpers that are shared by the tests.
+"""
+
+import asyncio
+from typing import AsyncIterator, Iterable, Optional
+
+from miniagents import Message, MessagePromise
+
+
+def lazy_message(
+    text: str,
+    delay: float = 0.0,
+    events: Optional[list[str]] = None,
+    tokens: Optional[Iterable[str]] = None,
+    start_asap: bool = False,
+    **metadata,
+) -> MessagePromise:
+    """
+    Create a promise of a message that streams `tokens` (just `text` by default) sleeping for `delay` seconds before
+    each token. If `events` is provided, "<text> - start" and "<text> - end" are appended to it when the streaming
+    starts and ends respectively.
+    """
+
+    async def token_streamer(_) -> AsyncIterator[str]:
+        if events is not None:
+            events.append(f"{text} - start")
+        for token in (text,) if tokens is None else tokens:
+            await asyncio.sleep(delay)
+            yield token
+        if events is not None:
+            events.append(f"{text} - end")
+
+    return Message.promise(start_asap=start_asap, message_token_streamer=token_streamer, **metadata)
@@ -0,0 +1,142 @@
+"""
+Tests for the admission control of agent calls.
+"""
+
+import asyncio
+
+import pytest
+
+from miniagents import (
+    AdmissionControl,
+    FairScheduler,
+    InteractionContext,
+    MiniAgents,
+    Priority,
+    RateLimiter,
+    current_scheduling_tag,
+    miniagent,
+    scheduling_scope,
+)
+
+
+@pytest.mark.asyncio
+async def test_admission_control_limits_concurrency() -> None:
+    """
+    Test that no more than `max_concurrency` calls of an agent (and of its forks) run at the same time, that the
+    calls are admitted in FIFO order and that the wait time is recorded.
+    """
+    running = 0
+    max_running = 0
+    started = []
+
+    @miniagent(admission_control=AdmissionControl(max_concurrency=2))
+    async def limited_agent(ctx: InteractionContext, idx: int) -> None:
+        nonlocal running, max_running
+        started.append(idx)
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.02)
+        running -= 1
+        ctx.reply(f"reply {idx}")
+
+    forked_agent = limited_agent.fork(alias="FORKED_AGENT")
+    admission_control = limited_agent.admission_control
+    assert forked_agent.admission_control is admission_control
+
+    async with MiniAgents():
+        reply_promises = [(limited_agent if idx % 2 else forked_agent).inquire(idx=idx) for idx in range(5)]
+        await asyncio.sleep(0.01)
+        assert admission_control.in_flight == 2
+        assert admission_control.queue_depth == 3
+
+        replies = [str(message) for reply_promise in reply_promises for message in await reply_promise]
+
+    assert replies == [f"reply {idx}" for idx in range(5)]
+    assert max_running == 2
+    assert started == [0, 1, 2, 3, 4]
+    assert admission_control.in_flight == 0
+    assert admission_control.queue_depth == 0
+    assert admission_control.admitted_count == 5
+    assert admission_control.max_wait_time >= 0.03
+    assert 0 < admission_control.average_wait_time <= admission_control.max_wait_time
+
+
+def test_rate_limiter_reserves_capacity() -> None:
+    """
+    Test that the requests and the tokens that exceed the budget of a rate limiter have to wait and that rate
+    limiters are shared by budget keys.
+    """
+    rate_limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=600)
+    assert rate_limiter.reserve(tokens=300) == 0
+    assert rate_limiter.reserve(tokens=300) == 0
+    assert rate_limiter.reserve(tokens=60) == pytest.approx(6, abs=0.01)  # 60 tokens over the budget, 10 per second
+
+    for _ in range(57):
+        rate_limiter.reserve()
+    assert rate_limiter.reserve() == pytest.approx(1, abs=0.01)  # the 61st request within a minute
+
+    shared_limiter = RateLimiter.shared("test_rate_limiter_reserves_capacity", requests_per_minute=10)
+    assert RateLimiter.shared("test_rate_limiter_reserves_capacity") is shared_limiter
+    assert (
+        AdmissionControl(budget_key="test_rate_limiter_reserves_capacity", requests_per_minute=100).rate_limiter
+        is shared_limiter
+    )
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler() -> None:
+    """
+    Test that `FairScheduler` admits the waiting calls by priority first and then by fair share among the sessions,
+    that the scheduling tags are inherited by the nested calls and that per-session stats are collected.
+    """
+    admitted = []
+    release_blocker = None
+
+    @miniagent(admission_control=FairScheduler(max_concurrency=1))
+    async def scheduled_agent(_: InteractionContext, name: str) -> None:
+        admitted.append(name)
+        if name == "blocker":
+            await release_blocker.wait()
+
+    @miniagent
+    async def tag_agent(ctx: InteractionContext) -> None:
+        ctx.reply(str(tuple(current_scheduling_tag())))
+
+    @miniagent
+    async def outer_agent(ctx: InteractionContext) -> None:
+        ctx.reply(tag_agent.inquire())
+
+    scheduler = scheduled_agent.admission_control
+
+    async with MiniAgents():
+        release_blocker = asyncio.Event()
+        reply_promises = [scheduled_agent.inquire(name="blocker")]
+        await asyncio.sleep(0.01)
+
+        with scheduling_scope(session_key="A", priority=Priority.BACKGROUND):
+            reply_promises.extend(scheduled_agent.inquire(name=f"A{idx}") for idx in range(4))
+        with scheduling_scope(session_key="B", priority=Priority.BACKGROUND):
+            reply_promises.extend(scheduled_agent.inquire(name=f"B{idx}") for idx in range(2))
+        with scheduling_scope(session_key="C"):
+            reply_promises.append(scheduled_agent.inquire(name="C0", priority=Priority.INTERACTIVE))
+        await asyncio.sleep(0.01)
+
+        assert scheduler.queue_depth == 7
+        assert scheduler.get_tenant_stats("A").queue_depth == 4
+        assert scheduler.get_tenant_stats("B").queue_depth == 2
+
+        release_blocker.set()
+        for reply_promise in reply_promises:
+            await reply_promise
+
+        with scheduling_scope(session_key="D"):
+            nested_tag = await outer_agent.inquire(priority=Priority.INTERACTIVE).as_single_promise()
+
+    assert admitted == ["blocker", "C0", "A0", "B0", "A1", "B1", "A2", "A3"]
+    assert str(nested_tag) == str(("D", Priority.INTERACTIVE))
+    assert scheduler.queue_depth == 0
+    assert scheduler.get_tenant_stats("A").queue_depth == 0
+    assert scheduler.get_tenant_stats("A").admitted_count == 4
+    assert scheduler.get_tenant_stats("C").admitted_count == 1
+    assert 0 < scheduler.get_tenant_stats("C").max_wait_time < scheduler.get_tenant_stats("A").max_wait_time
+    assert scheduler.get_tenant_stats("A").average_wait_time > 0
@@ -0,0 +1,294 @@
+"""
+Tests for the agent aggregators.
+"""
+
+import asyncio
+
+import pytest
+
+from miniagents import InteractionContext, Message, MiniAgents, miniagent
+from miniagents.ext.agent_aggregators import agent_graph, agent_loop, agent_map_reduce, agent_parallel
+
+
+@pytest.mark.parametrize(
+    "strategy, quorum, expected_replies",
+    [
+        ("concat", None, ["slow: in", "fast: in", "medium: in", "medium: again"]),
+        ("interleave", None, ["fast: in", "medium: in", "medium: again", "slow: in"]),
+        ("first", None, ["fast: in"]),
+        ("quorum", 2, ["fast: in", "medium: in", "medium: again"]),
+    ],
+)
+@pytest.mark.asyncio
+async def test_agent_parallel(strategy: str, quorum: int, expected_replies: list[str]) -> None:
+    """
+    Test that `agent_parallel` sends the same input sequence to all the agents and merges their replies according to
+    the strategy, and that the agents that are not needed anymore are cancelled.
+    """
+    input_sequences = []
+    cancelled = []
+
+    @miniagent
+    async def some_agent(ctx: InteractionContext, name: str, delays: tuple[float, ...]) -> None:
+        input_sequences.append(ctx.message_promises)
+        input_text = str(await ctx.message_promises.as_single_promise())
+        try:
+            for delay, text in zip(delays, (input_text, "again")):
+                await asyncio.sleep(delay)
+                ctx.reply(f"{name}: {text}")
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    parallel_agent = agent_parallel.fork(
+        agents=[
+            some_agent.fork(name="slow", delays=(0.05,)),
+            some_agent.fork(name="fast", delays=(0.0,)),
+            None,
+            some_agent.fork(name="medium", delays=(0.01, 0.02)),
+        ],
+        strategy=strategy,
+        quorum=quorum,
+    )
+
+    async with MiniAgents():
+        replies = await parallel_agent.inquire("in")
+
+    assert [str(reply) for reply in replies] == expected_replies
+    assert len(input_sequences) == 3
+    assert all(input_sequence is input_sequences[0] for input_sequence in input_sequences)
+    if strategy == "first":
+        assert sorted(cancelled) == ["medium", "slow"]
+    elif strategy == "quorum":
+        assert cancelled == ["slow"]
+    else:
+        assert not cancelled
+
+
+@pytest.mark.asyncio
+async def test_agent_parallel_quorum_errors() -> None:
+    """
+    Test that failed agents are skipped by the FIRST strategy and that an invalid quorum is rejected.
+    """
+
+    @miniagent
+    async def failing_agent(_: InteractionContext) -> None:
+        raise ValueError("failed")
+
+    @miniagent
+    async def slow_agent(ctx: InteractionContext) -> None:
+        await asyncio.sleep(0.01)
+        ctx.reply("slow reply")
+
+    async with MiniAgents():
+        replies = await agent_parallel.fork(agents=[failing_agent, slow_agent], strategy="first").inquire()
+        assert [str(reply) for reply in replies] == ["slow reply"]
+
+        with pytest.raises(ValueError, match="failed"):
+            await agent_parallel.fork(agents=[failing_agent, failing_agent], strategy="first").inquire()
+        with pytest.raises(ValueError, match="quorum should be between 1"):
+            await agent_parallel.fork(agents=[slow_agent], strategy="quorum", quorum=2).inquire()
+
+
+@pytest.mark.asyncio
+async def test_agent_map_reduce() -> None:
+    """
+    Test that `agent_map_reduce` maps the chunks with bounded concurrency, reduces the results in a balanced tree
+    (preserving the order of the chunks) and starts reducing before all the chunks are mapped.
+    """
+    events = []
+    running_mappers = 0
+    max_running_mappers = 0
+
+    @miniagent
+    async def mapper_agent(ctx: InteractionContext) -> None:
+        nonlocal running_mappers, max_running_mappers
+        running_mappers += 1
+        max_running_mappers = max(max_running_mappers, running_mappers)
+        texts = [str(message) for message in await ctx.message_promises]
+        await asyncio.sleep(0.001 if texts[0] in ("0", "2") else 0.02)
+        running_mappers -= 1
+        events.append(f"mapped {texts[0]}")
+        ctx.reply(f"m({' '.join(texts)})")
+
+    @miniagent
+    async def reducer_agent(ctx: InteractionContext) -> None:
+        texts = [str(message) for message in await ctx.message_promises]
+        events.append(f"reduce {' '.join(texts)}")
+        ctx.reply(f"r({' '.join(texts)})")
+
+    async with MiniAgents():
+        by_count_agent = agent_map_reduce.fork(
+            mapper_agent=mapper_agent, reducer_agent=reducer_agent, chunk_size=2, fan_in=2, max_concurrency=2
+        )
+        by_count_reply = await by_count_agent.inquire([str(idx) for idx in range(10)]).as_single_promise()
+        assert max_running_mappers == 2
+
+        by_size_agent = agent_map_reduce.fork(
+            mapper_agent=mapper_agent, reducer_agent=reducer_agent, max_chunk_chars=3, fan_in=3
+        )
+        by_size_reply = await by_size_agent.inquire(["a", "bb", "ccc", "dddd", "e"]).as_single_promise()
+        single_chunk_reply = await by_size_agent.inquire(["a"]).as_single_promise()
+        no_reply = await by_size_agent.inquire([])
+
+    assert str(by_count_reply) == "r(r(r(m(0 1) m(2 3)) r(m(4 5) m(6 7))) m(8 9))"
+    assert events.index("reduce m(0 1) m(2 3)") < events.index("mapped 8")
+
+    assert str(by_size_reply) == "r(r(m(a bb) m(ccc) m(dddd)) m(e))"
+    assert str(single_chunk_reply) == "m(a)"
+    assert no_reply == ()
+
+
+@pytest.mark.parametrize(
+    "chunk_count, expected_reply",
+    [
+        (2, "r(m(0) m(1))"),
+        (4, "r(r(m(0) m(1)) r(m(2) m(3)))"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_agent_map_reduce_full_groups(chunk_count: int, expected_reply: str) -> None:
+    """
+    Test that `agent_map_reduce` finds the root of the tree when the number of chunks is a power of `fan_in` (the
+    last group of every level is full and gets reduced before the number of chunks is known) and that the results
+    that are mapped out of order still end up in the order of the chunks.
+    """
+
+    @miniagent
+    async def mapper_agent(ctx: InteractionContext) -> None:
+        text = str(await ctx.message_promises.as_single_promise())
+        # the later chunks are mapped faster
+        await asyncio.sleep(0.002 * (chunk_count - int(text)))
+        ctx.reply(f"m({text})")
+
+    @miniagent
+    async def reducer_agent(ctx: InteractionContext) -> None:
+        ctx.reply(f"r({' '.join(str(message) for message in await ctx.message_promises)})")
+
+    async with MiniAgents():
+        map_reduce_agent = agent_map_reduce.fork(
+            mapper_agent=mapper_agent, reducer_agent=reducer_agent, chunk_size=1, fan_in=2
+        )
+        reply = await map_reduce_agent.inquire([str(idx) for idx in range(chunk_count)]).as_single_promise()
+
+    assert str(reply) == expected_reply
+
+
+@pytest.mark.asyncio
+async def test_agent_map_reduce_streams_early_root() -> None:
+    """
+    Test that the reply of the root reducer is streamed even when its group was reduced before the number of chunks
+    became known (the root is returned without waiting for its reduction to be resolved).
+    """
+    first_token_received = asyncio.Event()
+
+    @miniagent
+    async def mapper_agent(ctx: InteractionContext) -> None:
+        ctx.reply(f"m({await ctx.message_promises.as_single_promise()})")
+
+    @miniagent
+    async def reducer_agent(ctx: InteractionContext) -> None:
+        async def astream_tokens(_):
+            yield "r("
+            # the rest of the reply is produced only after the consumer has seen the beginning of it
+            await first_token_received.wait()
+            yield f"{' '.join(str(message) for message in await ctx.message_promises)})"
+
+        ctx.reply(Message.promise(message_token_streamer=astream_tokens))
+
+    async with MiniAgents():
+        map_reduce_agent = agent_map_reduce.fork(
+            mapper_agent=mapper_agent, reducer_agent=reducer_agent, chunk_size=1, fan_in=2
+        )
+        reply_promise = map_reduce_agent.inquire(["0", "1"])
+        try:
+            message_promise = await asyncio.wait_for(reply_promise.__aiter__().__anext__(), timeout=1)
+            first_token = await asyncio.wait_for(message_promise.__aiter__().__anext__(), timeout=1)
+        finally:
+            first_token_received.set()
+
+        assert first_token == "r("
+        assert str(await message_promise) == "r(m(0) m(1))"
+
+
+@pytest.mark.asyncio
+async def test_agent_graph() -> None:
+    """
+    Test that `agent_graph` feeds the replies of the nodes into their successors, starts all the nodes right away,
+    reports the critical path and rejects graphs with cycles.
+    """
+    events = []
+    critical_paths = []
+
+    @miniagent
+    async def node_agent(ctx: InteractionContext, name: str, delay: float = 0.0) -> None:
+        events.append(f"start {name}")
+        texts = [str(message) for message in await ctx.message_promises]
+        await asyncio.sleep(delay)
+        events.append(f"done {name}")
+        ctx.reply(f"{name}({' '.join(texts)})")
+
+    nodes = {
+        "fetch": node_agent.fork(name="fetch"),
+        "slow": node_agent.fork(name="slow", delay=0.03),
+        "fast": node_agent.fork(name="fast"),
+        "merge": node_agent.fork(name="merge"),
+        "side": node_agent.fork(name="side"),
+    }
+    graph_agent = agent_graph.fork(
+        nodes=nodes,
+        edges=[("fetch", "slow"), ("fetch", "fast"), ("slow", "merge"), ("fast", "merge")],
+        on_critical_path=critical_paths.append,
+    )
+
+    async with MiniAgents():
+        replies = await graph_agent.inquire("in")
+
+        with pytest.raises(ValueError, match="cycles .*slow, fast"):
+            await agent_graph.fork(nodes=nodes, edges=[("fetch", "slow"), ("slow", "fast"), ("fast", "slow")]).inquire(
+                "in"
+            )
+        with pytest.raises(ValueError, match="unknown node"):
+            await agent_graph.fork(nodes=nodes, edges=[("fetch", "nowhere")]).inquire("in")
+
+    assert [str(reply) for reply in replies] == ["merge(slow(fetch(in)) fast(fetch(in)))", "side(in)"]
+    # the successors are started without waiting for their predecessors to be done
+    assert events.index("start merge") < events.index("done fetch")
+    assert [node_name for node_name, _ in critical_paths[0]] == ["fetch", "slow", "merge"]
+    assert critical_paths[0][-1][1] >= 0.03
+
+
+@pytest.mark.parametrize("lookahead", [1, 2])
+@pytest.mark.asyncio
+async def test_agent_loop_lookahead(lookahead: int) -> None:
+    """
+    Test that `agent_loop` with `lookahead` and without AWAIT sentinels schedules the next turns ahead of time, but
+    never keeps more than `lookahead` unresolved turns at once.
+    """
+    turns = []
+    unresolved_turns = 0
+    max_unresolved_turns = 0
+
+    @miniagent
+    async def turn_agent(ctx: InteractionContext) -> None:
+        nonlocal unresolved_turns, max_unresolved_turns
+        turns.append(len(turns))
+        unresolved_turns += 1
+        max_unresolved_turns = max(max_unresolved_turns, unresolved_turns)
+        messages = await ctx.message_promises
+        await asyncio.sleep(0.001)
+        unresolved_turns -= 1
+        if len(turns) > 6:
+            raise ValueError("enough turns")
+        ctx.reply(f"turn{len(messages)}")
+
+    async with MiniAgents():
+        with pytest.raises(ValueError, match="enough turns"):
+            await agent_loop.fork(agents=[turn_agent], lookahead=lookahead).inquire("start")
+
+        with pytest.raises(ValueError, match="at least one AWAIT sentinel"):
+            await agent_loop.fork(agents=[turn_agent]).inquire()
+        with pytest.raises(ValueError, match="lookahead should be at least 1"):
+            await agent_loop.fork(agents=[turn_agent], lookahead=0).inquire()
+
+    assert max_unresolved_turns == lookahead
@@ -3,11 +3,26 @@ Test the agents.
 """
 
 import asyncio
-from typing import Union
+import traceback
+from functools import partial
+from typing import Any, Union
 
 import pytest
 
-from miniagents import MiniAgents, miniagent, InteractionContext
+from miniagents import (
+    AgentCallNode,
+    AgentReplyCache,
+    AgentReplyNode,
+    InteractionContext,
+    Message,
+    MessageType,
+    MiniAgent,
+    MiniAgents,
+    current_scheduling_tag,
+    miniagent,
+    scheduling_scope,
+)
+from miniagents.miniagents import _freeze_func_kwargs
 from miniagents.promising.sentinels import DEFAULT, Sentinel
 
 
@@ -107,3 +122,343 @@ async def test_sub_agents_run_in_parallel(start_asap: Union[bool, Sentinel]) ->
             "agent2 - start",
             "agent2 - end",
         ]
+
+
+@pytest.mark.asyncio
+async def test_agent_kwargs_and_interaction_nodes() -> None:
+    """
+    Test that the kwargs of forked agents are merged into a flat dict (the call kwargs take precedence), that mutable
+    call kwargs are copied before being passed to the agent function and that the interaction nodes are still
+    persisted.
+    """
+    received_kwargs = []
+    persisted_messages = []
+
+    @miniagent
+    async def some_agent(ctx: InteractionContext, **kwargs) -> None:
+        received_kwargs.append(kwargs)
+        ctx.reply("reply")
+
+    forked_agent = some_agent.fork(param1="a", param2="b").fork(param2="c")
+    # pylint: disable=protected-access
+    assert forked_agent._func is some_agent._func
+    assert forked_agent._partial_kwargs == {"param1": "a", "param2": "c"}
+
+    some_list = [1, 2]
+    async with MiniAgents() as ctx:
+
+        @ctx.on_persist_message
+        async def persist_message(_, message: Message) -> None:
+            persisted_messages.append(message)
+
+        assert [str(message) for message in await forked_agent.inquire("input", param1="d", some_list=some_list)] == [
+            "reply"
+        ]
+
+    assert received_kwargs == [{"param1": "d", "param2": "c", "some_list": [1, 2]}]
+    assert received_kwargs[0]["some_list"] is not some_list
+
+    persisted_classes = {type(message).__name__ for message in persisted_messages}
+    assert {"AgentCallNode", "AgentReplyNode"} <= persisted_classes
+    agent_call_node = next(message for message in persisted_messages if isinstance(message, AgentCallNode))
+    assert agent_call_node.param1 == "d"
+    assert agent_call_node.some_list == (1, 2)
+
+
+def test_immutable_agent_kwargs_are_validated_once() -> None:
+    """
+    Test that the agent function kwargs that consist only of immutable values are validated (frozen) once per
+    distinct combination of values, while the rest of the kwargs are validated on every call.
+    """
+    frozen_kwargs = _freeze_func_kwargs({"flag": True, "name": "value"})
+    assert frozen_kwargs == {"flag": True, "name": "value"}
+    assert _freeze_func_kwargs({"flag": True, "name": "value"}) is frozen_kwargs
+
+    # `1 == True`, but it is a different kwarg value nonetheless
+    assert _freeze_func_kwargs({"flag": 1, "name": "value"})["flag"] is not True
+
+    assert _freeze_func_kwargs({"some_list": [1, 2]}) == {"some_list": (1, 2)}
+    with pytest.raises(ValueError):
+        _freeze_func_kwargs({"some_object": object()})
+
+
+@pytest.mark.asyncio
+async def test_agent_from_partial_with_positional_args() -> None:
+    """
+    Test that a `functools.partial` with positional arguments is not unwrapped into a flat dict of kwargs (its
+    positional arguments would have been lost otherwise), while a keyword-only partial still is.
+    """
+
+    async def positional_func(prefix: str, ctx: InteractionContext, suffix: str) -> None:
+        ctx.reply(f"{prefix}{await ctx.message_promises.as_single_promise()}{suffix}")
+
+    async def keyword_func(ctx: InteractionContext, prefix: str, suffix: str) -> None:
+        ctx.reply(f"{prefix}{await ctx.message_promises.as_single_promise()}{suffix}")
+
+    positional_agent = MiniAgent(partial(positional_func, "<", suffix=">"), alias="POSITIONAL")
+    keyword_agent = MiniAgent(partial(keyword_func, prefix="["), alias="KEYWORD")
+    # pylint: disable=protected-access
+    assert keyword_agent._func is keyword_func
+    assert keyword_agent._partial_kwargs == {"prefix": "["}
+
+    async with MiniAgents():
+        assert str(await positional_agent.inquire("input").as_single_promise()) == "<input>"
+        assert str(await keyword_agent.inquire("input", suffix="]").as_single_promise()) == "[input]"
+
+
+@pytest.mark.asyncio
+async def test_agent_reply_cache(caplog) -> None:
+    """
+    Test that identical inquiries of an agent with a reply cache share a single agent call (including the concurrent
+    ones), that the interaction nodes are still created for the cached calls, that different inputs and kwargs are not
+    mixed up, that forks get their own caches and that failed replies are evicted (without the agent run task
+    reporting the error of the reply as its own).
+    """
+    calls = []
+    persisted_reply_nodes = []
+
+    @miniagent(reply_cache=AgentReplyCache(max_size=2))
+    async def cached_agent(ctx: InteractionContext, suffix: str = "", fail: bool = False) -> None:
+        calls.append(suffix)
+        await asyncio.sleep(0.01)
+        if fail:
+            raise ValueError("agent failed")
+        ctx.reply([f"{await message}{suffix}" async for message in ctx.message_promises])
+
+    async def ainquire(agent: MiniAgent, messages: MessageType, **kwargs) -> list[str]:
+        return [str(message) for message in await agent.inquire(messages, **kwargs)]
+
+    async with MiniAgents() as ctx:
+
+        @ctx.on_persist_message
+        async def persist_message(_, message: Message) -> None:
+            if isinstance(message, AgentReplyNode):
+                persisted_reply_nodes.append(message)
+
+        replies = await asyncio.gather(*[ainquire(cached_agent, ["a", "b"], suffix="!") for _ in range(3)])
+        assert replies == [["a!", "b!"]] * 3
+        assert calls == ["!"]
+        await ctx.aflush_tasks()
+        assert len(persisted_reply_nodes) == 3
+
+        assert await ainquire(cached_agent, ["a", "b"], suffix="?") == ["a?", "b?"]
+        assert await ainquire(cached_agent, ["a"], suffix="!") == ["a!"]
+        assert calls == ["!", "?", "!"]
+        assert len(cached_agent.reply_cache) == 2  # the LRU limit
+
+        forked_agent = cached_agent.fork(suffix="!")
+        assert forked_agent.reply_cache is not cached_agent.reply_cache
+        assert await ainquire(forked_agent, ["a"]) == ["a!"]
+        assert calls == ["!", "?", "!", "!"]
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await ainquire(cached_agent, "x", fail=True)
+        assert calls == ["!", "?", "!", "!", "", ""]  # the failed reply was not cached
+
+        await ctx.aflush_tasks()
+        caplog.clear()
+        with pytest.raises(ValueError):
+            await ainquire(cached_agent.fork(interaction_nodes="never"), "x", fail=True)
+        await ctx.aflush_tasks()
+        # the agent run task doesn't report the error of the reply as its own (the consumers of the reply get it)
+        assert not [
+            record
+            for record in caplog.records
+            if record.exc_info and traceback.extract_tb(record.exc_info[2])[1].name == "_arun_the_agent"
+        ]
+
+
+@pytest.mark.asyncio
+async def test_actor_mode() -> None:
+    """
+    Test that the calls of an agent in actor mode are processed by a fixed pool of long-lived workers that keep
+    their state between the calls and that the workers are drained when the MiniAgents context is finalized.
+    """
+    # pylint: disable=protected-access
+    init_count = 0
+
+    async def actor_init() -> dict[str, Any]:
+        nonlocal init_count
+        init_count += 1
+        return {"worker": init_count, "calls": 0}
+
+    @miniagent(actor_pool_size=2, actor_init=actor_init)
+    async def actor_agent(ctx: InteractionContext) -> None:
+        ctx.actor_state["calls"] += 1
+        await asyncio.sleep(0.01)
+        ctx.reply(f"worker {ctx.actor_state['worker']}")
+
+    async with MiniAgents() as ctx:
+        reply_promises = [actor_agent.inquire() for _ in range(6)]
+        replies = [str(message) for reply_promise in reply_promises for message in await reply_promise]
+
+        assert init_count == 2
+        assert sorted(replies) == ["worker 1"] * 3 + ["worker 2"] * 3
+
+        late_reply_promise = actor_agent.inquire()
+        actor_pool = ctx._actor_pools[actor_agent]
+
+    assert [str(message) for message in await late_reply_promise] in (["worker 1"], ["worker 2"])
+    assert all(worker.done() for worker in actor_pool._workers)
+    assert not ctx._actor_pools
+
+
+@pytest.mark.asyncio
+async def test_actor_mode_runs_calls_in_caller_context() -> None:
+    """
+    Test that every call of an agent in actor mode sees the context of its own caller (and not the context of the
+    call that happened to start the workers) and that the caller is not left waiting when the worker is cancelled.
+    """
+    session_keys = []
+
+    @miniagent(actor_pool_size=1)
+    async def actor_agent(ctx: InteractionContext, block: bool = False) -> None:
+        session_keys.append(current_scheduling_tag().session_key)
+        if block:
+            await asyncio.Event().wait()
+        ctx.reply("done")
+
+    async with MiniAgents() as ctx:
+        for session_key in ["alice", "bob", "carol"]:
+            with scheduling_scope(session_key=session_key):
+                await actor_agent.inquire()
+        assert session_keys == ["alice", "bob", "carol"]
+
+        blocked_reply_promise = actor_agent.inquire(block=True)
+        await asyncio.sleep(0.01)
+        # pylint: disable=protected-access
+        for worker in ctx._actor_pools[actor_agent]._workers:
+            worker.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(blocked_reply_promise, timeout=1)
+
+
+@pytest.mark.parametrize("default_mode", ["always", "lazy", "never"])
+@pytest.mark.asyncio
+async def test_interaction_node_modes(default_mode: str) -> None:
+    """
+    Test that the interaction nodes are created right after each agent call in ALWAYS mode, only upon request in LAZY
+    mode and never in NEVER mode, and that the mode can be overridden per agent.
+    """
+    persisted_classes = []
+
+    @miniagent
+    async def some_agent(ctx: InteractionContext) -> None:
+        ctx.reply("reply")
+
+    always_agent = some_agent.fork(alias="ALWAYS_AGENT", interaction_nodes="always")
+
+    async def persist_message(_, message: Message) -> None:
+        persisted_classes.append(type(message).__name__)
+
+    async with MiniAgents(interaction_nodes_by_default=default_mode, on_persist_message=persist_message):
+        reply_promise = some_agent.inquire("input")
+        await reply_promise
+        await always_agent.inquire("input")
+        await asyncio.sleep(0.01)
+
+        assert persisted_classes.count("AgentReplyNode") == (2 if default_mode == "always" else 1)
+
+        if default_mode == "never":
+            assert reply_promise.reply_node is None
+        else:
+            reply_node = await reply_promise.reply_node
+            assert [str(message) for message in reply_node.replies] == ["reply"]
+            assert [str(message) for message in reply_node.agent_call.messages] == ["input"]
+            await asyncio.sleep(0.01)
+            assert persisted_classes.count("AgentReplyNode") == 2
+            assert persisted_classes.count("AgentCallNode") == 2
+
+
+@pytest.mark.parametrize("ordered", [True, False])
+@pytest.mark.asyncio
+async def test_inquire_many(ordered: bool) -> None:
+    """
+    Test that `MiniAgent.inquire_many()` keeps at most `max_concurrency` inquiries in flight, doesn't pull the inputs
+    faster than it can process them, raises the errors of individual inquiries only when the respective replies are
+    awaited and tells which input every reply belongs to when asked to.
+    """
+    running = 0
+    max_running = 0
+    pulled_inputs = 0
+
+    @miniagent
+    async def some_agent(ctx: InteractionContext, suffix: str) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        text = str(await ctx.message_promises.as_single_promise())
+        # the later inputs are processed faster so the unordered mode yields them out of order
+        await asyncio.sleep(0.001 * (10 - int(text)))
+        running -= 1
+        if text == "3":
+            raise ValueError("three")
+        ctx.reply(text + suffix)
+
+    async def ainputs():
+        nonlocal pulled_inputs
+        for idx in range(8):
+            pulled_inputs += 1
+            yield str(idx)
+
+    async with MiniAgents():
+        replies = []
+        errors = []
+        async for reply_promise in some_agent.inquire_many(ainputs(), max_concurrency=3, ordered=ordered, suffix="!"):
+            # the window is filled but never overfilled
+            assert pulled_inputs - len(replies) - len(errors) <= 3
+            try:
+                replies.append(str(await reply_promise.as_single_promise()))
+            except ValueError as exc:
+                errors.append(str(exc))
+
+        with pytest.raises(ValueError):
+            async for _ in some_agent.inquire_many(["0"], max_concurrency=0):
+                pass
+
+        indexed_replies = [
+            (input_index, str(await reply_promise.as_single_promise()))
+            async for input_index, reply_promise in some_agent.inquire_many(
+                ["0", "1", "2"], ordered=ordered, with_index=True, suffix="?"
+            )
+        ]
+        assert sorted(indexed_replies) == [(0, "0?"), (1, "1?"), (2, "2?")]
+
+    assert max_running <= 3
+    assert errors == ["three"]
+    expected_replies = ["0!", "1!", "2!", "4!", "5!", "6!", "7!"]
+    if ordered:
+        assert replies == expected_replies
+    else:
+        assert sorted(replies) == expected_replies
+        assert replies != expected_replies
+
+
+@pytest.mark.asyncio
+async def test_inquire_many_ordered_streams_replies() -> None:
+    """
+    Test that in ordered mode `MiniAgent.inquire_many()` yields a reply sequence promise before the respective
+    inquiry is done, so the reply can be streamed while it is being produced.
+    """
+    reply_consumed = asyncio.Event()
+
+    @miniagent
+    async def streaming_agent(ctx: InteractionContext) -> None:
+        ctx.reply("first")
+        try:
+            await asyncio.wait_for(reply_consumed.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            ctx.reply("not streamed")
+        else:
+            ctx.reply("second")
+
+    async with MiniAgents():
+        replies = []
+        async for reply_promise in streaming_agent.inquire_many([None, None], max_concurrency=1):
+            async for message_promise in reply_promise:
+                replies.append(str(await message_promise))
+                reply_consumed.set()
+            reply_consumed.clear()
+
+    assert replies == ["first", "second"] * 2
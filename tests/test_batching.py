@@ -0,0 +1,98 @@
+"""
+Tests for the micro-batching of agent calls.
+"""
+
+import asyncio
+
+import pytest
+
+from miniagents import Message, MiniAgents
+from miniagents.ext.batching import MicroBatcher, micro_batching_agent
+
+
+@pytest.mark.asyncio
+async def test_micro_batching_agent() -> None:
+    """
+    Assert that concurrent calls of `micro_batching_agent` are grouped into batches of at most `max_batch_size`
+    inputs, that a partial batch is dispatched after `max_wait` and that the replies go back to the right callers.
+    """
+    batch_sizes = []
+
+    async def aupper_batch(inputs: list[tuple[Message, ...]]) -> list[str]:
+        # a fake batch backend
+        batch_sizes.append(len(inputs))
+        await asyncio.sleep(0.001)
+        return [" ".join(str(message) for message in messages).upper() for messages in inputs]
+
+    batcher = MicroBatcher(aupper_batch, max_batch_size=4, max_wait=0.01)
+    upper_agent = micro_batching_agent.fork(batcher=batcher)
+
+    async with MiniAgents():
+        reply_promises = [upper_agent.inquire([f"msg{idx}", "x"]) for idx in range(10)]
+        replies = [str(await reply_promise.as_single_promise()) for reply_promise in reply_promises]
+
+    assert replies == [f"MSG{idx} X" for idx in range(10)]
+    assert batch_sizes == [4, 4, 2]
+    assert batcher.batch_count == 3
+    assert batcher.item_count == 10
+    assert batcher.fill_ratio == pytest.approx(10 / 12)
+    # only the inputs of the last (partial) batch waited for the timer
+    assert 0.005 < batcher.max_added_latency < 0.5
+    assert 0 < batcher.average_added_latency < batcher.max_added_latency
+
+
+@pytest.mark.asyncio
+async def test_micro_batching_agent_errors() -> None:
+    """
+    Assert that the error of a batch (including a mismatch in the number of replies) is raised to every caller
+    whose input was in that batch.
+    """
+
+    async def abroken_batch(inputs: list[tuple[Message, ...]]) -> list[str]:
+        return ["only one reply"] * (len(inputs) - 1)
+
+    broken_agent = micro_batching_agent.fork(batcher=MicroBatcher(abroken_batch, max_batch_size=2))
+
+    async with MiniAgents():
+        reply_promises = [broken_agent.inquire("msg") for _ in range(2)]
+        for reply_promise in reply_promises:
+            with pytest.raises(ValueError, match="returned 1 replies for a batch of 2 inputs"):
+                await reply_promise
+
+    with pytest.raises(ValueError):
+        MicroBatcher(abroken_batch, max_batch_size=0)
+
+
+@pytest.mark.parametrize("cancel_after_flush", [False, True])
+@pytest.mark.asyncio
+async def test_micro_batcher_skips_cancelled_callers(cancel_after_flush: bool) -> None:
+    """
+    Assert that the input of a caller that was cancelled (before or right after its batch was dispatched) is not
+    sent to the batch function and doesn't affect the replies of the other callers.
+    """
+    batches = []
+
+    async def aupper_batch(inputs: list[tuple[Message, ...]]) -> list[str]:
+        batches.append([str(messages[0]) for messages in inputs])
+        return [str(messages[0]).upper() for messages in inputs]
+
+    batcher = MicroBatcher(aupper_batch, max_batch_size=10, max_wait=10)
+
+    async with MiniAgents():
+        tasks = [asyncio.create_task(batcher.asubmit([Message(text=f"msg{idx}")])) for idx in range(3)]
+        await asyncio.sleep(0)  # let all the calls be submitted
+
+        if cancel_after_flush:
+            batcher.flush()
+            tasks[1].cancel()
+        else:
+            tasks[1].cancel()
+            await asyncio.sleep(0)
+            batcher.flush()
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert batches == [["msg0", "msg2"]]
+    assert results[0] == "MSG0"
+    assert isinstance(results[1], asyncio.CancelledError)
+    assert results[2] == "MSG2"
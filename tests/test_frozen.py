@@ -130,3 +130,29 @@ async def test_model_hash_key_vs_key_ordering() -> None:
         model2 = Frozen(some_other_field=2, some_field="test")
 
         assert model1.hash_key == model2.hash_key
+
+
+@pytest.mark.asyncio
+async def test_model_bytes_field() -> None:
+    """
+    Test that binary values are allowed in `Frozen`, that mutable binary values are frozen into `bytes` and that
+    the hash key is calculated from the raw bytes rather than from their encoded representation.
+    """
+    async with PromisingContext():
+        model = Frozen(some_bytes=b"\x00\xff", some_bytearray=bytearray(b"abc"), nested=[memoryview(b"xyz")])
+
+        assert model.some_bytes == b"\x00\xff"
+        assert model.some_bytearray == b"abc"
+        assert isinstance(model.some_bytearray, bytes)
+        assert model.nested == (b"xyz",)
+
+        def bytes_json(value: bytes) -> str:
+            return f'{{"bytes_len": {len(value)}, "bytes_sha256": "{hashlib.sha256(value).hexdigest()}"}}'
+
+        expected_hash_key = hashlib.sha256(
+            (
+                f'{{"class_": "Frozen", "nested": [{bytes_json(b"xyz")}], '
+                f'"some_bytearray": {bytes_json(b"abc")}, "some_bytes": {bytes_json(bytes([0, 255]))}}}'
+            ).encode("utf-8")
+        ).hexdigest()[:40]
+        assert model.hash_key == expected_hash_key
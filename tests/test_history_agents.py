@@ -0,0 +1,57 @@
+"""
+Tests for the history agents.
+"""
+
+import pytest
+
+from miniagents import Message, MiniAgents
+from miniagents.ext.history_agents import in_memory_history_agent, InMemoryHistory
+
+
+@pytest.mark.asyncio
+async def test_in_memory_history_agent() -> None:
+    """
+    Assert that `in_memory_history_agent` accumulates the messages in `InMemoryHistory` and replies with the full
+    history (or with the last N messages of it).
+    """
+    history = InMemoryHistory([Message(text="msg0")])
+    history_agent = in_memory_history_agent.fork(message_list=history)
+
+    async with MiniAgents():
+        assert await history_agent.inquire(["msg1", "msg2"]) == (
+            Message(text="msg0"),
+            Message(text="msg1"),
+            Message(text="msg2"),
+        )
+        assert await history_agent.inquire("msg3", last_n=2) == (Message(text="msg2"), Message(text="msg3"))
+        assert await history_agent.inquire(last_n=0) == ()
+
+    assert len(history) == 4
+    assert history.last_n(1) == (Message(text="msg3"),)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_history_sequence_promise_cached() -> None:
+    """
+    Assert that the sequence promise of `InMemoryHistory` is reused until new messages are appended and that the
+    promises of the past messages are neither recreated nor copied.
+    """
+    history = InMemoryHistory()
+
+    async with MiniAgents():
+        history.extend([Message(text="msg1"), Message(text="msg2")])
+        sequence_promise = history.as_sequence_promise()
+        assert history.as_sequence_promise() is sequence_promise
+
+        history.append(Message(text="msg3"))
+        new_sequence_promise = history.as_sequence_promise()
+        assert new_sequence_promise is not sequence_promise
+
+        old_promises = [message_promise async for message_promise in sequence_promise]
+        new_promises = [message_promise async for message_promise in new_sequence_promise]
+        assert new_promises[:2] == old_promises
+        assert all(new is old for new, old in zip(new_promises, old_promises))
+        assert await new_sequence_promise == (Message(text="msg1"), Message(text="msg2"), Message(text="msg3"))
+        # the sequence promises are views over the history - the message promises are not copied into their buffers
+        assert len(new_sequence_promise._pieces_so_far) == 1  # pylint: disable=protected-access
+        assert await history.as_sequence_promise(last_n=1) == (Message(text="msg3"),)
@@ -3,10 +3,13 @@
 Test the LLM agents.
 """
 
-from typing import Callable
+import asyncio
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Optional
 
 import pytest
 from dotenv import load_dotenv
+from pydantic import BaseModel
 
 from miniagents import Message, MiniAgents, MiniAgent
 
@@ -14,6 +17,7 @@ load_dotenv()
 
 # pylint: disable=wrong-import-position
 from miniagents.ext.llm.anthropic import anthropic_agent
+from miniagents.ext.llm.llm_common import HedgingPolicy
 from miniagents.ext.llm.openai import openai_agent
 
 
@@ -65,3 +69,84 @@ async def test_llm(
                 result += token
             check_response_func(await msg_promise)
     assert result.strip() == "I AM ONLINE"
+
+
+class _FakeDelta(BaseModel):
+    content: Optional[str] = None
+    role: Optional[str] = None
+
+
+class _FakeChoice(BaseModel):
+    index: int = 0
+    delta: _FakeDelta
+    finish_reason: Optional[str] = None
+
+
+class _FakeChunk(BaseModel):
+    model: str
+    choices: list[_FakeChoice]
+
+
+class _FakeOpenAIClient:
+    """
+    A fake streaming OpenAI client that waits for `first_token_delays[model]` seconds before the first token.
+    """
+
+    def __init__(self, first_token_delays: dict[str, float]) -> None:
+        self.first_token_delays = first_token_delays
+        self.cancelled_models = []
+        self.streaming_tasks = []  # the set of tasks that took part in each stream
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._acreate))
+
+    async def _acreate(self, model: str, stream: bool, **_: Any) -> AsyncIterator[_FakeChunk]:
+        assert stream
+        return self._astream_chunks(model)
+
+    async def _astream_chunks(self, model: str) -> AsyncIterator[_FakeChunk]:
+        tasks = {asyncio.current_task()}
+        self.streaming_tasks.append(tasks)
+        try:
+            yield _FakeChunk(model=model, choices=[_FakeChoice(delta=_FakeDelta(role="assistant"))])
+            tasks.add(asyncio.current_task())
+            await asyncio.sleep(self.first_token_delays[model])
+            for token in ("reply ", "from ", model):
+                yield _FakeChunk(model=model, choices=[_FakeChoice(delta=_FakeDelta(content=token))])
+                tasks.add(asyncio.current_task())
+            yield _FakeChunk(model=model, choices=[_FakeChoice(delta=_FakeDelta(), finish_reason="stop")])
+            tasks.add(asyncio.current_task())
+        except (asyncio.CancelledError, GeneratorExit):
+            tasks.add(asyncio.current_task())
+            self.cancelled_models.append(model)
+            raise
+
+
+@pytest.mark.asyncio
+async def test_llm_hedging() -> None:
+    """
+    Assert that a request whose first token is late (compared to the recently observed TTFT) is hedged, that the
+    first request to produce a token wins, that the loser is cancelled, that only the output of the winner ends up
+    in the reply message, that every request is streamed by a single task and that the TTFT of the winning hedge is
+    measured from the start of the original request.
+    """
+    fake_client = _FakeOpenAIClient({"slow-model": 0.01, "fast-model": 0.0})
+    hedging = HedgingPolicy(percentile=0.9, min_samples=3, hedge_kwargs={"model": "fast-model"})
+    hedged_agent = openai_agent.fork(model="slow-model", stream=True, async_client=fake_client, hedging=hedging)
+
+    async with MiniAgents():
+        for _ in range(3):
+            # not enough TTFT observations yet - no hedging
+            assert str(await hedged_agent.inquire("hi").as_single_promise()) == "reply from slow-model"
+        assert hedging.hedge_count == 0
+        assert 0.01 <= hedging.hedge_delay() < 0.5
+
+        hedge_delay = hedging.hedge_delay()
+        fake_client.first_token_delays["slow-model"] = 5
+        (reply,) = await hedged_agent.inquire("hi")
+        assert hedging._ttft_samples[-1] >= hedge_delay  # pylint: disable=protected-access
+
+    assert str(reply) == "reply from fast-model"
+    assert reply.model == "fast-model"
+    assert reply.choices[0].finish_reason == "stop"
+    assert fake_client.cancelled_models == ["slow-model"]
+    assert [len(tasks) for tasks in fake_client.streaming_tasks] == [1] * 5
+    assert (hedging.request_count, hedging.hedge_count, hedging.hedge_win_count) == (4, 1, 1)
@@ -4,13 +4,15 @@ Tests for the `Message`-based models.
 
 import hashlib
 import json
+from typing import AsyncIterator
 
 import pytest
 
-from miniagents import Message, MiniAgents
+from miniagents import Message, MiniAgents, FileMessage, BinaryMessage, MessageSequence
 from miniagents.promising.ext.frozen import Frozen
 from miniagents.promising.promising import PromisingContext, Promise
 from miniagents.promising.sentinels import DEFAULT
+from miniagents.utils import join_messages
 
 
 @pytest.mark.asyncio
@@ -160,3 +162,80 @@ async def test_on_persist_message_event_not_called(start_asap: bool) -> None:
 
     assert promise_resolved_calls == 2  # on_promise_resolved should be called twice regardless
     assert persist_message_calls == 0
+
+
+@pytest.mark.parametrize("start_asap", [False, True])
+@pytest.mark.asyncio
+async def test_file_message(tmp_path, start_asap: bool) -> None:
+    """
+    Assert that a `FileMessage` is hashed by the content of its file and that its promise streams the text of the
+    file in chunks (and replays it to every consumer).
+    """
+
+    class SmallChunkFileMessage(FileMessage):
+        """
+        A `FileMessage` that reads its file in very small chunks.
+        """
+
+        text_chunk_size = 4
+
+    file = tmp_path / "file.txt"
+    file.write_text("юнікод and some more text", encoding="utf-8")
+
+    async with PromisingContext(start_everything_asap_by_default=start_asap):
+        message = SmallChunkFileMessage(file)
+
+        assert message.text is None
+        assert message.file_sha256 == hashlib.sha256(file.read_bytes()).hexdigest()
+        assert str(message) == "юнікод and some more text"
+        assert message.hash_key == SmallChunkFileMessage(file).hash_key
+
+        pieces = [piece async for piece in message.as_promise]
+        assert pieces == ["юнік", "од a", "nd s", "ome ", "more", " tex", "t"]
+        assert [piece async for piece in message.as_promise] == pieces
+        assert await message.as_promise is message
+
+        async_created_message = await SmallChunkFileMessage.acreate(file)
+        assert isinstance(async_created_message, SmallChunkFileMessage)
+        assert async_created_message.hash_key == message.hash_key
+
+        file.write_text("different content", encoding="utf-8")
+        assert SmallChunkFileMessage(file).hash_key != message.hash_key
+
+
+@pytest.mark.parametrize("start_asap", [False, True, DEFAULT])
+@pytest.mark.asyncio
+async def test_binary_message_promise(start_asap: bool) -> None:
+    """
+    Assert that a binary message can be streamed chunk by chunk and that the chunks are replayed without being
+    copied.
+    """
+
+    async def chunk_streamer(_) -> AsyncIterator[bytearray]:
+        yield bytearray(b"\x00\x01")
+        yield b"\x02"
+
+    async with MiniAgents():
+        message_promise = BinaryMessage.promise(
+            start_asap=start_asap, message_token_streamer=chunk_streamer, mime_type="application/octet-stream"
+        )
+        chunks = [chunk async for chunk in message_promise]
+        assert chunks == [b"\x00\x01", b"\x02"]
+        assert all(isinstance(chunk, bytes) for chunk in chunks)
+        assert all(
+            replayed is original for replayed, original in zip([chunk async for chunk in message_promise], chunks)
+        )
+
+        message = await message_promise
+        assert isinstance(message, BinaryMessage)
+        assert message.content == b"\x00\x01\x02"
+        assert message.mime_type == "application/octet-stream"
+        assert str(message) == "<application/octet-stream: 3 bytes>"
+
+        sequence_promise = MessageSequence.turn_into_sequence_promise([b"raw bytes", message])
+        assert await sequence_promise == (BinaryMessage(content=b"raw bytes"), message)
+        assert (
+            str(await sequence_promise.as_single_promise())
+            == "<binary content: 9 bytes>\n\n<application/octet-stream: 3 bytes>"
+        )
+        assert str(await join_messages(["a", BinaryMessage(content=b"\x00\x01")])) == "a\n\n<binary content: 2 bytes>"
@@ -2,11 +2,16 @@
 Tests for the `MessageSequence` class.
 """
 
+import asyncio
+import tracemalloc
+from typing import AsyncIterator, Iterator
+
 import pytest
 
-from miniagents import Message, MessageSequence
+from miniagents import Message, MessageSequence, MessageType, MiniAgents
 from miniagents.promising.promising import PromisingContext
-from miniagents.promising.sentinels import DEFAULT
+from miniagents.promising.sentinels import DEFAULT, NO_VALUE
+from tests.helpers import lazy_message
 
 
 @pytest.mark.parametrize("start_asap", [False, True, DEFAULT])
@@ -118,3 +123,255 @@ async def test_message_sequence_error(start_asap: bool) -> None:
         Message(text="msg3"),
         # ValueError("msg4"),
     ]
+
+
+@pytest.mark.asyncio
+async def test_message_sequence_deeply_nested_and_mixed() -> None:
+    """
+    Assert that `MessageSequence` flattens deeply nested containers as well as a mix of sync and async iterables.
+    """
+
+    async def async_messages() -> AsyncIterator[MessageType]:
+        yield "async1"
+        yield ("async2", ["async3"])
+
+    deep_messages = "deepest"
+    for _ in range(2000):
+        deep_messages = [deep_messages]
+
+    async with PromisingContext():
+        sequence_promise = MessageSequence.turn_into_sequence_promise(
+            [
+                (text for text in ["gen1", "gen2"]),
+                async_messages(),
+                deep_messages,
+                {"text": "dict"},
+                [],
+            ]
+        )
+        assert [message.text for message in await sequence_promise] == [
+            "gen1",
+            "gen2",
+            "async1",
+            "async2",
+            "async3",
+            "deepest",
+            "dict",
+        ]
+
+
+@pytest.mark.parametrize("drain_concurrently", [False, True])
+@pytest.mark.asyncio
+async def test_message_sequence_drains_async_sources_concurrently(drain_concurrently: bool) -> None:
+    """
+    Assert that when `drain_async_sources_concurrently_by_default` is True, the async sources of a single item are
+    drained concurrently, while the messages are still yielded in their original order.
+    """
+    event_sequence = []
+
+    async def slow_source() -> AsyncIterator[MessageType]:
+        event_sequence.append("slow - start")
+        await asyncio.sleep(0.05)
+        event_sequence.append("slow - end")
+        yield "slow"
+
+    async def fast_source() -> AsyncIterator[MessageType]:
+        event_sequence.append("fast - start")
+        yield "fast"
+
+    async with MiniAgents(drain_async_sources_concurrently_by_default=drain_concurrently):
+        message_sequence = MessageSequence(appender_capture_errors=True)
+        with message_sequence.message_appender:
+            message_sequence.message_appender.append([slow_source(), ["msg", (fast_source(),)]])
+
+        assert [message.text for message in await message_sequence.sequence_promise] == ["slow", "msg", "fast"]
+
+    if drain_concurrently:
+        assert event_sequence == ["slow - start", "fast - start", "slow - end"]
+    else:
+        assert event_sequence == ["slow - start", "slow - end", "fast - start"]
+
+
+@pytest.mark.asyncio
+async def test_message_sequence_drains_sync_generators_lazily() -> None:
+    """
+    Assert that when the async sources are drained concurrently, one-shot sync iterators are drained item by item
+    (without blocking the event loop) and that the async sources in their items are still drained concurrently.
+    """
+    produced_count = 0
+    event_sequence = []
+
+    def generate_messages() -> Iterator[MessageType]:
+        nonlocal produced_count
+        for idx in range(100):
+            produced_count += 1
+            yield str(idx)
+        yield fast_source()
+
+    async def fast_source() -> AsyncIterator[MessageType]:
+        event_sequence.append("fast - start")
+        yield "fast"
+
+    async def slow_source() -> AsyncIterator[MessageType]:
+        event_sequence.append("slow - start")
+        await asyncio.sleep(0.05)
+        event_sequence.append("slow - end")
+        yield "slow"
+
+    observed_counts = []
+
+    async def observe_the_generator() -> None:
+        for _ in range(3):
+            await asyncio.sleep(0)
+            observed_counts.append(produced_count)
+
+    async with MiniAgents(drain_async_sources_concurrently_by_default=True) as ctx:
+        message_sequence = MessageSequence(appender_capture_errors=True)
+        with message_sequence.message_appender:
+            message_sequence.message_appender.append([slow_source(), generate_messages()])
+        ctx.start_asap(observe_the_generator())
+
+        messages = await message_sequence.sequence_promise
+
+    assert [message.text for message in messages] == ["slow", *[str(idx) for idx in range(100)], "fast"]
+    # the other tasks were running while the generator was being drained
+    assert 0 < observed_counts[-1] < 100
+    assert event_sequence.index("fast - start") < event_sequence.index("slow - end")
+
+
+@pytest.mark.parametrize("start_asap", [False, True])
+@pytest.mark.asyncio
+async def test_message_sequence_as_completed(start_asap: bool) -> None:
+    """
+    Assert that `MessageSequencePromise.as_completed()` yields message promises in the order in which they start
+    streaming, and that the sequence promise itself still preserves the original order.
+    """
+
+    async with PromisingContext():
+        sequence_promise = MessageSequence.turn_into_sequence_promise(
+            [
+                lazy_message("slow", 0.06, start_asap=start_asap),
+                lazy_message("fast", 0.0, start_asap=start_asap),
+                lazy_message("medium", 0.03, start_asap=start_asap),
+                "ready",
+            ]
+        )
+
+        completed_texts = [(await message_promise).text async for message_promise in sequence_promise.as_completed()]
+        assert completed_texts == ["ready", "fast", "medium", "slow"]
+        assert [message.text for message in await sequence_promise] == ["slow", "fast", "medium", "ready"]
+
+
+@pytest.mark.parametrize("max_resolution_concurrency", [None, 1])
+@pytest.mark.asyncio
+async def test_message_sequence_resolves_messages_concurrently(max_resolution_concurrency: int) -> None:
+    """
+    Assert that awaiting a message sequence resolves lazy messages concurrently (unless the concurrency is capped)
+    and that the resulting messages preserve their original order.
+    """
+    event_sequence = []
+
+    async with PromisingContext():
+        message_sequence = MessageSequence(
+            appender_capture_errors=True, max_resolution_concurrency=max_resolution_concurrency
+        )
+        with message_sequence.message_appender:
+            message_sequence.message_appender.append(
+                [
+                    lazy_message("slow", 0.05, events=event_sequence),
+                    lazy_message("fast", 0.0, events=event_sequence),
+                    "ready",
+                ]
+            )
+
+        assert [message.text for message in await message_sequence.sequence_promise] == ["slow", "fast", "ready"]
+
+    if max_resolution_concurrency is None:
+        assert event_sequence == ["slow - start", "fast - start", "fast - end", "slow - end"]
+    else:
+        assert event_sequence == ["slow - start", "slow - end", "fast - start", "fast - end"]
+
+
+@pytest.mark.asyncio
+async def test_resolved_message_sequence_memory_footprint() -> None:
+    """
+    Assert that a resolved message sequence holds on to roughly its own pieces and its resulting tuple and not to
+    the intermediate lists that were built while resolving it.
+    """
+    message_count = 10_000
+
+    async with PromisingContext():
+        messages = [Message(text=f"msg{idx}") for idx in range(message_count)]
+        for message in messages:
+            _ = message.as_promise
+
+        tracemalloc.start()
+        try:
+            snapshot_before = tracemalloc.take_snapshot()
+            message_sequence = MessageSequence(start_asap=False)
+            with message_sequence.message_appender:
+                for message in messages:
+                    message_sequence.message_appender.append(message)
+            assert len(await message_sequence.sequence_promise) == message_count
+            snapshot_after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        retained = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, "filename"))
+
+    # one pointer per message in the list of pieces and one more in the resulting tuple (plus some slack)
+    assert retained < 3 * 8 * message_count
+
+
+@pytest.mark.asyncio
+async def test_message_sequence_views() -> None:
+    """
+    Assert that `tail()`, `slice()` and `filter()` views select the right message promises and don't resolve the
+    contents of the messages that were not selected.
+    """
+    events = []
+
+    async with PromisingContext():
+        sequence_promise = MessageSequence.turn_into_sequence_promise(
+            [lazy_message(f"msg{idx}", events=events, role="user" if idx % 2 else "assistant") for idx in range(6)]
+        )
+
+        assert [message.text for message in await sequence_promise.tail(2)] == ["msg4", "msg5"]
+        assert [message.text for message in await sequence_promise.slice(1, 3)] == ["msg1", "msg2"]
+        assert [message.text for message in await sequence_promise.slice(4)] == ["msg4", "msg5"]
+        assert [message.text for message in await sequence_promise.slice(3, 3)] == []
+        assert await sequence_promise.tail(0) == ()
+
+        user_messages = sequence_promise.filter(lambda metadata: metadata.role == "user")
+        assert [message.text for message in await user_messages.tail(1)] == ["msg5"]
+
+        resolved_texts = {event.split(" - ")[0] for event in events}
+        assert sorted(resolved_texts) == ["msg1", "msg2", "msg4", "msg5"]
+
+        with pytest.raises(ValueError):
+            sequence_promise.slice(-1)
+
+
+@pytest.mark.asyncio
+async def test_turn_static_messages_into_sequence_promise() -> None:
+    """
+    Assert that fully static messages are turned into an already resolved sequence promise without any background
+    tasks, and that anything that is not static still goes through the regular flattening.
+    """
+    async with PromisingContext() as ctx:
+        resolved_promise = Message(text="resolved").as_promise
+        sequence_promise = MessageSequence.turn_into_sequence_promise(
+            ["str", ({"text": "dict"}, [Message(text="msg"), resolved_promise]), b"bytes"]
+        )
+        assert not ctx.child_tasks
+        # pylint: disable=protected-access
+        assert [message.text for message in sequence_promise._result[:4]] == ["str", "dict", "msg", "resolved"]
+        assert [message_promise async for message_promise in sequence_promise][3] is resolved_promise
+        assert (await sequence_promise)[4].content == b"bytes"
+
+        sequence_promise = MessageSequence.turn_into_sequence_promise(["str", lazy_message("lazy")])
+        assert sequence_promise._result is NO_VALUE
+        assert [message.text for message in await sequence_promise] == ["str", "lazy"]
+
+        sequence_promise = MessageSequence.turn_into_sequence_promise(["str", {"text": "dict", "role": {1, 2}}])
+        with pytest.raises(ValueError):
+            await sequence_promise
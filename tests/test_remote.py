@@ -0,0 +1,185 @@
+"""
+Tests for the remote agents (both ends of the connection run on localhost).
+"""
+
+import asyncio
+
+import pytest
+
+from miniagents import BinaryMessage, InteractionContext, Message, MiniAgents, miniagent
+from miniagents.ext import remote
+from miniagents.ext.remote import (
+    RemoteAgentClient,
+    RemoteAgentError,
+    aserve_agent,
+    register_frozen_class,
+    remote_agent,
+    resolve_frozen_class,
+)
+
+
+@register_frozen_class
+class SampleRemoteMessage(Message):
+    """
+    A custom message class that needs to be rehydrated on the other end of the connection.
+    """
+
+    score: float = 0.0
+
+
+@miniagent
+async def tokens_agent(ctx: InteractionContext, suffix: str = "") -> None:
+    """
+    An agent that streams every input message back token by token (as a `SampleRemoteMessage`) and adds a message
+    that refers to all the input messages.
+    """
+
+    async def astream_tokens(_):
+        for token in ("one ", "two ", "three", suffix):
+            await asyncio.sleep(0)
+            yield token
+
+    messages = await ctx.message_promises
+    if any(str(message) == "fail" for message in messages):
+        raise ValueError("failed on purpose")
+
+    ctx.reply(SampleRemoteMessage.promise(message_token_streamer=astream_tokens, score=0.5))
+    ctx.reply(Message(text=f"{len(messages)} inputs", inputs=messages, raw=b"\x00\x01"))
+
+
+@pytest.mark.asyncio
+async def test_remote_agent() -> None:
+    """
+    Test that a remote agent streams its reply tokens back, that the reply messages are rehydrated into the same
+    messages (with the same hash keys) as on the server and that the known messages are not sent again.
+    """
+    async with MiniAgents():
+        server = await aserve_agent(tokens_agent)
+        remote_client = RemoteAgentClient(port=server.sockets[0].getsockname()[1])
+        proxy_agent = remote_agent.fork(remote_client=remote_client)
+
+        history = [Message(text="hello"), Message(text="world", role="user")]
+        reply_promise = proxy_agent.inquire(history, suffix="!")
+        message_promises = [message_promise async for message_promise in reply_promise]
+        tokens = [token async for token in message_promises[0]]
+        replies = await reply_promise
+
+        assert tokens == ["one ", "two ", "three", "!"]
+        assert isinstance(replies[0], SampleRemoteMessage)
+        assert replies[0].score == 0.5
+        assert str(replies[0]) == "one two three!"
+        assert str(replies[1]) == "2 inputs"
+        assert replies[1].raw == b"\x00\x01"
+        assert [message.hash_key for message in replies[1].inputs] == [message.hash_key for message in history]
+
+        channel = await remote_client._aget_channel()  # pylint: disable=protected-access
+        known_hash_keys = set(channel.known_messages)
+        # the history and the previous replies are already known to the server, only the new message is sent
+        replies = await proxy_agent.inquire([*history, *replies, Message(text="again")])
+        assert str(replies[1]) == "5 inputs"
+        assert len(set(channel.known_messages) - known_hash_keys) == 3  # "again", its reply and "5 inputs"
+
+        with pytest.raises(RemoteAgentError, match="ValueError: failed on purpose"):
+            await proxy_agent.inquire("fail")
+
+        await remote_client.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_remote_agent_binary_tokens() -> None:
+    """
+    Test that the bytes chunks of binary reply messages are streamed back as bytes.
+    """
+
+    @miniagent
+    async def binary_agent(ctx: InteractionContext) -> None:
+        async def astream_chunks(_):
+            yield b"\x00\x01"
+            yield b"\xff"
+
+        ctx.reply(BinaryMessage.promise(message_token_streamer=astream_chunks, mime_type="application/octet-stream"))
+
+    async with MiniAgents():
+        server = await aserve_agent(binary_agent)
+        remote_client = RemoteAgentClient(port=server.sockets[0].getsockname()[1])
+
+        proxy_agent = remote_agent.fork(remote_client=remote_client)
+
+        message_promises = [message_promise async for message_promise in proxy_agent.inquire()]
+        chunks = [chunk async for chunk in message_promises[0]]
+        reply = await message_promises[0]
+
+        assert chunks == [b"\x00\x01", b"\xff"]
+        assert isinstance(reply, BinaryMessage)
+        assert reply.content == b"\x00\x01\xff"
+
+        await remote_client.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+@pytest.mark.asyncio
+async def test_remote_agent_forgets_least_recent_messages(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Test that the client keeps at most `MAX_KNOWN_MESSAGES` known messages, that the server forgets the messages
+    that the client evicted and that the calls keep working (including the concurrent ones) with a growing history.
+    """
+    monkeypatch.setattr(remote, "MAX_KNOWN_MESSAGES", 4)
+
+    async with MiniAgents():
+        server = await aserve_agent(tokens_agent)
+        remote_client = RemoteAgentClient(port=server.sockets[0].getsockname()[1])
+        proxy_agent = remote_agent.fork(remote_client=remote_client)
+
+        history = []
+        for turn in range(5):
+            history.append(Message(text=f"turn {turn}"))
+            replies = await asyncio.gather(
+                proxy_agent.inquire(history, suffix="!"), proxy_agent.inquire(history, suffix="?")
+            )
+            assert [str(reply[1]) for reply in replies] == [f"{len(history)} inputs"] * 2
+            assert [str(reply[0]) for reply in replies] == ["one two three!", "one two three?"]
+            history.extend(replies[0])
+
+        channel = await remote_client._aget_channel()  # pylint: disable=protected-access
+        assert len(channel.known_messages) <= 4
+        assert history[0].hash_key not in channel.known_messages
+        forgotten_hash_keys = set(channel.forgotten_messages)
+        await proxy_agent.inquire("ping")
+        # by now the server has confirmed that it forgot the messages that were evicted before
+        assert not forgotten_hash_keys & set(channel.forgotten_messages)
+
+        await remote_client.aclose()
+        server.close()
+        await server.wait_closed()
+
+
+def test_only_registered_frozen_classes_are_rehydrated() -> None:
+    """
+    Test that only the explicitly registered `Frozen` classes can be rehydrated from the wire (even if a subclass
+    with the requested name is loaded) and that a name cannot be taken over by a different class.
+    """
+
+    class UnregisteredMessage(Message):
+        """
+        A message class that is loaded, but not registered.
+        """
+
+    assert resolve_frozen_class("SampleRemoteMessage") is SampleRemoteMessage
+    assert resolve_frozen_class("Message") is Message
+    assert register_frozen_class(SampleRemoteMessage) is SampleRemoteMessage  # registering twice is fine
+
+    for class_name in ("UnregisteredMessage", "FileMessage"):
+        with pytest.raises(ValueError, match="is not registered"):
+            resolve_frozen_class(class_name)
+
+    with pytest.raises(ValueError, match="already registered"):
+        register_frozen_class(type("SampleRemoteMessage", (Message,), {}))
+
+    # pylint: disable=protected-access
+    channel = remote._RemoteChannel(reader=None, writer=None)
+    unregistered_message = UnregisteredMessage(text="hi")
+    with pytest.raises(ValueError, match="UnregisteredMessage is not registered"):
+        channel.rehydrate(unregistered_message.serialize())
@@ -0,0 +1,44 @@
+"""
+Tests for the utility functions of the MiniAgents framework.
+"""
+
+import pytest
+
+from miniagents import MiniAgents
+from miniagents.utils import join_messages
+from tests.helpers import lazy_message
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+@pytest.mark.asyncio
+async def test_join_messages_prefetch(prefetch: int) -> None:
+    """
+    Assert that `join_messages` with `prefetch` starts resolving the following lazy messages while the current one
+    is being streamed, without changing the order of the tokens.
+    """
+    event_sequence = []
+
+    async with MiniAgents():
+        joined = join_messages(
+            [
+                lazy_message(name, 0.01, events=event_sequence, tokens=[f"{name}-token1 ", f"{name}-token2"])
+                for name in ("msg1", "msg2", "msg3")
+            ],
+            delimiter=" | ",
+            start_asap=False,
+            prefetch=prefetch,
+        )
+        tokens = [token async for token in joined]
+
+    assert "".join(tokens) == "msg1-token1 msg1-token2 | msg2-token1 msg2-token2 | msg3-token1 msg3-token2"
+    if prefetch:
+        assert event_sequence[:3] == ["msg1 - start", "msg2 - start", "msg3 - start"]
+    else:
+        assert event_sequence == [
+            "msg1 - start",
+            "msg1 - end",
+            "msg2 - start",
+            "msg2 - end",
+            "msg3 - start",
+            "msg3 - end",
+        ]